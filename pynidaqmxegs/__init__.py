@@ -1,4 +1,18 @@
-from pynidaqmxegs import do
-from pynidaqmxegs import ao
-from pynidaqmxegs import ai
-from pynidaqmxegs import mixed
\ No newline at end of file
+from pynidaqmxegs import backend
+backend.use_backend()
+
+# The subpackages are imported when first used (e.g. pynidaqmxegs.ao.OnDemand) rather than
+# here, so "import pynidaqmxegs" does not load the driver, Qt or matplotlib.
+import importlib
+
+_SUBMODULES = ('do', 'ao', 'ai', 'mixed', 'utils', 'bench', 'aio', 'system')
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('pynidaqmxegs.' + name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
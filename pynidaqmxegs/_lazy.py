@@ -0,0 +1,58 @@
+'''
+ Lazy exports for the subpackages
+
+ pynidaqmxegs._lazy
+
+ Purpose
+ Each example or utility class lives in a module of the same name, e.g. the class
+ softwarePort in pynidaqmxegs/do/softwarePort.py, and the package exports the class:
+ "from pynidaqmxegs.do import softwarePort" gives the class. The modules are imported
+ only when first used, so importing a package does not load Qt or matplotlib.
+
+ Importing a submodule directly ("import pynidaqmxegs.do.softwarePort", or "from
+ pynidaqmxegs.do.softwarePort import softwarePort") makes the import system bind the
+ *module* to the package attribute of the same name. A module-level __getattr__ is then
+ never called for that name, so the package would go on returning the module. The
+ packages are therefore given a module class whose __setattr__ replaces such a
+ submodule by the object it exports, whichever order things are imported in.
+'''
+
+import importlib
+import types
+
+
+class _LazyPackage(types.ModuleType):
+
+    def __setattr__(self, name, value):
+        if (name in self.__dict__.get('_EXPORTS', ()) and isinstance(value, types.ModuleType)
+                and value.__name__ == self.__name__ + '.' + name):
+            # The import system binding the submodule: bind what it exports instead
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+def lazy_exports(package, exports, modules=()):
+    '''
+    Set up lazy exports for the package called "package" and return its (__getattr__,
+    __dir__). "exports" are names that are both a submodule and the object it defines;
+    "modules" are submodules exported as modules.
+    '''
+    import sys
+
+    module = sys.modules[package]
+    module.__class__ = _LazyPackage
+
+    def __getattr__(name):
+        if name in exports:
+            # Importing the submodule binds the object via _LazyPackage.__setattr__
+            value = getattr(importlib.import_module(package + '.' + name), name)
+            setattr(module, name, value)
+            return value
+        if name in modules:
+            return importlib.import_module(package + '.' + name)
+        raise AttributeError('module %r has no attribute %r' % (package, name))
+
+    def __dir__():
+        return sorted(set(module.__dict__) | set(exports) | set(modules))
+
+    return __getattr__, __dir__
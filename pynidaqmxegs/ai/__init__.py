@@ -1,6 +1,15 @@
-from pynidaqmxegs.ai.hardwareContinuousVoltage import hardwareContinuousVoltage
-from pynidaqmxegs.ai.hardwareContinuousVoltageWithCallBackNoPlot import hardwareContinuousVoltageWithCallBackNoPlot
-from pynidaqmxegs.ai.hardwareContinuousVoltageWithCallBackPyQtPlot import hardwareContinuousVoltageWithCallBackPyQtPlot
-from pynidaqmxegs.ai.hardwareFiniteVoltage import hardwareFiniteVoltage
-from pynidaqmxegs.ai.softwareTimedVoltage import softwareTimedVoltage
-from pynidaqmxegs.ai.softwareTimedVoltageContinuous import softwareTimedVoltageContinuous
+# The examples are imported when first used, so importing the package is quick and does
+# not load plotting libraries that only some of them need
+from pynidaqmxegs._lazy import lazy_exports
+
+_EXPORTS = ('hardwareContinuousVoltage',
+            'hardwareContinuousVoltageWithCallBackNoPlot',
+            'hardwareContinuousVoltageWithCallBackPyQtPlot',
+            'hardwareContinuousVoltageSpectrum',
+            'hardwareContinuousVoltageProcessPool',
+            'hardwareFiniteVoltage',
+            'softwareTimedVoltage',
+            'softwareTimedVoltageContinuous')
+
+# Each example is a function or class with the same name as its module
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -9,8 +9,13 @@
   Shows how to do hardware-timed analog input using NI's nidaqmx-python package.
   More details at https://github.com/ni/nidaqmx-python
 
-  This function acquires continuously from one channel and plots the results to screen 
-  as acquisition proceeds. The example uses the card's on-board clock but uses no triggers. 
+  This function acquires continuously from one or more channels and plots the results to 
+  screen as acquisition proceeds. The example uses the card's on-board clock but uses no triggers. 
+
+  Data are read with a stream reader (nidaqmx.stream_readers.AnalogMultiChannelReader) 
+  straight into a NumPy array that is allocated once, before the acquisition starts. 
+  task.read, by contrast, builds a new Python list of floats on every call, which becomes 
+  the bottleneck at high sample rates and channel counts. 
  
  
   Demonstrated steps:
@@ -20,27 +25,37 @@
         the sample mode to be finite, and set the number of channels to be 
         acquired per channel.
      4. Call the Start function
-     5. Pull in a fixed number of datapoints and plot to screen with matplotlib
-        once these have been acquired.
+     5. Pull in a fixed number of datapoints into a pre-allocated array and plot to 
+        screen with matplotlib once these have been acquired.
+
+  Inputs (all optional)
+  sampleRate - Sample rate in Hz
+  pointsToPlot - Number of samples per channel read and plotted on each update. By default
+                 chosen, along with the buffer size, by pynidaqmxegs.utils.sizing for about ten
+                 updates a second (fewer on USB devices).
+  channels - Physical channels to acquire from, e.g. 'Dev1/ai0:3'
+  dtype - 'float64' or 'float32'. The driver returns float64. If float32 is requested the 
+          data are converted into a second pre-allocated array, halving the memory used by 
+          downstream processing.
+  recordTo - Optional path of a file to which all the data are saved as they are acquired.
+             Saving is done by a background thread (pynidaqmxegs.utils.StreamRecorder) so 
+             it does not slow down the acquisition loop. Load the file with StreamRecorder.load.
 
   
   Rob Campbell - SWC, 2020
  
 '''
 
-def hardwareContinuousVoltage():
+def hardwareContinuousVoltage(sampleRate=1E3, pointsToPlot=None, channels='Dev1/ai0', dtype='float64', recordTo=None):
     import nidaqmx
     from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+    from nidaqmx.stream_readers import AnalogMultiChannelReader  # https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
     import numpy as np
     import matplotlib.pyplot as plt
-
-    # Define variables
-    sampleRate = 1E3     # Sample Rate in Hz
-    pointsToPlot = 150
+    from pynidaqmxegs.utils import StreamRecorder, sizing
 
     plt.ion() # Enable pyplot interactive mode
     tPlot, tAx = plt.subplots()
-    tLine, = tAx.plot(np.zeros(pointsToPlot),'-')
     tAx.set_title('incoming data')
     tAx.set_xlabel('time [samples]')
     tAx.set_ylabel('voltage [V]')
@@ -58,7 +73,26 @@ def hardwareContinuousVoltage():
         #   But see defaults: help(task.ai_channels.add_ai_voltage_chan)
         #   C equivalent - DAQmxCreateAIVoltageChan
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
-        task.ai_channels.add_ai_voltage_chan('Dev1/ai0')
+        task.ai_channels.add_ai_voltage_chan(channels)
+        numChannels = task.number_of_channels
+
+        # * Choose how many samples to read at a time and the size of the buffer from the device's
+        #   bus: too many small reads overrun USB devices and waste CPU on any device
+        plan = sizing.plan_buffers(sampleRate, numChannels, device=channels, target_latency=0.1)
+        if pointsToPlot is None:
+            pointsToPlot = plan.chunk_size
+        bufferSize = pointsToPlot * max(4, int(np.ceil(plan.buffer_size / pointsToPlot)))  # A whole number of reads
+
+        # * Pre-allocate the arrays the data will be read into. These are re-used on every 
+        #   iteration so the acquisition loop allocates nothing. Stream readers fill float64 
+        #   arrays of shape (channels, samples) in place.
+        data = np.zeros((numChannels, pointsToPlot), dtype=np.float64)
+        if np.dtype(dtype) == np.float64:
+            plotData = data
+        else:
+            plotData = np.zeros((numChannels, pointsToPlot), dtype=dtype)
+
+        tLines = tAx.plot(np.zeros((pointsToPlot, numChannels)),'-') # One line per channel
 
 
         # * Configure the sampling rate and the number of samples
@@ -66,24 +100,48 @@ def hardwareContinuousVoltage():
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   More details at: "help(task.cfg_samp_clk_timing)
         #   https://nidaqmx-python.readthedocs.io/en/latest/constants.html
-        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=pointsToPlot*2, sample_mode=AcquisitionType.CONTINUOUS)
+        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=bufferSize, sample_mode=AcquisitionType.CONTINUOUS)
+
+        # * Create a stream reader that reads all channels into a NumPy array
+        #   Reads doubles using DAQmxReadAnalogF64
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxreadanalogf64/
+        reader = AnalogMultiChannelReader(task.in_stream)
+
+        # * Optionally save everything to disk from a background thread
+        recorder = None
+        if recordTo is not None:
+            recorder = StreamRecorder.from_task(task, recordTo)
+            recorder.start()
+
         # We configured no triggers, so the acquisition starts as soon as hTask.start is run
         # Start the task and plot the data
         task.start()
 
         numUpdates=1
-        while True:
-          # We reach this point once all data have been read
-          data = task.read(number_of_samples_per_channel=pointsToPlot)
-          # Plot data points to screen
-          tLine.set_ydata((data)) # Replace y data
-          tAx.set_title('update #%d' % numUpdates)
-          # Ensure points stay in range
-          tAx.relim()
-          tAx.autoscale_view()
-          tPlot.canvas.draw()
-          tPlot.canvas.flush_events()
-          numUpdates = numUpdates+1
+        try:
+          while True:
+            # Blocks until pointsToPlot samples per channel have been acquired, then fills data in place
+            reader.read_many_sample(data, number_of_samples_per_channel=pointsToPlot)
+            if recorder is not None:
+              recorder.write(data) # Only copies the data and queues them for the writer thread
+            if plotData is not data:
+              np.copyto(plotData, data, casting='same_kind')
+            # Plot data points to screen
+            for tLine, row in zip(tLines, plotData):
+              tLine.set_ydata(row)
+            tAx.set_title('update #%d' % numUpdates)
+            # Ensure points stay in range
+            tAx.relim()
+            tAx.autoscale_view()
+            tPlot.canvas.draw()
+            tPlot.canvas.flush_events()
+            numUpdates = numUpdates+1
+        except KeyboardInterrupt:
+          pass
+        finally:
+          if recorder is not None:
+            recorder.close()
+            print('Recorded to %s: %s' % (recordTo, recorder.stats()))
 
         task.stop()
 
@@ -0,0 +1,115 @@
+'''
+  Example showing continuous hardware-timed analog input with the analysis done in other processes
+
+  pynidaqmxegs.ai.hardwareContinuousVoltageProcessPool
+
+  Purpose
+  Shows how to do hardware-timed analog input using NI's nidaqmx-python package.
+  More details at https://github.com/ni/nidaqmx-python
+
+  This function acquires continuously from several channels and analyses every chunk of
+  data: it finds the RMS voltage and the frequency of the largest peak in the spectrum of
+  each channel. The analysis is not done in the callback, nor even in this process. The
+  callback copies each chunk into shared memory and a pool of worker processes analyses
+  it (pynidaqmxegs.utils.ProcessPoolStage). So the analysis can use all the CPU cores
+  and can not hold up the acquisition. The results come back in the order the data were
+  acquired and are printed by the main thread.
+
+
+  Demonstrated steps:
+     1. Create a task.
+     2. Create Analog Input voltage channels.
+     3. Define the sample rate for the voltage acquisition and set continuous acquisition.
+     4. Call the Start function
+     5. Run a callback function every chunk that reads the data and submits them for analysis.
+     6. Print the results as they become available.
+
+  Inputs (all optional)
+  sampleRate - Sample rate in Hz
+  chunkSize - Number of samples per channel analysed at a time. By default chosen, along with
+              the buffer size, by pynidaqmxegs.utils.sizing for about five chunks a second.
+  channels - Physical channels to acquire from, e.g. 'Dev1/ai0:3'
+  numWorkers - Number of analysis processes. Defaults to the number of CPUs.
+
+  Rob Campbell - SWC, 2020
+
+'''
+
+import numpy as np
+
+
+def analyseChunk(chunk):
+    '''
+    The analysis run in the worker processes. Returns the RMS of each channel and the
+    index of the largest peak of each channel's spectrum (excluding DC).
+    It must be at the top level of a module so the workers can import it.
+    '''
+    rms = np.sqrt(np.mean(chunk**2, axis=1))
+    spectrum = np.abs(np.fft.rfft(chunk, axis=1))
+    peak = np.argmax(spectrum[:, 1:], axis=1) + 1
+    return rms, peak
+
+
+def hardwareContinuousVoltageProcessPool(sampleRate=1E4, chunkSize=None, channels='Dev1/ai0:3', numWorkers=None):
+    import nidaqmx
+    from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+    import time
+    from pynidaqmxegs.utils import ProcessPoolStage, sizing
+
+
+    def submitChunk(tTask, event_type, num_samples, callback_data):
+        # Runs in the driver's callback thread: read the new samples and copy them into
+        # shared memory for a worker. Nothing else is done here, so this returns quickly.
+        reader.read_many_sample(chunk, number_of_samples_per_channel=chunkSize)
+        stage.submit(chunk)
+        return 0
+
+
+    print('Opening task (ctrl-c to stop)')
+    with nidaqmx.Task('hardwareContinuousVoltageProcessPool') as task:
+
+        # * Set up the analog input channels
+        #   C equivalent - DAQmxCreateAIVoltageChan
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
+        task.ai_channels.add_ai_voltage_chan(channels)
+        numChannels = task.number_of_channels
+
+        # * Size the chunks and the DAQmx buffer for the device's bus
+        plan = sizing.plan_buffers(sampleRate, numChannels, device=channels, target_latency=0.2)
+        if chunkSize is None:
+            chunkSize = plan.chunk_size
+        bufferSize = chunkSize * max(4, int(np.ceil(plan.buffer_size / chunkSize)))  # A whole number of chunks
+        chunk = np.zeros((numChannels, chunkSize))   # The callback reads into this pre-allocated array
+
+        # * Configure the sampling rate and continuous acquisition
+        #   C equivalent - DAQmxCfgSampClkTiming
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
+        task.timing.cfg_samp_clk_timing(sampleRate, samps_per_chan=bufferSize, sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogMultiChannelReader(task.in_stream)
+
+        # * Start the worker processes, each with the shared memory mapped in
+        stage = ProcessPoolStage(analyseChunk, numChannels, chunkSize, num_workers=numWorkers)
+
+        # * Register a callback funtion to be run every chunkSize samples
+        task.register_every_n_samples_acquired_into_buffer_event(chunkSize, submitChunk)
+        task.start()
+
+        try:
+            while True:
+                if stage.pending == 0:
+                    time.sleep(0.05)
+                    continue
+                # Print the results in the order the chunks were acquired. Waits for the next one.
+                rms, peak = stage.get()
+                description = ', '.join('%0.3f V RMS / %0.1f Hz' % (r, p * sampleRate / chunkSize) for r, p in zip(rms, peak))
+                print('%s  (%d chunks pending, %d dropped)' % (description, stage.pending, stage.dropped))
+        except KeyboardInterrupt:
+            pass
+
+        task.stop()
+        stage.close(wait=False)
+
+
+if __name__ == '__main__':
+    hardwareContinuousVoltageProcessPool()
@@ -0,0 +1,136 @@
+'''
+  Example showing a live power spectrum of continuous hardware-timed analog input
+
+  pynidaqmxegs.ai.hardwareContinuousVoltageSpectrum
+
+  Purpose
+  Shows how to display the power spectral density of one or more AI channels as they
+  are acquired, at sample rates of 1 MS/s and above.
+
+  The acquisition and the display run at different rates. The callback reads each chunk
+  and adds it to a pynidaqmxegs.utils.SpectrumAnalyzer, which cuts the stream into
+  overlapping frames (across chunk boundaries), windows and transforms them and averages
+  the last few. That is all the callback does, so it keeps up with the device. A Qt timer
+  redraws the plot at no more than maxFrameRate times a second, and only if a new frame
+  has been analysed since the last redraw: the cost of drawing does not depend on the
+  sample rate, and a screen can not show more than a few tens of frames a second anyway.
+
+  Demonstrated steps:
+     1. Create a task.
+     2. Create an Analog Input voltage channel.
+     3. Define the sample rate and continuous acquisition. The chunk and the DAQmx buffer
+        are sized for the device's bus by pynidaqmxegs.utils.sizing.
+     4. Register a callback that reads each chunk into a pre-allocated array and adds it
+        to the spectrum analyzer.
+     5. Call the Start function
+     6. Redraw the averaged spectrum, in dB, from a Qt timer.
+
+  Inputs (optional)
+  sampleRate - Sample rate in Hz
+  channels - Physical channels to acquire, e.g. 'Dev1/ai0:1'
+  nfft - Samples per frame. The frequency resolution is sampleRate/nfft.
+  averages - Number of frames averaged in each displayed spectrum
+  maxFrameRate - Most redraws of the plot per second
+  profiler - A pynidaqmxegs.utils.CallbackProfiler that times every call of the callback.
+             Its report is printed when the window is closed. None (the default) adds no overhead.
+
+  Wiring suggestion
+  Connect a signal generator, or AO0 running one of the AO examples, to AI0.
+
+  A benchmark of the callback at 1 MS/s:
+  python -m pynidaqmxegs.bench --patterns continuous_spectrum --rates 1e6 --channels 1 --chunks 10000
+'''
+
+def hardwareContinuousVoltageSpectrum(sampleRate=1E6, channels='Dev1/ai0', nfft=4096, averages=16,
+                                      maxFrameRate=20, profiler=None):
+    import nidaqmx
+    from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+    import numpy as np
+    from pyqtgraph.Qt import QtCore
+    import pyqtgraph as pg
+    from pynidaqmxegs.utils import SpectrumAnalyzer, sizing
+
+
+    # * Create a DAQmx task
+    #   C equivalent - DAQmxCreateTask
+    #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
+    task = nidaqmx.Task('hardwareContinuousVoltageSpectrum')
+
+    # * Set up the analog input channels
+    #   C equivalent - DAQmxCreateAIVoltageChan
+    #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
+    task.ai_channels.add_ai_voltage_chan(channels)
+    numChannels = task.number_of_channels
+
+
+    # * Configure the sampling rate and a buffer suited to the device's bus
+    #   C equivalent - DAQmxCfgSampClkTiming
+    #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
+    plan = sizing.plan_buffers(sampleRate, numChannels, device=channels, target_latency=1 / maxFrameRate)
+    samplesPerChunk = plan.chunk_size
+    task.timing.cfg_samp_clk_timing(sampleRate, samps_per_chan=plan.buffer_size, sample_mode=AcquisitionType.CONTINUOUS)
+    sampleRate = task.timing.samp_clk_rate  # The rate the device actually uses
+
+
+    # The callback reads into this pre-allocated array and the analyzer keeps what it needs
+    chunk = np.zeros((numChannels, samplesPerChunk))
+    analyzer = SpectrumAnalyzer(numChannels, sampleRate, nfft=nfft, overlap=0.5, averages=averages)
+    reader = AnalogMultiChannelReader(task.in_stream)
+
+    def pullData(tTask, event_type, num_samples, callback_data):
+        # Runs in the driver's callback thread: read and analyse. No plotting here.
+        reader.read_many_sample(chunk, number_of_samples_per_channel=samplesPerChunk)
+        analyzer.update(chunk)
+        return 0
+
+
+    # Set up the window: one curve per channel, frequency against dB
+    app = pg.mkQApp()
+    win = pg.GraphicsLayoutWidget(show=True)
+    sPlot = win.addPlot(title='Power spectral density (%0.1f Hz resolution, %d averages)' % (analyzer.resolution, averages))
+    sPlot.setLabel('bottom', 'Frequency', units='Hz')
+    sPlot.setLabel('left', 'PSD (dB re 1 V^2/Hz)')
+    sPlot.showGrid(x=True, y=True)
+    curves = [sPlot.plot(pen=pg.intColor(ii, hues=max(numChannels, 2))) for ii in range(numChannels)]
+    lastDrawn = [-1]
+
+    def redraw():
+        # Runs in the Qt thread at most maxFrameRate times a second. Takes no lock.
+        if analyzer.frames_done == lastDrawn[0]:
+            return
+        lastDrawn[0] = analyzer.frames_done
+        freqs, psd = analyzer.spectrum_db()
+        if psd is None:
+            return
+        for curve, row in zip(curves, psd):
+            curve.setData(freqs, row)
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(redraw)
+    timer.start(int(1000 / maxFrameRate))
+
+
+    # * Register a callback function to be run every N samples
+    #   With a profiler, a wrapper that times each call is registered in its place
+    callback = pullData if profiler is None else profiler.wrap(pullData, in_stream=task.in_stream)
+    task.register_every_n_samples_acquired_into_buffer_event(samplesPerChunk, callback)
+
+    # We configured no triggers, so the acquisition starts as soon as task.start is run
+    task.start()
+
+    # Start the Qt event loop. This blocks until the user closes the window.
+    print('\nAcquiring %d channel(s) at %g S/s in chunks of %d. Close window to stop acquisition'
+          % (numChannels, sampleRate, samplesPerChunk))
+    pg.exec()
+
+    timer.stop()
+    task.stop()
+    task.close()
+    print('%d frames analysed, %d skipped' % (analyzer.frames_done, analyzer.frames_skipped))
+    if profiler is not None:
+        print(profiler.report())
+
+
+if __name__ == '__main__':
+    hardwareContinuousVoltageSpectrum()
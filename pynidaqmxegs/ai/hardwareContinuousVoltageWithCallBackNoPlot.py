@@ -10,6 +10,12 @@
   More details at https://github.com/ni/nidaqmx-python
 
   This function acquires continuously from one channel and returns the mean continuously.
+  The callback does nothing but copy each chunk of data into a ring buffer
+  (pynidaqmxegs.utils.RingBuffer) and add it to running statistics of every sample so far
+  (pynidaqmxegs.utils.RunningStats), which is O(chunk) and takes no lock. The main thread
+  reads from the ring buffer at its own pace and prints the mean of the new data along
+  with the running statistics. So a slow consumer can not hold up the driver and cause
+  the DAQ's buffer to overflow.
  
  
   Demonstrated steps:
@@ -19,22 +25,67 @@
         the sample mode to be finite, and set the number of channels to be 
         acquired per channel.
      4. Call the Start function
-     5. Run a callback function every 40 samples.
+     5. Run a callback function every chunk of samples that copies the data into a ring buffer.
+        The chunk and the DAQmx buffer are sized for the device's bus by pynidaqmxegs.utils.sizing.
+     6. Read from the ring buffer and print the mean of the new data every 0.1 s, with the
+        running mean, standard deviation, minimum and maximum and a mean that follows
+        changes with a 1 s time constant.
+
+  Inputs (optional)
+  recordTo - Path of a file to which all the data are saved. The callback only queues each
+             chunk for a background writer thread (pynidaqmxegs.utils.StreamRecorder).
+  profiler - A pynidaqmxegs.utils.CallbackProfiler that times every call of the callback.
+             Its report is printed at the end. None (the default) adds no overhead.
+  raw - If True the callback reads the device's int16 codes (AnalogUnscaledReader.read_int16)
+        rather than float64 volts, so the ring buffer and any recording hold a quarter of the
+        bytes. The main thread converts only the data it uses to volts, into a float32
+        buffer, with pynidaqmxegs.utils.RawScaler.
   
   Rob Campbell - SWC, 2020
 
 '''
 
-def hardwareContinuousVoltageWithCallBackNoPlot():
+def hardwareContinuousVoltageWithCallBackNoPlot(recordTo=None, profiler=None, raw=False):
     import nidaqmx
     from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+    from nidaqmx.stream_readers import AnalogSingleChannelReader, AnalogUnscaledReader
     import numpy as np
+    import time
+    from pynidaqmxegs.utils import RawScaler, RingBuffer, RunningStats, StreamRecorder, sizing
 
     # Define variables
     sampleRate = 1E3     # Sample Rate in Hz
-    pointsToPlot = 40
-
-
+    channels = 'Dev1/ai0'
+    secondsToBuffer = 5  # The ring buffer holds this many seconds of data
+
+    # Samples per callback and DAQmx buffer size suited to the device's bus
+    plan = sizing.plan_buffers(sampleRate, 1, device=channels)
+    pointsToPlot = plan.chunk_size
+
+    # The callback reads into this pre-allocated array. The unscaled reader always takes a
+    # (channels x samples) array, even for one channel.
+    sampleType = np.int16 if raw else np.float64
+    chunk = np.zeros((1, pointsToPlot) if raw else pointsToPlot, dtype=sampleType)
+    ringBuffer = RingBuffer(1, int(sampleRate*secondsToBuffer), dtype=sampleType)
+    consumer = ringBuffer.reader()
+    volts = np.zeros((1, ringBuffer.capacity), dtype=np.float32)  # Raw data are scaled into this
+    stats = RunningStats(1, alpha=RunningStats.alpha_for(time_constant=1.0, sample_rate=sampleRate))
+    recorder = None
+
+
+    def pullData(tTask, event_type, num_samples, callback_data):
+        # Runs in the driver's callback thread: read the new samples and copy them into the 
+        # ring buffer. Nothing else is done here, so this returns quickly.
+        if raw:
+            reader.read_int16(chunk, number_of_samples_per_channel=pointsToPlot)
+        else:
+            reader.read_many_sample(chunk, number_of_samples_per_channel=pointsToPlot)
+        ringBuffer.write(chunk)
+        if not raw:
+            stats.update(chunk)  # Raw codes are added by the main thread once they are volts
+        if recorder is not None:
+            recorder.write(chunk)
+        return 0
 
 
     print('Opening task (ctrl-c to stop)')
@@ -49,7 +100,7 @@ def hardwareContinuousVoltageWithCallBackNoPlot():
         #   But see defaults: help(task.ai_channels.add_ai_voltage_chan)
         #   C equivalent - DAQmxCreateAIVoltageChan
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
-        task.ai_channels.add_ai_voltage_chan('Dev1/ai0')
+        task.ai_channels.add_ai_voltage_chan(channels)
 
 
         # * Configure the sampling rate and the number of samples
@@ -57,27 +108,57 @@ def hardwareContinuousVoltageWithCallBackNoPlot():
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   More details at: "help(task.cfg_samp_clk_timing)
         #   https://nidaqmx-python.readthedocs.io/en/latest/constants.html
-        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=pointsToPlot*2, sample_mode=AcquisitionType.CONTINUOUS)
+        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=plan.buffer_size, sample_mode=AcquisitionType.CONTINUOUS)
+
+        # * Reads straight into the pre-allocated chunk
+        #   https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
+        #   The channel's scaling polynomial is read now, after its range has been set
+        if raw:
+            reader = AnalogUnscaledReader(task.in_stream)
+            scaler = RawScaler.from_task(task)
+        else:
+            reader = AnalogSingleChannelReader(task.in_stream)
 
         # * Register a callback funtion to be run every N samples
-        task.register_every_n_samples_acquired_into_buffer_event(pointsToPlot,pullDataAndPlot)
+        #   With a profiler, a wrapper that times each call is registered in its place
+        callback = pullData if profiler is None else profiler.wrap(pullData, in_stream=task.in_stream)
+        task.register_every_n_samples_acquired_into_buffer_event(pointsToPlot,callback)
+
+        # * Optionally save everything to disk from a background thread
+        if recordTo is not None:
+            recorder = StreamRecorder.from_task(task, recordTo, raw=raw)
+            recorder.start()
 
         # We configured no triggers, so the acquisition starts as soon as hTask.start is run
         # Start the task and plot the data
         task.start()
-        
-        while True:
-            pass
-
-    task.stop()
 
+        # Consume the data at our own pace. If we fall more than secondsToBuffer behind,
+        # the oldest data are overwritten and counted in consumer.overwritten
+        try:
+            while True:
+                time.sleep(0.1)
+                data = consumer.read()
+                if raw:
+                    # Scale only what is used, without allocating
+                    data = scaler.to_volts(data, out=volts[:, :data.shape[1]])
+                    stats.update(data)
+                if data.shape[1] > 0:
+                    s = stats.snapshot()  # No lock: the callback is never held up
+                    print('%0.4f V  (mean of %d samples, %d lost)  running: %0.4f +/- %0.4f V, %0.4f to %0.4f V, '
+                          '1 s mean %0.4f V over %d samples' %
+                          (np.mean(data), data.shape[1], consumer.overwritten, s.mean[0], s.std[0],
+                           s.minimum[0], s.maximum[0], s.ew_mean[0], s.count))
+        except KeyboardInterrupt:
+            pass
 
-def pullDataAndPlot(tTask, event_type, num_samples, callback_data):
-    # We reach this point once all data have been read
-    data = task.read(number_of_samples_per_channel=pointsToPlot)
-    print(np.mean(data))
+        task.stop()
+        if recorder is not None:
+            recorder.close()
+            print('Recorded to %s: %s' % (recordTo, recorder.stats()))
+        if profiler is not None:
+            print(profiler.report())
 
-    return 0
 
 if __name__ == '__main__':
     hardwareContinuousVoltageWithCallBackNoPlot()
\ No newline at end of file
@@ -20,23 +20,35 @@
         acquired per channel.
      4. Call the Start function
      5. Pull in a fixed number of datapoints and plot to screen with pyqtgraph
-        once these have been acquired.
-
+        once these have been acquired. The data are reduced to the minimum and maximum 
+        of one bin per pixel (pynidaqmxegs.utils.MinMaxDecimator) before plotting, so 
+        the cost of drawing does not grow with the number of points.
+
+  Inputs (optional)
+  profiler - A pynidaqmxegs.utils.CallbackProfiler that times every call of the callback,
+             which here includes plotting. Its report is printed when the window is closed.
+             None (the default) adds no overhead.
   
   Rob Campbell - SWC, 2020
 
 '''
 
-def hardwareContinuousVoltageWithCallBackPyQtPlot():
+def hardwareContinuousVoltageWithCallBackPyQtPlot(profiler=None):
     import nidaqmx
     from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
     import numpy as np
     from pyqtgraph.Qt import QtGui, QtCore
     import pyqtgraph as pg
+    from pynidaqmxegs.utils import MinMaxDecimator, sizing
 
     # Define variables
     sampleRate = 1E3     # Sample Rate in Hz
-    pointsToPlot = 100
+    channels = 'Dev1/ai0:1'
+
+    # Samples per callback (and plotted per update) and DAQmx buffer size, chosen for about
+    # ten updates a second, or fewer if the device's bus needs it
+    plan = sizing.plan_buffers(sampleRate, 2, device=channels, target_latency=0.1)
+    pointsToPlot = plan.chunk_size
 
     # Set up the window
     app = QtGui.QApplication([])
@@ -46,12 +58,15 @@ def hardwareContinuousVoltageWithCallBackPyQtPlot():
     curve0 = tPlot.plot(pen='y')
     tPlot.setRange(yRange=(-1,1))
     curve1 = tPlot.plot(pen='g')
+    decimator = MinMaxDecimator.for_plot(tPlot)
 
     def pullDataAndPlot(tTask, event_type, num_samples, callback_data):
-        # Extract data and update plots
+        # Extract data, reduce to about two points per pixel and update plots
         data = task.read(number_of_samples_per_channel=pointsToPlot)
-        curve0.setData(np.array(data[0]))
-        curve1.setData(np.array(data[1]))
+        decimator.fit_to_plot(tPlot)
+        x, y = decimator(np.array(data))
+        curve0.setData(x[0], y[0])
+        curve1.setData(x[1], y[1])
         return 0
 
 
@@ -66,7 +81,7 @@ def hardwareContinuousVoltageWithCallBackPyQtPlot():
     #   But see defaults: help(task.ai_channels.add_ai_voltage_chan)
     #   C equivalent - DAQmxCreateAIVoltageChan
     #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
-    task.ai_channels.add_ai_voltage_chan('Dev1/ai0:1')
+    task.ai_channels.add_ai_voltage_chan(channels)
 
 
     # * Configure the sampling rate and the number of samples
@@ -74,11 +89,13 @@ def hardwareContinuousVoltageWithCallBackPyQtPlot():
     #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
     #   More details at: "help(task.cfg_samp_clk_timing)
     #   https://nidaqmx-python.readthedocs.io/en/latest/constants.html
-    task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=pointsToPlot*2, sample_mode=AcquisitionType.CONTINUOUS)
+    task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=plan.buffer_size, sample_mode=AcquisitionType.CONTINUOUS)
 
 
     # * Registera a callback funtion to be run every N samples
-    task.register_every_n_samples_acquired_into_buffer_event(pointsToPlot,pullDataAndPlot)
+    #   With a profiler, a wrapper that times each call is registered in its place
+    callback = pullDataAndPlot if profiler is None else profiler.wrap(pullDataAndPlot, in_stream=task.in_stream)
+    task.register_every_n_samples_acquired_into_buffer_event(pointsToPlot,callback)
 
     # We configured no triggers, so the acquisition starts as soon as hTask.start is run
     # Start the task and plot the data
@@ -93,6 +110,8 @@ def hardwareContinuousVoltageWithCallBackPyQtPlot():
 
     task.stop()
     task.close()
+    if profiler is not None:
+        print(profiler.report())
 
 
 if __name__ == '__main__':
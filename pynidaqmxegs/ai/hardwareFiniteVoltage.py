@@ -20,23 +20,53 @@
      3. Define the sample rate for the voltage acquisition. Additionally, define 
         the sample mode to be finite, and set the number of channels to be 
         acquired per channel.
-     4. Call the Start function and wait until acquisition is complete.
-     5. Read all data and plot to screen.
+     4. Call the Start function.
+     5. Read the data in chunks as they arrive, reporting progress, then plot to screen.
+
+  Long acquisitions
+  The data are read in chunks of chunkSize samples into a pre-allocated array rather than
+  in one call at the end. If outFile is given, that array is a memory-mapped .npy file
+  (numpy.lib.format.open_memmap) of shape (channels, samples). Then only one chunk at a
+  time is held in memory, so acquisitions far larger than the RAM are possible. The file
+  can be opened while the acquisition runs, e.g. with np.load(outFile, mmap_mode='r'):
+  samples not yet acquired read as zero.
+
+  DAQmx would otherwise allocate a host buffer for the whole of a finite acquisition, so
+  in_stream.input_buf_size is set to a few chunks (from pynidaqmxegs.utils.sizing). With a
+  memory-mapped outFile the peak memory use is then a few chunks however long the
+  acquisition. The data must be read about as fast as they arrive, which the loop does.
+
+  Inputs (all optional)
+  sampleRate - Sample rate in Hz
+  secsToAcquire - Number of seconds over which to acquire data
+  channels - Physical channels to acquire from, e.g. 'Dev1/ai0:3'
+  outFile - Path of a .npy file to stream the data into. None to keep them in memory.
+  chunkSize - Number of samples per channel read at a time. Defaults to 0.1 s of data.
+  progressCallback - Function called after each chunk as progressCallback(samplesRead, numberOfSamples).
+                     Defaults to printing the percentage done.
+  plot - If True, plot the data once acquired
+
+  Returns the data, shape (channels, samples): a numpy.memmap if outFile was given.
 
  
- 
   Rob Campbell - SWC, 2020
 '''
 
-def hardwareFiniteVoltage():
+def hardwareFiniteVoltage(sampleRate=5E3, secsToAcquire=3, channels='Dev1/ai0', outFile=None, chunkSize=None,
+                          progressCallback=None, plot=True):
     import nidaqmx
+    from nidaqmx.constants import (AcquisitionType)  # https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+    from nidaqmx.stream_readers import AnalogMultiChannelReader  # https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
     import numpy as np
-    import matplotlib.pyplot as plt
+    from pynidaqmxegs.utils import sizing
 
     # Define variables
-    sampleRate = 5E3     # Sample Rate in Hz
-    secsToAcquire = 3    # Number of seconds over which to acquire data
     numberOfSamples = int(secsToAcquire * sampleRate)
+    if chunkSize is None:
+        chunkSize = max(1, int(sampleRate * 0.1))
+    chunkSize = min(chunkSize, numberOfSamples)
+    if progressCallback is None:
+        progressCallback = lambda done, total: print('\r%3d%% acquired' % (100 * done // total), end='\n' if done == total else '')
 
 
     '''
@@ -63,7 +93,8 @@ def hardwareFiniteVoltage():
         #   But see defaults: help(task.ai_channels.add_ai_voltage_chan)
         #   C equivalent - DAQmxCreateAIVoltageChan
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
-        task.ai_channels.add_ai_voltage_chan('Dev1/ai0')
+        task.ai_channels.add_ai_voltage_chan(channels)
+        numChannels = task.number_of_channels
 
 
         # * Configure the sampling rate and the number of samples
@@ -71,22 +102,62 @@ def hardwareFiniteVoltage():
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   More details at: "help(task.cfg_samp_clk_timing)
         #   https://nidaqmx-python.readthedocs.io/en/latest/constants.html
-        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=numberOfSamples, sample_mode=nidaqmx.constants.AcquisitionType(10178))
+        task.timing.cfg_samp_clk_timing(sampleRate,samps_per_chan=numberOfSamples, sample_mode=AcquisitionType.FINITE)
+
+        # * Limit the host buffer to a few chunks rather than the whole acquisition
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/mxcprop/attr186c/
+        plan = sizing.plan_buffers(sampleRate, numChannels, device=channels, target_latency=chunkSize / sampleRate)
+        bufferSize = max(plan.buffer_size, sizing.MIN_CHUNKS_IN_BUFFER * chunkSize)
+        if bufferSize < numberOfSamples:
+            task.in_stream.input_buf_size = bufferSize
+
+        # * Allocate the array holding all the data. A memory-mapped file if outFile was given,
+        #   in which case the data go to disk as they are acquired.
+        if outFile is None:
+            data = np.zeros((numChannels, numberOfSamples))
+        else:
+            data = np.lib.format.open_memmap(outFile, mode='w+', dtype=np.float64, shape=(numChannels, numberOfSamples))
+
+        # * The stream reader reads each chunk into this array, which is then copied into the data
+        chunk = np.zeros((numChannels, chunkSize))
+        reader = AnalogMultiChannelReader(task.in_stream)
+
         # We configured no triggers, so the acquisition starts as soon as hTask.start is run
-        # Start the task and plot the data
+        # Start the task and read the data as they arrive
         task.start()
 
-        # We reach this point once all data have been read
-        data = task.read(number_of_samples_per_channel=numberOfSamples)
-
-        # Plot data points to screen
-        plt.plot(data)
+        samplesRead = 0
+        lastFlush = 0
+        while samplesRead < numberOfSamples:
+            n = min(chunkSize, numberOfSamples - samplesRead)
+            if n < chunkSize:
+                chunk = np.zeros((numChannels, n))  # The last chunk is shorter. Stream readers need a contiguous array.
+            reader.read_many_sample(chunk, number_of_samples_per_channel=n, timeout=n / sampleRate + 10)
+            data[:, samplesRead:samplesRead + n] = chunk
+            samplesRead += n
+            if outFile is not None and samplesRead - lastFlush >= sampleRate:
+                data.flush()  # About once a second, so readers of the file see the new data
+                lastFlush = samplesRead
+            progressCallback(samplesRead, numberOfSamples)
+
+        if outFile is not None:
+            data.flush()
+
+    if plot:
+        # * Plot data points to screen. Long acquisitions are reduced to the min and max of each of
+        #   a few thousand bins first, so the plot does not need a copy of all the data.
+        import matplotlib.pyplot as plt
+        from pynidaqmxegs.utils import MinMaxDecimator
+        x, y = MinMaxDecimator(2000)(data)
+        plt.plot(x.T, y.T)
         plt.xlabel('time [samples]')
         plt.ylabel('voltage [V]')
         plt.grid()
         plt.show()
 
+    return data
+
 
 
 if __name__ == '__main__':
-    hardwareFiniteVoltage
\ No newline at end of file
+    hardwareFiniteVoltage()
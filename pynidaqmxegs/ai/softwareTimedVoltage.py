@@ -7,13 +7,34 @@
   Purpose
   Describes how to do software-timed analog input using using nidaqmx-python
   This is unbuffered or "on demand" acquisition. 
+
+  Each read returns one sample from every channel (a stream reader's read_one_sample).
+  The time each read completed is recorded with time.perf_counter_ns into a pre-allocated
+  array. If a sample rate is given, reads are paced against a schedule of absolute
+  deadlines (start time + n * sample period) rather than by sleeping for a fixed period
+  after each read, so timing errors do not accumulate. Sleeping alone is too coarse for
+  short periods, so the last millisecond before each deadline is spent spinning.
+
+  At the end the achieved sample rate and the jitter of the sample intervals are reported.
+  This shows how fast, and how regularly, on-demand reads can be made before hardware
+  timing is needed.
  
  
   Demonstrated steps:
      1. Create a task.
-     2. Create an Analog Input voltage channel.
-     3. Read individual analog points a fixed number of times from a single channel.
-     4. Plot points at the end with matplotlib.
+     2. Create Analog Input voltage channels.
+     3. Read one sample from all channels a fixed number of times, timestamping each read.
+     4. Report the achieved rate and jitter.
+     5. Plot points at the end with matplotlib.
+
+  Inputs (all optional)
+  samplesToAcquire - Number of samples per channel to read, at least 1
+  sampleRate - Samples per second to aim for. None to read as fast as possible.
+  channels - Physical channels to read from, e.g. 'Dev1/ai0:3'
+  plot - If True, plot the data and the distribution of the sample intervals
+
+  Returns (data, timestamps, stats): data is (channels, samples), timestamps are perf_counter_ns
+  integers, one per sample, and stats is a dict describing the timing.
  
  
   Rob Campbell - SWC, 2020
@@ -21,15 +42,18 @@
 '''
 
 
-def softwareTimedVoltage():
+def softwareTimedVoltage(samplesToAcquire=100, sampleRate=None, channels='Dev1/ai0', plot=True):
     import nidaqmx
+    from nidaqmx.stream_readers import AnalogMultiChannelReader  # https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
     import numpy as np
-    import matplotlib.pyplot as plt
+    import time
+    from pynidaqmxegs.utils.timing import jitter_summary
 
 
-    # Define variables
-    samplesToAcquire=100
-    data = np.zeros(samplesToAcquire) # pre-allocate numpy array
+    spinTime = 1000000  # ns. Spin, rather than sleep, for this long before each deadline.
+
+    if samplesToAcquire < 1:
+        raise ValueError('samplesToAcquire must be at least 1, not %r' % samplesToAcquire)
 
     print('Acquiring data...', end=' ')
 
@@ -44,24 +68,77 @@ def softwareTimedVoltage():
         #   But see defaults: help(task.ai_channels.add_ai_voltage_chan)
         #   C equivalent - DAQmxCreateAIVoltageChan
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaivoltagechan/
-        task.ai_channels.add_ai_voltage_chan('Dev1/ai0', min_val=-10, max_val=10)
-
-
+        task.ai_channels.add_ai_voltage_chan(channels, min_val=-10, max_val=10)
+        numChannels = task.number_of_channels
+
+        # * Pre-allocate everything so the loop allocates nothing
+        data = np.zeros((numChannels, samplesToAcquire))
+        timestamps = np.zeros(samplesToAcquire, dtype=np.int64)
+        sample = np.zeros(numChannels)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        task.start()  # Avoids the task being started and stopped by every read
+
+        period = None if sampleRate is None else int(round(1E9 / sampleRate))
+        late = 0
+        tStart = time.perf_counter_ns()
         for ii in range(samplesToAcquire):
-            data[ii] = task.read()
-        
+            if period is not None:
+                deadline = tStart + ii * period
+                remaining = deadline - time.perf_counter_ns()
+                if remaining < 0:
+                    late += 1
+                elif remaining > spinTime:
+                    time.sleep((remaining - spinTime) / 1E9)
+                while time.perf_counter_ns() < deadline:
+                    pass
+
+            reader.read_one_sample(sample)  # One value from every channel
+            timestamps[ii] = time.perf_counter_ns()
+            data[:, ii] = sample
+
+        task.stop()
         print('done')
 
 
-
-        # Plot data points to screen
-        plt.plot(data)
-        plt.xlabel('time [samples]')
-        plt.ylabel('voltage [V]')
-        plt.grid()
+    # * Timing statistics
+    times = (timestamps - timestamps[0]) / 1E9
+    intervals = np.diff(times)
+    achievedRate = (samplesToAcquire - 1) / times[-1] if samplesToAcquire > 1 and times[-1] > 0 else float('nan')
+    expected = 1 / sampleRate if sampleRate is not None else (intervals.mean() if intervals.size else 0)
+    stats = dict(requested_rate=sampleRate,
+                 achieved_rate=achievedRate,
+                 late_samples=late,
+                 jitter=jitter_summary(times, expected))
+
+    print('Achieved %0.1f samples/s' % achievedRate, end='')
+    if sampleRate is not None:
+        print(' (requested %0.1f, %d samples late)' % (sampleRate, late), end='')
+    if stats['jitter'] is not None:
+        print('. Interval jitter: %0.1f us SD, %0.1f us max' % (stats['jitter']['std_us'], stats['jitter']['max_abs_us']))
+    else:
+        print()
+
+
+    if plot:
+        import matplotlib.pyplot as plt
+
+        # Plot data points to screen against the time they were read
+        fig, (axData, axJitter) = plt.subplots(2, 1)
+        axData.plot(times * 1E3, data.T, '.-')
+        axData.set_xlabel('time [ms]')
+        axData.set_ylabel('voltage [V]')
+        axData.grid()
+
+        # And the distribution of the intervals between samples
+        axJitter.hist(intervals * 1E6, bins=50)
+        axJitter.set_xlabel('sample interval [us]')
+        axJitter.set_ylabel('count')
+        fig.tight_layout()
         plt.show()
 
+    return data, timestamps, stats
+
 
 
 if __name__ == '__main__':
-    softwareTimedVoltage()
\ No newline at end of file
+    softwareTimedVoltage()
@@ -13,8 +13,11 @@
      1. Create a task.
      2. Create an Analog Input voltage channel.
      3. Read individual analog points continuously from a single channel.
-     4. Plot points as we go with pyqtgraph using a circular buffer to provide
-        a scrolling plot.
+     4. Plot points as we go with pyqtgraph using a circular buffer 
+        (pynidaqmxegs.utils.CircularBuffer) to provide a scrolling plot. The buffer
+        is a NumPy array so it can be plotted without converting it first. Long 
+        windows are reduced to the minimum and maximum of one bin per pixel 
+        (pynidaqmxegs.utils.MinMaxDecimator) before plotting.
  
  
   Rob Campbell - SWC, 2020
@@ -24,22 +27,22 @@
 
 def softwareTimedVoltageContinuous():
     import nidaqmx
-    import numpy as np
     from pyqtgraph.Qt import QtGui, QtCore
     import pyqtgraph as pg
-    from collections import deque
+    from pynidaqmxegs.utils import CircularBuffer, MinMaxDecimator
     # Set up window
     app = QtGui.QApplication([])
 
     # Define variables
     maxSamplesToPlot=100
-    data = deque(np.zeros(maxSamplesToPlot),maxlen=maxSamplesToPlot)  # pre-allocate a circular numpy buffer
+    data = CircularBuffer(maxSamplesToPlot)  # pre-allocate a circular numpy buffer
 
     # Set up plot
     win = pg.GraphicsLayoutWidget(show=True)
     pg.setConfigOptions(antialias=True)
     tPlot = win.addPlot(title="Scrolling plot")
     curve = tPlot.plot(pen='y')
+    decimator = MinMaxDecimator.for_plot(tPlot)
 
     # Build a task
     # * Create a DAQmx task named 'softwareTimedVoltage'
@@ -60,7 +63,9 @@ def softwareTimedVoltageContinuous():
     # This function will pull in one data point and update the plot
     def getDataAndUpdatePlot():
         data.append(task.read())
-        curve.setData(np.array(data)) # extract data as a numpy array and plot
+        decimator.fit_to_plot(tPlot)
+        x, y = decimator(data.view()) # oldest sample first, without copying, reduced to about two points per pixel
+        curve.setData(x, y)
 
 
     # Set up a timer to pull in data every 50 ms using software timing
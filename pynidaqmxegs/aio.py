@@ -0,0 +1,272 @@
+'''
+ asyncio interface to hardware-timed analog input and output
+
+ pynidaqmxegs.aio
+
+ Purpose
+ The examples either block in a loop waiting for data or hand control to a Qt event
+ loop. This module lets hardware-timed tasks be serviced from an asyncio event loop
+ instead, so one thread can look after several tasks, sockets and files at once
+ without blocking or busy-waiting.
+
+ The driver's every-N-samples events run in a driver thread. There the chunk is read
+ into one of a pool of pre-allocated arrays and the array is handed to the event loop
+ with loop.call_soon_threadsafe. Nothing waits for data on the event loop itself.
+
+ acquire - async generator of continuous AI chunks:
+   async for chunk in acquire('Dev1/ai0:3', sample_rate=1E5, chunk_size=1000):
+       ...   # chunk is (channels, chunk_size). It is re-used once the next chunk is requested.
+
+ AsyncAOWriter - streaming (non-regenerating) AO whose write() waits, without blocking
+ the event loop, until there is room in the output buffer:
+   async with AsyncAOWriter('Dev1/ao0', sample_rate=1E5, buffer_size=20000) as writer:
+       await writer.write(first_chunk)
+       writer.start()
+       for chunk in more_chunks:
+           await writer.write(chunk)
+       await writer.drain()  # Wait until everything written has been played out
+
+ Run "python -m pynidaqmxegs.aio" for a demo that does both at once in one event loop.
+'''
+
+import asyncio
+import queue
+
+import numpy as np
+
+
+class Overrun(Exception):
+    '''
+    Raised by acquire when the consumer fell so far behind that chunks had to be discarded
+    '''
+
+
+async def acquire(channels, sample_rate, chunk_size=None, num_chunks=None, num_buffers=16, min_val=-10.0, max_val=10.0,
+                  task_name='', on_overrun='raise'):
+    '''
+    Run a continuous AI task and yield its data chunk by chunk.
+
+    channels - physical channels, e.g. 'Dev1/ai0:3'
+    sample_rate - sample rate in Hz
+    chunk_size - samples per channel in each chunk. None to choose from the device's bus
+                 (pynidaqmxegs.utils.sizing).
+    num_chunks - stop after this many chunks. None to run until the loop is broken out of.
+    num_buffers - number of pre-allocated chunks. The consumer can be up to num_buffers-2 chunks behind.
+    on_overrun - what to do if the consumer falls further behind than that: 'raise' an Overrun
+                 or 'drop' the newest chunk and carry on
+
+    Each chunk is a (channels, chunk_size) float64 array from the pool. It is overwritten
+    after the next chunk is requested: copy it to keep it.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Queue()
+    free = queue.SimpleQueue()  # Indices of buffers the driver thread may fill
+    dropped = 0
+
+    def deliver(item):
+        # Called in the driver thread: schedule the item to be queued on the event loop
+        try:
+            loop.call_soon_threadsafe(ready.put_nowait, item)
+        except RuntimeError:
+            pass  # The event loop has closed
+
+    def read_chunk(task_handle, event_type, num_samples, callback_data):
+        nonlocal dropped
+        try:
+            index = free.get_nowait()
+        except queue.Empty:
+            # The consumer is too far behind: read into the spare buffer to keep the driver going
+            index = None
+        try:
+            reader.read_many_sample(buffers[-1] if index is None else buffers[index],
+                                    number_of_samples_per_channel=chunk_size)
+        except nidaqmx.errors.DaqError as err:
+            deliver(err)
+            return 0
+        if index is None:
+            dropped += 1
+            if on_overrun == 'raise':
+                deliver(Overrun('%d chunk(s) discarded because the consumer fell behind' % dropped))
+        else:
+            deliver(index)
+        return 0
+
+    with nidaqmx.Task(task_name) as task:
+        task.ai_channels.add_ai_voltage_chan(channels, min_val=min_val, max_val=max_val)
+        if chunk_size is None:
+            from pynidaqmxegs.utils import sizing
+            chunk_size = sizing.plan_buffers(sample_rate, task.number_of_channels, device=channels).chunk_size
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size * num_buffers,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogMultiChannelReader(task.in_stream)
+
+        # The last buffer is the spare used when the consumer falls behind
+        buffers = np.zeros((num_buffers + 1, task.number_of_channels, chunk_size))
+        for ii in range(num_buffers):
+            free.put(ii)
+
+        task.register_every_n_samples_acquired_into_buffer_event(chunk_size, read_chunk)
+        task.start()
+        held = None
+        count = 0
+        try:
+            while num_chunks is None or count < num_chunks:
+                item = await ready.get()
+                if isinstance(item, Exception):
+                    raise item
+                if held is not None:
+                    free.put(held)  # The consumer asked for another chunk so is done with the last one
+                held = item
+                count += 1
+                yield buffers[item]
+        finally:
+            task.stop()
+
+
+class AsyncAOWriter():
+    '''
+    Streaming analog output with an awaitable write. Regeneration is disabled, so data must
+    be written at least as fast as they are generated.
+    '''
+
+    def __init__(self, channels, sample_rate, buffer_size=None, notify_every=None, min_val=-10.0, max_val=10.0, task_name=''):
+        '''
+        channels - physical channels, e.g. 'Dev1/ao0:1'
+        sample_rate - sample rate in Hz
+        buffer_size - size of the output buffer in samples per channel
+        notify_every - the writer is woken to check for space each time this many samples have
+                       been transferred out of the buffer. Defaults to a quarter of the buffer.
+        If buffer_size is None both are chosen from the device's bus (pynidaqmxegs.utils.sizing).
+        '''
+        import nidaqmx
+        from nidaqmx.constants import AcquisitionType, RegenerationMode
+        from nidaqmx.stream_writers import AnalogMultiChannelWriter
+
+        if buffer_size is None:
+            from pynidaqmxegs.utils import sizing
+            plan = sizing.plan_buffers(sample_rate, device=channels)
+            buffer_size = plan.buffer_size
+            notify_every = notify_every or plan.chunk_size
+        self.buffer_size = int(buffer_size)
+        self.notify_every = int(notify_every) if notify_every else max(1, self.buffer_size // 4)
+        self._loop = None
+        self._space = None
+
+        self.task = nidaqmx.Task(task_name)
+        try:
+            self.task.ao_channels.add_ao_voltage_chan(channels, min_val=min_val, max_val=max_val)
+            self.task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=self.buffer_size,
+                                                 sample_mode=AcquisitionType.CONTINUOUS)
+            self.task.out_stream.regen_mode = RegenerationMode.DONT_ALLOW_REGENERATION
+            self.task.out_stream.output_buf_size = self.buffer_size
+            self.task.register_every_n_samples_transferred_from_buffer_event(self.notify_every, self._transferred)
+        except Exception:
+            self.task.close()
+            raise
+        self._writer = AnalogMultiChannelWriter(self.task.out_stream)
+        self.num_channels = self.task.number_of_channels
+        self.samples_written = 0
+
+
+    def _transferred(self, task_handle, event_type, num_samples, callback_data):
+        # Called in the driver thread: wake up a write waiting for space
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._space.set)
+            except RuntimeError:
+                pass  # The event loop has closed
+        return 0
+
+
+    async def write(self, data):
+        '''
+        Write (channels, samples) data, or 1D data for one channel, waiting without blocking the
+        event loop until there is room for it in the buffer. Data longer than the buffer are
+        written in pieces.
+        '''
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._space = asyncio.Event()
+
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data.reshape(1, -1)
+        if data.shape[0] != self.num_channels:
+            raise ValueError('data has %d rows but the task has %d channels' % (data.shape[0], self.num_channels))
+
+        for start in range(0, data.shape[1], self.buffer_size):
+            piece = np.ascontiguousarray(data[:, start:start + self.buffer_size])
+            while self.task.out_stream.space_avail < piece.shape[1]:
+                self._space.clear()
+                # Check again in case space appeared before the event was cleared
+                if self.task.out_stream.space_avail >= piece.shape[1]:
+                    break
+                await self._space.wait()
+            self._writer.write_many_sample(piece, timeout=0)
+            self.samples_written += piece.shape[1]
+
+
+    async def drain(self):
+        '''
+        Wait until everything written so far has been generated
+        '''
+        rate = self.task.timing.samp_clk_rate
+        while True:
+            remaining = self.samples_written - self.task.out_stream.total_samp_per_chan_generated
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining / rate)
+
+
+    def start(self):
+        '''
+        Start generating. Write some data first.
+        '''
+        self.task.start()
+
+    def stop(self):
+        self.task.stop()
+
+    def close(self):
+        self.task.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        self.close()
+
+
+async def _demo(seconds=2):
+    '''
+    Stream a sine wave out of Dev1/ao0 while acquiring it on Dev1/ai0, both from one event loop
+    '''
+    from pynidaqmxegs.utils import waveforms
+
+    sample_rate = 10000
+    chunk_size = 1000
+    wave = waveforms.sine(chunk_size, cycles=5, amplitude=2)
+
+    async def generate():
+        async with AsyncAOWriter('Dev1/ao0', sample_rate, buffer_size=chunk_size * 4) as writer:
+            for _ in range(4):
+                await writer.write(wave)
+            writer.start()
+            for _ in range(seconds * sample_rate // chunk_size - 4):
+                await writer.write(wave)
+            await writer.drain()
+            writer.stop()
+
+    async def record():
+        async for chunk in acquire('Dev1/ai0', sample_rate, chunk_size, num_chunks=seconds * sample_rate // chunk_size):
+            print('AI0: min %0.2f V  max %0.2f V' % (chunk.min(), chunk.max()))
+
+    await asyncio.gather(generate(), record())
+
+
+if __name__ == '__main__':
+    asyncio.run(_demo())
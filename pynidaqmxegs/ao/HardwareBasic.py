@@ -20,6 +20,7 @@
 
 import nidaqmx
 import numpy as np
+from pynidaqmxegs.utils import waveforms
 
 
 class HardwareBasic():
@@ -68,9 +69,8 @@ class HardwareBasic():
 
 
         # Generate sine wave data
-        x = np.arange(total_samples)
         sinFreq = 3 # Number of cycles to play out
-        y = np.sin(2 * np.pi * sinFreq * (x/total_samples))
+        y = waveforms.sine(total_samples, cycles=sinFreq)
 
         # Write data then start task
         self.h_ao.write(y, auto_start=True)
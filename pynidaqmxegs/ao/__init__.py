@@ -1,4 +1,12 @@
-from pynidaqmxegs.ao.HardwareBasic import HardwareBasic
-from pynidaqmxegs.ao.OnDemand import OnDemand
-from pynidaqmxegs.ao.hardwareContinuousVoltageCallback import hardwareContinuousVoltageCallback
-from pynidaqmxegs.ao.hardwareContinuousVoltageNoCallback import hardwareContinuousVoltageNoCallback
+# The examples are imported when first used, so importing the package is quick and does
+# not load plotting libraries that only some of them need
+from pynidaqmxegs._lazy import lazy_exports
+
+_EXPORTS = ('HardwareBasic',
+            'OnDemand',
+            'hardwareContinuousVoltageCallback',
+            'hardwareContinuousVoltageNoCallback',
+            'hardwareStreamingVoltage')
+
+# Each example is a function or class with the same name as its module
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -11,6 +11,12 @@
  internal (on-board) sample clock. The example uses no triggers. The waveform is regenerated 
  continuously using a callback function.
 
+ The buffer is written a chunk at a time, each chunk a whole number of cycles of the
+ waveform. The chunk and buffer sizes are chosen for the device's bus by
+ pynidaqmxegs.utils.sizing, so a USB device is topped up no more than a few times a second.
+ The buffer is filled before the task starts and each callback replaces the chunk that
+ has just been transferred to the device, so the write never has to wait for space.
+
 
  Monitoring the output
  If you lack an oscilloscope you may physically connect the analog output to 
@@ -38,6 +44,7 @@
 import nidaqmx
 from nidaqmx.constants import (AcquisitionType,RegenerationMode)
 import numpy as np
+from pynidaqmxegs.utils import waveforms, sizing
 
 class hardwareContinuousVoltageCallback():
 
@@ -52,9 +59,12 @@ class hardwareContinuousVoltageCallback():
     sample_rate = 5000                 # Sample Rate in Hz
     waveform = []             # Will contain a waveform to play out of the analog line
     num_samples_per_channel = [] #The length of the waveform
+    chunk = []                # A whole number of cycles of the waveform, written by each callback
     
     h_task = [] # DAQmx task handle
 
+    profiler = None  # A CallbackProfiler to time each call of top_up_buffer. None for no overhead.
+
     def __init__(self, autoconnect=False):
 
         if autoconnect:
@@ -64,16 +74,17 @@ class hardwareContinuousVoltageCallback():
     def top_up_buffer(self, hTask, event_type, num_samples, callback_data):
             '''
             This method is the callback for the analog output task.
-            It re-fills the output buffer when it is half empty
+            It replaces the chunk of samples that has just been transferred out of the buffer
             '''
-            self.h_task.write(self.waveform, timeout=5)
+            self.h_task.write(self.chunk, timeout=5)
             return 0
 
 
     def create_task(self):
 
         # Build one cycle of a sine wave and scale to 5V to play through the AO line.
-        self.waveform=np.sin(np.linspace(-np.pi,np.pi, 500))*5
+        # Waveforms are cached, so re-creating the task with the same waveform costs nothing.
+        self.waveform = waveforms.sine(500, amplitude=5)
         self.num_samples_per_channel = len(self.waveform)  # The number of samples to be stored in the buffer per channel
         print('Constructed a waveform of length %d that will played at %d samples per second' % \
               (self.num_samples_per_channel, self.sample_rate))
@@ -97,7 +108,12 @@ class hardwareContinuousVoltageCallback():
         #   C equivalent - DAQmxCfgSampClkTiming
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   https://nidaqmx-python.readthedocs.io/en/latest/timing.html
-        buffer_length = self.num_samples_per_channel*4
+        #   The buffer holds a whole number of chunks and each chunk a whole number of cycles
+        plan = sizing.plan_buffers(self.sample_rate, 1, device=self.dev_name)
+        cycles_per_chunk = int(np.ceil(plan.chunk_size / self.num_samples_per_channel))
+        self.chunk = np.tile(self.waveform, cycles_per_chunk)
+        chunks_in_buffer = max(4, int(np.ceil(plan.buffer_size / len(self.chunk))))
+        buffer_length = len(self.chunk) * chunks_in_buffer
         self.h_task.timing.cfg_samp_clk_timing(rate = self.sample_rate, \
                                                samps_per_chan = buffer_length, \
                                                sample_mode = AcquisitionType.CONTINUOUS)
@@ -113,16 +129,22 @@ class hardwareContinuousVoltageCallback():
         print('Regeneration mode is set to: %s' % str(self.h_task.out_stream.regen_mode))
 
 
-        # * Write the waveform to the buffer with a 5 second timeout in case it fails
+        # * Fill the buffer with the waveform with a 2 second timeout in case it fails
         #   Writes doubles using DAQmxWriteAnalogF64
         #   http://zone.ni.com/reference/en-XX/help/370471AG-01/daqmxcfunc/daqmxwriteanalogf64/
-        self.h_task.write(self.waveform, timeout=2)
+        self.h_task.write(np.tile(self.chunk, chunks_in_buffer), timeout=2)
 
 
-        # * Call a function to top up the buffer when half of the samples
-        #   have been played out.
-        run_after_t_samples = round(self.num_samples_per_channel*0.50) # Run when half the signal has been played
-        self.h_task.register_every_n_samples_transferred_from_buffer_event(run_after_t_samples, self.top_up_buffer)
+        # * Call a function to top up the buffer each time a chunk has been transferred out of it
+        run_after_t_samples = len(self.chunk)
+        print('Topping up the buffer with %d samples %0.1f times per second' %
+              (run_after_t_samples, self.sample_rate / run_after_t_samples))
+        #   With a profiler, a wrapper that times each call and records the free space in the
+        #   buffer is registered in its place
+        callback = self.top_up_buffer
+        if self.profiler is not None:
+            callback = self.profiler.wrap(callback, out_stream=self.h_task.out_stream)
+        self.h_task.register_every_n_samples_transferred_from_buffer_event(run_after_t_samples, callback)
 
         print('\n')
 
@@ -139,6 +161,8 @@ class hardwareContinuousVoltageCallback():
             return
 
         self.h_task.stop()
+        if self.profiler is not None:
+            print(self.profiler.report())
 
 
     # House-keeping methods follow
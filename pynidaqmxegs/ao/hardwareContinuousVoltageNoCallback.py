@@ -37,6 +37,7 @@
 import nidaqmx
 from nidaqmx.constants import (AcquisitionType,RegenerationMode)
 import numpy as np
+from pynidaqmxegs.utils import waveforms
 
 class hardwareContinuousVoltageNoCallback():
 
@@ -64,7 +65,8 @@ class hardwareContinuousVoltageNoCallback():
     def create_task(self):
 
         # Build one cycle of a sine wave and scale to 5V to play through the AO line.
-        self.waveform=np.sin(np.linspace(-np.pi,np.pi, 500))*5
+        # Waveforms are cached, so re-creating the task with the same waveform costs nothing.
+        self.waveform = waveforms.sine(500, amplitude=5)
         self.num_samples_per_channel = len(self.waveform)  # The number of samples to be stored in the buffer per channel
         print('Constructed a waveform of length %d that will played at %d samples per second' % \
               (self.num_samples_per_channel, self.sample_rate))
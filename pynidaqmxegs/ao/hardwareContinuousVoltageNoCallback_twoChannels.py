@@ -10,6 +10,14 @@
  This code plays a continuous sine wave out of an analog output channel using the DAQ's 
  internal (on-board) sample clock. The example uses no triggers.
 
+ The waveform is a (channels, samples) array, one row per channel. The buffer is sized
+ from the samples per channel (the last dimension of the array, not its length, which
+ is the number of channels) and the array is written with an AnalogMultiChannelWriter
+ rather than task.write, which would first convert it to nested lists. Both are done
+ by pynidaqmxegs.utils.aobuffer, which also checks the waveform has a row for every
+ channel. Set physical_channel to play a phase-shifted sine wave on more channels,
+ e.g. '0:7' on a device with 8 or more AO lines.
+
 
  Monitoring the output
  If you lack an oscilloscope you may physically connect the analog output to 
@@ -20,6 +28,7 @@
  Example session:
  AO = pynidaqmx.ao.hardwareContinuousVoltageCallback()
  AO.dev_name = 'Dev2' #optionally change device name to something other than Dev1
+ AO.physical_channel = '0:3' #optionally play on AO0 to AO3
  AO.create_task()
 
  Wiring suggestion:
@@ -41,6 +50,7 @@
 import nidaqmx
 from nidaqmx.constants import (AcquisitionType,RegenerationMode)
 import numpy as np
+from pynidaqmxegs.utils import aobuffer, waveforms
 
 class hardwareContinuousVoltageNoCallback_twoChannels():
 
@@ -49,10 +59,11 @@ class hardwareContinuousVoltageNoCallback_twoChannels():
     # Parameters for the acquisition (device and channels)
     dev_name = 'Dev1'      # The name of the DAQ device as shown in MAX
     task_name = 'hardAO'   # A string that will provide a label for the task
+    physical_channel = '0:1'  # AO lines on dev_name. Each plays a sine wave with a different phase.
 
     # Task configuration
     sample_rate = 5000                 # Sample Rate in Hz
-    waveform = []             # Will contain a waveform to play out of the analog line
+    waveform = []             # Will contain a (channels, samples) waveform to play out of the analog lines
     num_samples_per_channel = [] #The length of the waveform
     
     h_task = [] # DAQmx task handle
@@ -65,15 +76,6 @@ class hardwareContinuousVoltageNoCallback_twoChannels():
 
     def create_task(self):
 
-        # Build one cycle of a sine wave and scale to 5V to play through AO0.
-        # Through AO1 we will play the cosine wave.
-        w0 = np.sin(np.linspace(-np.pi,np.pi, 500))*5
-        w1 = np.cos(np.linspace(-np.pi,np.pi, 500))*5
-        self.waveform=np.stack((w0,w1))
-        self.num_samples_per_channel = len(self.waveform)  # The number of samples to be stored in the buffer per channel
-        print('Constructed a waveform of length %d that will played at %d samples per second' % \
-              (self.num_samples_per_channel, self.sample_rate))
-
         # * Create a DAQmx task
         #   C equivalent - DAQmxCreateTask 
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
@@ -84,18 +86,29 @@ class hardwareContinuousVoltageNoCallback_twoChannels():
         #   C equivalent - DAQmxCreateAOVoltageChan
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaovoltagechan/
         # https://nidaqmx-python.readthedocs.io/en/latest/ao_channel_collection.html
-        connect_at = '%s/ao0:1' % self.dev_name
+        connect_at = '%s/ao%s' % (self.dev_name, self.physical_channel)
         self.h_task.ao_channels.add_ao_voltage_chan(connect_at)
+        num_channels = self.h_task.number_of_channels
+
 
+        # Build one cycle of a sine wave and scale to 5V to play through each channel, with
+        # the phase advancing from one channel to the next: with two channels AO0 plays
+        # a sine wave and AO1 a cosine wave. The result is a (channels, samples) array
+        # and is checked against the channels in the task.
+        self.waveform = waveforms.sine(500, amplitude=5, phase=np.arange(num_channels) * np.pi / num_channels)
+        self.waveform = aobuffer.channel_array(self.waveform, num_channels)
+        self.num_samples_per_channel = aobuffer.samples_per_channel(self.waveform)  # Not len(), which is the channel count
+        print('Constructed a waveform of %d samples on each of %d channels that will played at %d samples per second' % \
+              (self.num_samples_per_channel, num_channels, self.sample_rate))
 
  
         # * Configure the sampling rate and the number of samples
         #   C equivalent - DAQmxCfgSampClkTiming
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   https://nidaqmx-python.readthedocs.io/en/latest/timing.html
-        buffer_length = self.num_samples_per_channel*4
+        #   With regeneration the buffer holds exactly one copy of the waveform, per channel
         self.h_task.timing.cfg_samp_clk_timing(rate = self.sample_rate, \
-                                               samps_per_chan = buffer_length, \
+                                               samps_per_chan = self.num_samples_per_channel, \
                                                sample_mode = AcquisitionType.CONTINUOUS)
 
 
@@ -110,10 +123,12 @@ class hardwareContinuousVoltageNoCallback_twoChannels():
 
 
 
-        # * Write the waveform to the buffer with a 5 second timeout in case it fails
-        #   Writes doubles using DAQmxWriteAnalogF64
+        # * Write the waveform to the buffer with a 2 second timeout in case it fails
+        #   Writes doubles using DAQmxWriteAnalogF64. The stream writer passes the array's
+        #   memory to the driver directly, so there is no per-sample conversion.
         #   http://zone.ni.com/reference/en-XX/help/370471AG-01/daqmxcfunc/daqmxwriteanalogf64/
-        self.h_task.write(self.waveform, timeout=2)
+        #   https://nidaqmx-python.readthedocs.io/en/latest/stream_writers.html
+        aobuffer.write_channels(self.h_task, self.waveform, timeout=2)
 
 
         print('\n')
@@ -0,0 +1,395 @@
+'''
+ Example showing hardware-timed analog output of an arbitrarily long signal streamed from Python
+
+ pynidaqmx.ao.hardwareStreamingVoltage
+
+ Purpose
+ hardwareContinuousVoltageNoCallback plays one waveform over and over (regeneration) and
+ hardwareContinuousVoltageCallback keeps writing the same waveform. Neither can play a
+ signal that does not repeat, such as a long sequence of stimuli. This class plays the
+ chunks produced by any Python iterable (e.g. a generator) exactly once, without
+ regeneration, for as long as the iterable keeps producing them.
+
+ The chunks are rendered ahead of time by a background thread. It takes chunks from the
+ iterable and copies them into a fixed pool of pre-allocated (channels, chunk_size) arrays,
+ re-cutting them to chunk_size samples whatever size the iterable yields. Slow Python code
+ in the generator therefore only matters if it is slower than real time on average. The
+ every-N-samples-transferred callback does nothing but hand rendered arrays to an
+ AnalogMultiChannelWriter, which writes them without the list conversion done by
+ task.write, and return them to the pool.
+
+ The margin, the number of samples written to the device but not yet generated, is the
+ time left before the output would underflow. It is recorded at every callback: a margin
+ that shrinks towards zero means the generator can not keep up. Callbacks at which less
+ than one chunk remained are counted in low_margin_callbacks.
+
+ When the iterable is exhausted the remaining samples are played out and the task stops
+ (wait_until_done). Chunk and buffer sizes default to those chosen for the device's bus by
+ pynidaqmxegs.utils.sizing.
+
+
+ Monitoring the output
+ If you lack an oscilloscope you may physically connect the analog output to
+ an analog input and monitor this using the NI MAX test panel. You likely will need
+ to select RSE: http://www.ni.com/white-paper/3344/en/
+
+
+ Example session:
+ def stimuli():
+     for freq in range(10, 100, 10):
+         yield waveforms.sine(5000, cycles=freq, amplitude=2)   # One second at 5 kS/s
+
+ AO = hardwareStreamingVoltage()
+ AO.source = stimuli()
+ AO.create_task()
+ AO.start_signal()
+ AO.wait_until_done()
+ print(AO.stats())
+
+ You can also run from the system command line:
+ - cd to path containing the function
+ - python hardwareStreamingVoltage.py to run the demo
+
+
+ Also see:
+ ANSI C: DAQmx_ANSI_C_examples/AO/ContGen-ExtClk-DigStart-NoRegeneration.c
+ Regeneration: http://zone.ni.com/reference/en-XX/help/370471AE-01/mxcprop/attr1453/
+'''
+
+import queue
+import threading
+import time
+
+import nidaqmx
+from nidaqmx.constants import (AcquisitionType,RegenerationMode)
+from nidaqmx.stream_writers import AnalogMultiChannelWriter
+import numpy as np
+from pynidaqmxegs.utils import sizing
+
+
+OUTPUT_UNDERFLOW = -200290  # DAQmx error code when the output buffer runs out of samples
+
+class hardwareStreamingVoltage():
+
+    # Class properties
+
+    # Parameters for the generation (device and channels)
+    dev_name = 'Dev1'      # The name of the DAQ device as shown in MAX
+    task_name = 'streamAO' # A string that will provide a label for the task
+    physical_channel = '0' # Channel number(s), e.g. 0 or '0:1'
+    min_voltage = -10      # Channel output range minimum
+    max_voltage = 10       # Channel output range maximum
+
+    # Task configuration
+    sample_rate = 5000     # Sample Rate in Hz
+    source = None          # Iterable of chunks: (channels, samples) arrays, or 1D arrays for one channel
+    chunk_size = None      # Samples per channel written per callback. None to size for the bus.
+    buffer_chunks = None   # Size of the output buffer in chunks. None to size for the bus.
+    render_ahead = 8       # Chunks rendered ahead of the output by the background thread
+
+    h_task = []            # DAQmx task handle
+
+    # Internal state
+    _writer = None         # AnalogMultiChannelWriter for the task
+    _pool = None           # Pre-allocated (buffers, channels, chunk_size) array the chunks are rendered into
+    _free = None           # Queue of indices of pool buffers ready to be rendered into
+    _ready = None          # Queue of (index, samples) of rendered buffers. (None, 0) once the source is exhausted.
+    _render_thread = None
+    _stop_rendering = None # threading.Event telling the render thread to stop
+    _stopped = False       # True once the task has been stopped
+
+
+    def __init__(self, autoconnect=False):
+
+        if autoconnect:
+            self.create_task()
+
+
+    def create_task(self):
+        '''
+        Creates the task and the pool of buffers, starts rendering the source and fills the
+        output buffer. Set source first.
+        '''
+        if self.source is None:
+            raise ValueError('Set source to an iterable of chunks before creating the task')
+
+        # * Create a DAQmx task
+        #   C equivalent - DAQmxCreateTask
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
+        self.h_task = nidaqmx.Task(self.task_name)
+
+
+        # * Set up the analog output channels on device defined by variable dev_name
+        #   C equivalent - DAQmxCreateAOVoltageChan
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreateaovoltagechan/
+        connect_at = '%s/ao%s' % (self.dev_name, self.physical_channel)
+        self.h_task.ao_channels.add_ao_voltage_chan(connect_at, min_val=self.min_voltage, max_val=self.max_voltage)
+        num_channels = self.h_task.number_of_channels
+
+
+        # * Choose the chunk and buffer sizes and configure the sample clock
+        #   C equivalent - DAQmxCfgSampClkTiming
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
+        plan = sizing.plan_buffers(self.sample_rate, num_channels, device=self.dev_name)
+        self._chunk_size = int(self.chunk_size or plan.chunk_size)
+        self._buffer_chunks = int(self.buffer_chunks or max(4, int(np.ceil(plan.buffer_size / self._chunk_size))))
+        buffer_length = self._chunk_size * self._buffer_chunks
+        self.h_task.timing.cfg_samp_clk_timing(rate = self.sample_rate, \
+                                               samps_per_chan = buffer_length, \
+                                               sample_mode = AcquisitionType.CONTINUOUS)
+
+
+        # * Do not allow sample regeneration: each sample is generated once
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/mxcprop/attr1453/
+        self.h_task.out_stream.regen_mode = RegenerationMode.DONT_ALLOW_REGENERATION
+        self.h_task.out_stream.output_buf_size = buffer_length
+        self._writer = AnalogMultiChannelWriter(self.h_task.out_stream)
+
+
+        # * Start rendering the source into a pool of buffers. Writing copies a chunk into the
+        #   driver's buffer, so the pool only holds the chunks rendered ahead and one being rendered.
+        num_buffers = self.render_ahead + 1
+        self._pool = np.zeros((num_buffers, num_channels, self._chunk_size))
+        self._free = queue.Queue()
+        for ii in range(num_buffers):
+            self._free.put(ii)
+        self._ready = queue.Queue()
+        self._render_error = None
+        self._stop_rendering = threading.Event()
+        self._render_thread = threading.Thread(target=self._render, args=(iter(self.source),),
+                                               name='%s_render' % self.task_name, daemon=True)
+        self._render_thread.start()
+
+
+        # * Fill the output buffer before the task starts
+        #   Writes doubles using DAQmxWriteAnalogF64
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxwriteanalogf64/
+        self.samples_written = 0
+        self.low_margin_callbacks = 0
+        self.min_margin = None
+        self.source_exhausted = False
+        self.error = None
+        self._stopped = False
+        for _ in range(self._buffer_chunks):
+            if not self._write_next(block=True):
+                break
+
+
+        # * Write the next chunk each time a chunk has been transferred out of the buffer
+        self.h_task.register_every_n_samples_transferred_from_buffer_event(self._chunk_size, self._top_up_buffer)
+
+        print('Streaming %d channel(s) at %d samples per second in chunks of %d samples (%0.2f s buffered)' %
+              (num_channels, self.sample_rate, self._chunk_size, buffer_length / self.sample_rate))
+
+
+    def _render(self, chunks):
+        '''
+        Runs in the background thread: copy the chunks from the source into free pool buffers,
+        cutting them to chunk_size samples
+        '''
+        index = None
+        filled = 0
+        try:
+            for chunk in chunks:
+                chunk = np.asarray(chunk, dtype=np.float64)
+                if chunk.ndim == 1:
+                    chunk = chunk.reshape(1, -1)
+                if chunk.shape[0] != self._pool.shape[1]:
+                    raise ValueError('The source produced a chunk with %d channels. The task has %d.' %
+                                     (chunk.shape[0], self._pool.shape[1]))
+                start = 0
+                while start < chunk.shape[1]:
+                    if index is None:
+                        index = self._get_free()
+                        if index is None:
+                            return
+                        filled = 0
+                    n = min(self._chunk_size - filled, chunk.shape[1] - start)
+                    self._pool[index, :, filled:filled + n] = chunk[:, start:start + n]
+                    filled += n
+                    start += n
+                    if filled == self._chunk_size:
+                        self._ready.put((index, filled))
+                        index = None
+            if index is not None:
+                self._ready.put((index, filled))  # The last, partial, chunk
+        except Exception as err:
+            self._render_error = err
+        finally:
+            self._ready.put((None, 0))
+
+
+    def _get_free(self):
+        # Wait for a free buffer, checking now and then whether rendering should stop
+        while not self._stop_rendering.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+
+    def _write_next(self, block=False):
+        '''
+        Write the next rendered chunk to the device. Returns False if there was none:
+        the source is exhausted, or (if block is False) the next chunk is not ready yet.
+        '''
+        if self.source_exhausted:
+            return False
+        try:
+            index, num_samples = self._ready.get(block=block)
+        except queue.Empty:
+            return False
+        if index is None:
+            self.source_exhausted = True
+            return False
+
+        if num_samples == self._chunk_size:
+            self._writer.write_many_sample(self._pool[index], timeout=0)
+        else:
+            # Columns of a pool buffer are not contiguous, so the final partial chunk is copied
+            self._writer.write_many_sample(np.ascontiguousarray(self._pool[index, :, :num_samples]), timeout=0)
+        self.samples_written += num_samples
+        self._free.put(index)
+        return True
+
+
+    def _top_up_buffer(self, hTask, event_type, num_samples, callback_data):
+        '''
+        Callback run each time a chunk has been transferred out of the buffer. Writes the next
+        rendered chunk(s) and records the margin before underflow.
+        '''
+        try:
+            margin = self.margin
+            if self.min_margin is None or margin < self.min_margin:
+                self.min_margin = margin
+            if margin < self._chunk_size and not self.source_exhausted:
+                self.low_margin_callbacks += 1
+
+            # Usually one chunk. More if the renderer had fallen behind and has caught up again.
+            while self.h_task.out_stream.space_avail >= self._chunk_size and self._write_next():
+                pass
+        except nidaqmx.errors.DaqError as err:
+            self.error = err
+        return 0
+
+
+    @property
+    def margin(self):
+        '''
+        Samples per channel written but not yet generated: how long, in samples, the output
+        can continue if nothing more is written
+        '''
+        if self._stopped:
+            return 0
+        return self.samples_written - self.h_task.out_stream.total_samp_per_chan_generated
+
+
+    def stats(self):
+        '''
+        Return a dict describing how well the source kept up
+        '''
+        return dict(samples_written=self.samples_written,
+                    seconds_written=self.samples_written / self.sample_rate,
+                    margin_s=self.margin / self.sample_rate,
+                    min_margin_s=None if self.min_margin is None else self.min_margin / self.sample_rate,
+                    low_margin_callbacks=self.low_margin_callbacks,
+                    rendered_ahead=self._ready.qsize(),
+                    source_exhausted=self.source_exhausted)
+
+
+    def start_signal(self):
+        if not self._task_created():
+            return
+
+        self.h_task.start()
+
+
+    def wait_until_done(self, timeout=None):
+        '''
+        Wait until the source is exhausted and everything written has been generated, then
+        stop the task. Returns False if timeout (seconds) elapsed first. Raises any error that
+        occurred while rendering or writing.
+        '''
+        if not self._task_created():
+            return False
+
+        t_end = None if timeout is None else time.perf_counter() + timeout
+        while not (self.source_exhausted and self.margin <= 0):
+            if self.error is not None:
+                raise self.error
+            if self._render_error is not None:
+                raise self._render_error
+            if t_end is not None and time.perf_counter() > t_end:
+                return False
+            time.sleep(min(0.05, max(self.margin, 1) / self.sample_rate))
+        try:
+            self.stop_signal()
+        except nidaqmx.errors.DaqError as err:
+            # The output ran out after the last sample, so the underflow this reports does not matter
+            if err.error_code != OUTPUT_UNDERFLOW:
+                raise
+        if self._render_error is not None:
+            raise self._render_error
+        return True
+
+
+    def stop_signal(self):
+        if not self._task_created():
+            return
+
+        self._stopped = True
+        if self._stop_rendering is not None:
+            self._stop_rendering.set()
+        self.h_task.stop()
+
+
+    def close(self):
+        if not self._task_created():
+            return
+
+        self.stop_signal()
+        # The thread may be waiting for a slow source, so do not wait long: it is a daemon thread
+        self._render_thread.join(timeout=1)
+        self.h_task.close()
+        self.h_task = []
+
+
+    # House-keeping methods follow
+    def _task_created(self):
+        '''
+        Return True if a task has been created
+        '''
+
+        if isinstance(self.h_task,nidaqmx.task.Task):
+            return True
+        else:
+            print('No task created: run the create_task method')
+            return False
+
+
+def _demo_stimuli(sample_rate, seconds=10):
+    '''
+    Generate a non-repeating signal: one-second tone bursts of rising frequency separated
+    by silences of random length
+    '''
+    from pynidaqmxegs.utils import waveforms
+    rng = np.random.default_rng()
+    for burst in range(seconds // 2):
+        yield waveforms.sine(int(sample_rate), cycles=10 * (burst + 1), amplitude=2)
+        yield np.zeros(int(sample_rate * rng.uniform(0.5, 1.5)))
+
+
+if __name__ == '__main__':
+    print('\nRunning demo for hardwareStreamingVoltage\n\n')
+    AO = hardwareStreamingVoltage()
+    AO.source = _demo_stimuli(AO.sample_rate)
+    AO.create_task()
+    AO.start_signal()
+    try:
+        while not AO.wait_until_done(timeout=1):
+            print(AO.stats())
+    except KeyboardInterrupt:
+        pass
+    print(AO.stats())
+    AO.close()
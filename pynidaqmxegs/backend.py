@@ -0,0 +1,61 @@
+'''
+ Selection of the DAQmx backend used by the examples
+
+ pynidaqmxegs.backend
+
+ Purpose
+ The examples all "import nidaqmx". By default this is NI's package, which talks to
+ real hardware. Selecting the "simulated" backend makes that import return
+ pynidaqmxegs.simulated instead, so the examples run unchanged without hardware.
+
+ The backend is chosen from the environment variable PYNIDAQMXEGS_BACKEND
+ ("nidaqmx" or "simulated") when pynidaqmxegs is imported. It can also be chosen
+ explicitly, which must be done before the example module is imported:
+
+ from pynidaqmxegs import backend
+ backend.use_backend('simulated')
+
+ From the system command line:
+ PYNIDAQMXEGS_BACKEND=simulated python -m pynidaqmxegs.ai.hardwareContinuousVoltage
+'''
+
+import os
+import sys
+
+
+ENV_VAR = 'PYNIDAQMXEGS_BACKEND'
+BACKENDS = ('nidaqmx', 'simulated')
+
+_current = None
+
+
+def use_backend(name=None):
+    '''
+    Select the backend called "name". If name is None the environment variable
+    PYNIDAQMXEGS_BACKEND is used, defaulting to the real nidaqmx package.
+    Returns the name of the selected backend.
+    '''
+    global _current
+
+    if name is None:
+        name = os.environ.get(ENV_VAR, '') or 'nidaqmx'
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError('Unknown backend "%s". Choose one of: %s' % (name, ', '.join(BACKENDS)))
+
+    if name == 'simulated':
+        from pynidaqmxegs import simulated
+        simulated.install()
+    elif 'pynidaqmxegs.simulated' in sys.modules:
+        # Only undo an earlier selection: there is no need to load the simulator to do nothing
+        sys.modules['pynidaqmxegs.simulated'].uninstall()
+
+    _current = name
+    return name
+
+
+def current_backend():
+    '''
+    Return the name of the backend in use
+    '''
+    return _current
@@ -0,0 +1,2 @@
+from pynidaqmxegs.bench.patterns import PATTERNS
+from pynidaqmxegs.bench.runner import cases, run_case, run_benchmark, save_results
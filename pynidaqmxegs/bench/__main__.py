@@ -0,0 +1,3 @@
+from pynidaqmxegs.bench.runner import main
+
+main()
@@ -0,0 +1,173 @@
+'''
+ Measures the time and side effects of importing the package
+
+ pynidaqmxegs.bench.imports
+
+ Purpose
+ "import pynidaqmxegs" should be cheap: a headless program that only uses, say,
+ ao.OnDemand should not pay for loading Qt or matplotlib. Each import statement is run
+ in a fresh interpreter, so nothing is already in sys.modules, and the time it takes
+ and the modules it loaded are recorded. A statement that loads any of the GUI or
+ plotting packages in FORBIDDEN fails the check.
+
+ The statements are run with the simulated backend by default so the results do not
+ depend on the NI driver being installed.
+
+ check_exports makes sure "from pynidaqmxegs.do import softwarePort" gives the class
+ even when the module pynidaqmxegs.do.softwarePort was imported first, for every name
+ the subpackages export. Each name is checked in a fresh interpreter.
+
+
+ Example session:
+ from pynidaqmxegs.bench.imports import check_imports
+ results = check_imports(['import pynidaqmxegs'])
+ results[0]['import_ms'], results[0]['forbidden']
+
+ From the system command line (exits with status 1 if a check fails):
+ python -m pynidaqmxegs.bench.imports
+'''
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from pynidaqmxegs import backend
+
+
+# Top-level packages a bare import must not load
+FORBIDDEN = ('PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'pyqtgraph', 'matplotlib')
+
+# Statements checked by default: the bare import and imports a headless program would make
+STATEMENTS = ('import pynidaqmxegs',
+              'from pynidaqmxegs.ao import OnDemand',
+              'from pynidaqmxegs.utils import waveforms',
+              'from pynidaqmxegs.mixed.AOandAI_sharedClock import AOandAI_sharedClock')
+
+# Run in the child interpreter. Prints the import time and the modules loaded by the import.
+_CHILD = '''
+import json, sys, time
+before = set(sys.modules)
+t = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - t
+print(json.dumps({"seconds": elapsed, "modules": sorted(set(sys.modules) - before)}))
+'''
+
+
+# Subpackages whose _EXPORTS are objects defined in modules of the same name
+EXPORTING_PACKAGES = ('pynidaqmxegs.ai', 'pynidaqmxegs.ao', 'pynidaqmxegs.do', 'pynidaqmxegs.utils')
+
+# Run in the child interpreter. Imports the submodule, then the name from the package.
+_EXPORT_CHILD = '''
+import importlib, json, sys, types
+package, name = sys.argv[1:3]
+importlib.import_module(package + '.' + name)
+exec('from %s import %s as value' % (package, name))
+print(json.dumps({"is_module": isinstance(value, types.ModuleType), "type": type(value).__name__}))
+'''
+
+
+def _child_env(backend_name):
+    env = dict(os.environ, **{backend.ENV_VAR: backend_name})
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_dir, env.get('PYTHONPATH')]))
+    return env
+
+
+def time_import(statement, backend_name='simulated'):
+    '''
+    Run statement in a new interpreter. Returns (seconds taken, list of modules it loaded).
+    '''
+    proc = subprocess.run([sys.executable, '-c', _CHILD, statement], env=_child_env(backend_name),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError('"%s" failed:\n%s' % (statement, proc.stderr))
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result['seconds'], result['modules']
+
+
+def check_imports(statements=STATEMENTS, repeat=5, backend_name='simulated'):
+    '''
+    Time each statement "repeat" times, each in a new interpreter, and check it loads none
+    of the FORBIDDEN packages. Returns a list with one dict per statement.
+    '''
+    results = []
+    for statement in statements:
+        times = []
+        for _ in range(repeat):
+            seconds, modules = time_import(statement, backend_name)
+            times.append(seconds)
+        forbidden = sorted({m.split('.')[0] for m in modules} & set(FORBIDDEN))
+        results.append({'statement': statement,
+                        'import_ms': float(np.median(times)) * 1E3,
+                        'max_import_ms': max(times) * 1E3,
+                        'modules_loaded': len(modules),
+                        'forbidden': forbidden,
+                        'passed': not forbidden})
+    return results
+
+
+def check_exports(packages=EXPORTING_PACKAGES, backend_name='simulated'):
+    '''
+    For each name a package exports, import its submodule and then the name from the
+    package, in a fresh interpreter. Returns a list with one dict per name: the check
+    passes if the name is the exported object and not the submodule.
+    '''
+    import importlib
+
+    results = []
+    for package in packages:
+        for name in importlib.import_module(package)._EXPORTS:
+            proc = subprocess.run([sys.executable, '-c', _EXPORT_CHILD, package, name],
+                                  env=_child_env(backend_name), capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError('Checking %s.%s failed:\n%s' % (package, name, proc.stderr))
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append({'statement': 'import %s.%s; from %s import %s' % (package, name, package, name),
+                            'type': result['type'],
+                            'passed': not result['is_module']})
+    return results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m pynidaqmxegs.bench.imports',
+                                     description='Time imports of pynidaqmxegs and check they do not load Qt or matplotlib.')
+    parser.add_argument('statements', nargs='*', default=list(STATEMENTS), help='import statements to check')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per statement')
+    parser.add_argument('--backend', default='simulated', choices=backend.BACKENDS, help='DAQmx backend')
+    parser.add_argument('--max-ms', type=float, default=None, help='also fail if the median import time exceeds this')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--no-exports', action='store_true', help='skip the check of the subpackage exports')
+    args = parser.parse_args(argv)
+
+    results = check_imports(args.statements, args.repeat, args.backend)
+    for result in results:
+        if args.max_ms is not None and result['import_ms'] > args.max_ms:
+            result['passed'] = False
+    exports = [] if args.no_exports else check_exports(backend_name=args.backend)
+
+    if args.json:
+        print(json.dumps(dict(imports=results, exports=exports), indent=1))
+    else:
+        for result in results:
+            print('%s  %7.1f ms (max %7.1f)  %4d modules  %s' %
+                  ('PASS' if result['passed'] else 'FAIL', result['import_ms'], result['max_import_ms'],
+                   result['modules_loaded'], result['statement']))
+            if result['forbidden']:
+                print('      loaded: %s' % ', '.join(result['forbidden']))
+        for result in exports:
+            if not result['passed']:
+                print('FAIL  gives the module, not what it defines:  %s' % result['statement'])
+        if exports:
+            print('%d of %d exports give the object after importing its module first' %
+                  (sum(result['passed'] for result in exports), len(exports)))
+    return 0 if all(result['passed'] for result in results + exports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,415 @@
+'''
+ Measures AO to AI loopback latency and clock phase
+
+ pynidaqmxegs.bench.loopback
+
+ Purpose
+ A closed control loop needs to know how long a value written in Python takes to reach
+ the output, how long a change at the input takes to reach Python, and whether two
+ clocks stay in step. This tool generates known steps on AO0 and finds them in the data
+ read from AI0 (wire AO0 to AI0, as for the other examples).
+
+ on_demand_latency
+ Software-timed steps are written with ao.OnDemand while a continuous AI task is read in
+ small chunks by a second thread. For each step it reports:
+  * write call: how long the write call took to return
+  * write to output: from just before the write to the sample at which AI0 crosses half
+    the step, interpolated between samples. The time of each AI sample is found from
+    the times at which reads returned, so this is too long by the shortest delay between
+    a sample being acquired and a read returning it (tens of us on PCIe).
+  * end to end: from just before the write to the return of the read that held the step:
+    what a loop that reads, decides and writes would see. Its resolution is the read
+    chunk (read_chunk samples).
+
+ clock_phase
+ AO0 regenerates a square wave with a rising edge every "period" samples while AI0 is
+ acquired at the same rate. With shared=True AI is clocked by the AO sample clock and
+ AO is triggered by the AI start trigger, as in mixed.AOandAI_sharedClock. With
+ shared=False each task uses its own clock and they are started one after the other.
+ The position of each rising edge in the AI data, compared with where it was in the AO
+ waveform, gives the phase of AI relative to AO (modulo one period) and its change over
+ time gives the drift between the clocks in parts per million. The residual after
+ removing the drift is the jitter.
+
+ Clocks on one board share its timebase, so drift is only expected with ai_device set
+ to a second board. The simulated devices have perfect clocks: expect no drift and, with
+ independent clocks, a phase that is the (random) delay between starting the tasks.
+
+ Results are dicts of numbers, including histograms as counts and bin edges, so they can
+ be saved as JSON. plot_histograms draws them with matplotlib.
+
+
+ Example session:
+ from pynidaqmxegs.bench import loopback
+ result = loopback.on_demand_latency('Dev1', steps=100)
+ result['write_to_output']['p99_us']
+ phase = loopback.clock_phase(shared=False, ai_device='Dev2', duration=10)
+ phase['drift_ppm']
+
+ From the system command line:
+ python -m pynidaqmxegs.bench.loopback --device Dev1 --rate 1e5 -o loopback.json --plot loopback.png
+
+ The backend is the one selected by PYNIDAQMXEGS_BACKEND, or the real nidaqmx package if
+ it is not set, as for the examples. Add --backend simulated to try the tool without
+ hardware. The report starts with the backend used.
+'''
+
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from pynidaqmxegs import backend
+from pynidaqmxegs.utils.timing import latency_summary
+
+
+MODES = ('on_demand', 'shared_clock', 'independent_clock')
+
+
+def histogram(values, bins=40):
+    '''
+    Histogram of a sequence of values as a dict of lists: counts and bin edges. None if
+    there are no values.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return None
+    counts, edges = np.histogram(values, bins=bins)
+    return dict(counts=counts.tolist(), edges=edges.tolist())
+
+
+def on_demand_latency(device='Dev1', ai_device=None, sample_rate=1E5, steps=200, interval=0.01,
+                      amplitude=1.0, read_chunk=None):
+    '''
+    Write "steps" software-timed steps between 0 and amplitude volts to AO0 of device, one
+    every "interval" seconds, and find them in AI0 of ai_device (default: device) sampled
+    at sample_rate. read_chunk is the number of samples per read (default: 100 us worth).
+    Returns a dict of latency summaries (in us) and histograms.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogSingleChannelReader
+    from pynidaqmxegs.ao.OnDemand import OnDemand
+
+    ai_device = ai_device or device
+    read_chunk = read_chunk or max(1, int(round(sample_rate * 1E-4)))
+    settle = max(0.05, 4 * interval)  # Time before the first and after the last step
+    num_reads = int((steps * interval + 2 * settle) * sample_rate) // read_chunk + 1
+    data = np.zeros(num_reads * read_chunk)
+    read_returned = np.zeros(num_reads)  # perf_counter time each read returned
+    t_write = np.zeros(steps)            # ...each write was called
+    t_written = np.zeros(steps)          # ...each write returned
+    levels = np.where(np.arange(steps) % 2 == 0, amplitude, 0.0)
+    reads = 0
+    errors = []
+
+    ao = OnDemand()
+    ao.dev_name = device
+    ao.create_task()
+    ao.h_ao.write(0.0)
+    stop = threading.Event()
+
+    with nidaqmx.Task() as task_ai:
+        task_ai.ai_channels.add_ai_voltage_chan('%s/ai0' % ai_device)
+        task_ai.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=len(data),
+                                           sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogSingleChannelReader(task_ai.in_stream)
+
+        def read_loop():
+            nonlocal reads
+            try:
+                while not stop.is_set() and reads < num_reads:
+                    start = reads * read_chunk
+                    reader.read_many_sample(data[start:start + read_chunk],
+                                            number_of_samples_per_channel=read_chunk, timeout=10.0)
+                    read_returned[reads] = time.perf_counter()
+                    reads += 1
+            except nidaqmx.errors.DaqError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=read_loop, daemon=True)
+        task_ai.start()
+        thread.start()
+        try:
+            t_start = time.perf_counter() + settle
+            for k in range(steps):
+                delay = t_start + k * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                t_write[k] = time.perf_counter()
+                ao.h_ao.write(levels[k])
+                t_written[k] = time.perf_counter()
+            time.sleep(settle)
+        finally:
+            stop.set()
+            thread.join()
+            task_ai.stop()
+            ao.h_ao.write(0.0)
+            ao.h_ao.close()
+
+    # The time of AI sample 0: no read can return before its last sample was acquired
+    counts = (np.arange(reads) + 1) * read_chunk
+    t0 = np.min(read_returned[:reads] - counts / sample_rate) if reads else np.nan
+    edges = _find_steps(data[:reads * read_chunk], (t_write - t0) * sample_rate, levels, amplitude / 2,
+                        int(interval * sample_rate))
+    found = ~np.isnan(edges)
+    write_to_output = t0 + edges[found] / sample_rate - t_write[found]
+    # The first read holding the sample after each crossing
+    holding = np.searchsorted(counts, np.floor(edges[found]) + 1, side='left')
+    end_to_end = read_returned[holding] - t_write[found]
+
+    return dict(device=device, ai_device=ai_device, sample_rate=sample_rate, steps=steps,
+                interval=interval, read_chunk=read_chunk, missed=int(steps - found.sum()),
+                write_call=latency_summary(t_written - t_write),
+                write_to_output=latency_summary(write_to_output),
+                end_to_end=latency_summary(end_to_end),
+                histograms=dict(write_call_us=histogram((t_written - t_write) * 1E6),
+                                write_to_output_us=histogram(write_to_output * 1E6),
+                                end_to_end_us=histogram(end_to_end * 1E6)),
+                errors=[str(err) for err in errors])
+
+
+def _find_steps(data, expected, levels, threshold, window):
+    '''
+    Fractional sample index at which data crosses threshold towards each of "levels",
+    searching from a little before each "expected" index for up to "window" samples.
+    NaN where no crossing was found.
+    '''
+    edges = np.full(len(levels), np.nan)
+    for k, (start, level) in enumerate(zip(expected, levels)):
+        if not np.isfinite(start):
+            continue
+        first = max(1, int(start) - 2)
+        segment = data[first - 1:first + window]
+        if len(segment) < 2:
+            continue
+        above = segment >= threshold
+        crossing = above[1:] & ~above[:-1] if level >= threshold else ~above[1:] & above[:-1]
+        if not crossing.any():
+            continue
+        j = int(np.argmax(crossing))   # Crossing between segment[j] and segment[j + 1]
+        edges[k] = first - 1 + j + _fraction(segment[j], segment[j + 1], threshold)
+    return edges
+
+
+def _fraction(before, after, threshold):
+    # Linear interpolation between two samples either side of a threshold
+    return (threshold - before) / (after - before) if after != before else 0.0
+
+
+def rising_edges(data, threshold):
+    '''
+    Fractional sample indices at which data rises through threshold
+    '''
+    data = np.asarray(data)
+    above = data >= threshold
+    j = np.flatnonzero(above[1:] & ~above[:-1])
+    return j + (threshold - data[j]) / (data[j + 1] - data[j])
+
+
+def clock_phase(shared=True, device='Dev1', ai_device=None, sample_rate=1E5, duration=2.0,
+                period=1000, amplitude=1.0):
+    '''
+    Regenerate a square wave with a rising edge every "period" samples on AO0 of device
+    and acquire AI0 of ai_device (default: device) for "duration" seconds, with a shared
+    sample clock or independent ones. Returns a dict of the phase of AI relative to AO,
+    the drift in ppm and the jitter, with a histogram of the jitter.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, RegenerationMode
+    from nidaqmx.stream_readers import AnalogSingleChannelReader
+    from nidaqmx.stream_writers import AnalogSingleChannelWriter
+
+    ai_device = ai_device or device
+    period = int(period)
+    waveform = np.zeros(period)
+    waveform[period // 2:] = amplitude   # Rising edge half way through each period
+    chunk = max(period, int(sample_rate * 0.05))
+    num_chunks = max(2, int(round(duration * sample_rate / chunk)))
+    data = np.zeros(num_chunks * chunk)
+    errors = []
+
+    with nidaqmx.Task() as task_ao, nidaqmx.Task() as task_ai:
+        task_ao.ao_channels.add_ao_voltage_chan('%s/ao0' % device)
+        task_ai.ai_channels.add_ai_voltage_chan('%s/ai0' % ai_device)
+
+        # * Shared: AI samples on the AO sample clock and AO starts on the AI start trigger
+        task_ai.timing.cfg_samp_clk_timing(sample_rate,
+                                           source='/%s/ao/SampleClock' % device if shared else '',
+                                           samps_per_chan=chunk * 4,
+                                           sample_mode=AcquisitionType.CONTINUOUS)
+        task_ao.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=period,
+                                           sample_mode=AcquisitionType.CONTINUOUS)
+        task_ao.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+        AnalogSingleChannelWriter(task_ao.out_stream).write_many_sample(waveform)
+        if shared:
+            task_ao.triggers.start_trigger.cfg_dig_edge_start_trig('/%s/ai/StartTrigger' % ai_device)
+
+        reader = AnalogSingleChannelReader(task_ai.in_stream)
+        task_ao.start()
+        task_ai.start()
+        try:
+            for ii in range(num_chunks):
+                reader.read_many_sample(data[ii * chunk:(ii + 1) * chunk],
+                                        number_of_samples_per_channel=chunk, timeout=10.0)
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        task_ai.stop()
+        task_ao.stop()
+
+    result = dict(shared=shared, device=device, ai_device=ai_device, sample_rate=sample_rate,
+                  duration=len(data) / sample_rate, period=period, errors=[str(err) for err in errors])
+    result.update(phase_summary(rising_edges(data, amplitude / 2), period, sample_rate))
+    return result
+
+
+def phase_summary(edges, period, sample_rate):
+    '''
+    Compare the fractional AI sample indices of rising edges with the AO samples at which
+    they were generated (period/2 + m*period). Returns the phase of AI relative to AO in
+    samples and us (modulo one period), the drift in ppm and the jitter about the drift.
+    '''
+    edges = np.asarray(edges, dtype=np.float64)
+    if edges.size < 3:
+        return dict(edges=int(edges.size), phase_samples=None, phase_us=None, drift_ppm=None,
+                    jitter_rms_us=None, jitter_pp_us=None, histograms=dict(jitter_us=None))
+
+    # Number each edge by AO period: the first one by assuming it is within half a period,
+    # the rest by their distance from it, so a missed edge does not shift the count
+    nominal = period // 2
+    first = int(np.round((edges[0] - nominal) / period))
+    number = first + np.round((edges - edges[0]) / period)
+    offsets = edges - (nominal + number * period)
+
+    drift, phase = np.polyfit(edges / sample_rate, offsets, 1)   # Samples per second, samples at time 0
+    jitter = (offsets - (phase + drift * edges / sample_rate)) / sample_rate * 1E6
+    return dict(edges=int(edges.size),
+                phase_samples=float(offsets.mean()),
+                phase_us=float(offsets.mean() / sample_rate * 1E6),
+                drift_ppm=float(drift / sample_rate * 1E6),
+                jitter_rms_us=float(np.sqrt(np.mean(jitter**2))),
+                jitter_pp_us=float(np.ptp(jitter)),
+                histograms=dict(jitter_us=histogram(jitter)))
+
+
+def characterize(modes=MODES, device='Dev1', ai_device=None, sample_rate=1E5, steps=200, interval=0.01,
+                 duration=2.0, period=1000, verbose=False):
+    '''
+    Run the measurements named in "modes" (see MODES) and return a dict of their results
+    '''
+    results = dict(backend=backend.current_backend(), device=device, ai_device=ai_device or device,
+                   sample_rate=sample_rate)
+    for mode in modes:
+        if verbose:
+            print('Measuring %s' % mode, file=sys.stderr)
+        if mode == 'on_demand':
+            results[mode] = on_demand_latency(device, ai_device, sample_rate, steps, interval)
+        elif mode in ('shared_clock', 'independent_clock'):
+            results[mode] = clock_phase(mode == 'shared_clock', device, ai_device, sample_rate, duration, period)
+        else:
+            raise ValueError('Unknown mode "%s". Choose from: %s' % (mode, ', '.join(MODES)))
+    return results
+
+
+def report(results, file=sys.stdout):
+    '''
+    Print the results of characterize as a table
+    '''
+    def _print(*args):
+        print(*args, file=file)
+
+    _print('Backend: %s' % results.get('backend'))
+    on_demand = results.get('on_demand')
+    if on_demand:
+        _print('On-demand AO (%s/ao0 -> %s/ai0 at %g S/s, %d steps, %d missed)' %
+               (on_demand['device'], on_demand['ai_device'], on_demand['sample_rate'],
+                on_demand['steps'], on_demand['missed']))
+        _print('  %-16s %9s %9s %9s %9s' % ('', 'p50 us', 'p90 us', 'p99 us', 'max us'))
+        for name in ('write_call', 'write_to_output', 'end_to_end'):
+            summary = on_demand[name]
+            if summary:
+                _print('  %-16s %9.1f %9.1f %9.1f %9.1f' %
+                       (name, summary['p50_us'], summary['p90_us'], summary['p99_us'], summary['max_us']))
+    for mode in ('shared_clock', 'independent_clock'):
+        phase = results.get(mode)
+        if not phase:
+            continue
+        if phase['phase_samples'] is None:
+            _print('%s: only %d edges found %s' % (mode, phase['edges'], '; '.join(phase['errors'])))
+            continue
+        _print('%s (%d edges in %0.1f s): phase %+0.3f samples (%+0.2f us), drift %+0.2f ppm, '
+               'jitter %0.2f us rms / %0.2f us p-p' %
+               (mode, phase['edges'], phase['duration'], phase['phase_samples'], phase['phase_us'],
+                phase['drift_ppm'], phase['jitter_rms_us'], phase['jitter_pp_us']))
+
+
+def plot_histograms(results, path=None):
+    '''
+    Plot the histograms in the results of characterize with matplotlib. Saves to "path"
+    if given, otherwise shows the figure.
+    '''
+    import matplotlib.pyplot as plt
+
+    panels = []
+    if results.get('on_demand'):
+        for name, hist in results['on_demand']['histograms'].items():
+            panels.append(('on demand: %s' % name.replace('_us', ''), hist))
+    for mode in ('shared_clock', 'independent_clock'):
+        if results.get(mode):
+            panels.append(('%s: jitter' % mode.replace('_', ' '), results[mode]['histograms']['jitter_us']))
+    panels = [(title, hist) for title, hist in panels if hist]
+    if not panels:
+        return None
+
+    fig, axes = plt.subplots(len(panels), 1, figsize=(6, 2.2 * len(panels)), squeeze=False)
+    for ax, (title, hist) in zip(axes[:, 0], panels):
+        edges = np.asarray(hist['edges'])
+        ax.bar(edges[:-1], hist['counts'], width=np.diff(edges), align='edge')
+        ax.set_title(title, fontsize=9)
+        ax.set_xlabel('us')
+    fig.tight_layout()
+    if path:
+        fig.savefig(path)
+        plt.close(fig)
+    else:
+        plt.show()
+    return fig
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m pynidaqmxegs.bench.loopback',
+                                     description='Measure AO to AI latency and clock phase. Wire AO0 to AI0.')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='measurements to make')
+    parser.add_argument('--device', default='Dev1', help='device generating on AO0')
+    parser.add_argument('--ai-device', default=None, help='device acquiring on AI0 (default: --device)')
+    parser.add_argument('--rate', type=float, default=1E5, help='AI (and AO) sample rate in Hz')
+    parser.add_argument('--steps', type=int, default=200, help='on-demand steps to write')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between on-demand steps')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds to acquire for each clock measurement')
+    parser.add_argument('--period', type=int, default=1000, help='samples between clock markers')
+    parser.add_argument('--backend', default=None, choices=backend.BACKENDS,
+                        help='DAQmx backend (default: %s, else nidaqmx)' % backend.ENV_VAR)
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write the results to')
+    parser.add_argument('--plot', default=None, help='image file to save histograms to (needs matplotlib)')
+    args = parser.parse_args(argv)
+
+    backend.use_backend(args.backend)
+    results = characterize(args.modes, args.device, args.ai_device, args.rate, args.steps, args.interval,
+                           args.duration, args.period, verbose=True)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as fid:
+            json.dump(results, fid, indent=1)
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        plot_histograms(results, args.plot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+'''
+ Measurements used by the benchmarks
+
+ pynidaqmxegs.bench.measure
+
+ Purpose
+ The peak memory use of a benchmark run. The summaries of read latency and callback
+ jitter are in pynidaqmxegs.utils.timing, as the examples use them too.
+'''
+
+import sys
+
+
+def peak_rss_mb():
+    '''
+    Peak resident set size of this process so far in MB, or None where the resource
+    module is not available (Windows).
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB and macOS bytes
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
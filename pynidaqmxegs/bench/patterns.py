@@ -0,0 +1,418 @@
+'''
+ The acquisition patterns timed by the benchmark
+
+ pynidaqmxegs.bench.patterns
+
+ Purpose
+ Headless versions of the acquisition patterns used by the examples: the same DAQmx
+ calls, with the plotting replaced by timing measurements. Each function runs one
+ pattern for "duration" seconds and returns a dict with:
+   samples_per_channel - number of samples per channel read, or acquired for callback
+                         patterns, (AI) or generated (AO)
+   elapsed_s - the time over which they were read or generated
+   read_latency - latency_summary of each read (or write) call
+   callback_jitter - jitter_summary of the callback times, for patterns using a callback
+   errors - list of DAQmx error messages raised during the run
+
+ All take the same arguments so the runner can sweep them uniformly. Those that do not
+ depend on sample_rate or chunk_size ignore them (see PATTERNS).
+
+ nidaqmx is imported inside the functions, as in the examples, so whichever backend is
+ selected when they run is the one used.
+'''
+
+import time
+
+import numpy as np
+
+from pynidaqmxegs.utils.timing import latency_summary, jitter_summary
+
+
+def _channels(device, kind, num_channels):
+    return '%s/%s0:%d' % (device, kind, num_channels - 1)
+
+
+def _waveform(num_channels, num_samples, amplitude=1.0):
+    phase = np.linspace(-np.pi, np.pi, num_samples, endpoint=False)
+    return np.ascontiguousarray(amplitude * np.sin(phase[np.newaxis, :] + np.arange(num_channels)[:, np.newaxis]))
+
+
+def _result(samples, elapsed, latencies=(), callback_times=(), expected_interval=None, errors=()):
+    return dict(samples_per_channel=int(samples),
+                elapsed_s=elapsed,
+                read_latency=latency_summary(latencies),
+                callback_jitter=jitter_summary(callback_times, expected_interval) if expected_interval else None,
+                errors=[str(e) for e in errors])
+
+
+def software_timed(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    On-demand reads of one sample per channel in a tight loop (ai.softwareTimedVoltage)
+    '''
+    import nidaqmx
+
+    latencies = []
+    with nidaqmx.Task() as task:
+        task.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+        task.start()
+        t_start = time.perf_counter()
+        t = t_start
+        while t - t_start < duration:
+            task.read()
+            t_end = time.perf_counter()
+            latencies.append(t_end - t)
+            t = t_end
+        task.stop()
+    return _result(len(latencies), t - t_start, latencies)
+
+
+def finite(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    One finite acquisition of duration seconds read in a single call (ai.hardwareFiniteVoltage).
+    The latency is the time the read returned after the last sample was due.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+    num_samples = max(2, int(sample_rate * duration))
+    data = np.zeros((num_channels, num_samples))
+    with nidaqmx.Task() as task:
+        task.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=num_samples,
+                                        sample_mode=AcquisitionType.FINITE)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        t_start = time.perf_counter()
+        task.start()
+        reader.read_many_sample(data, number_of_samples_per_channel=num_samples, timeout=duration + 10)
+        elapsed = time.perf_counter() - t_start
+        task.stop()
+    acquisition_time = num_samples / task.timing.samp_clk_rate
+    return _result(num_samples, elapsed, [max(0.0, elapsed - acquisition_time)])
+
+
+def continuous_polling(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Continuous acquisition read in chunks by a polling loop (ai.hardwareContinuousVoltage)
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+    data = np.zeros((num_channels, chunk_size))
+    latencies = []
+    errors = []
+    with nidaqmx.Task() as task:
+        task.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size * 2,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        task.start()
+        t_start = time.perf_counter()
+        t = t_start
+        try:
+            while t - t_start < duration:
+                reader.read_many_sample(data, number_of_samples_per_channel=chunk_size)
+                t_end = time.perf_counter()
+                latencies.append(t_end - t)
+                t = t_end
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        task.stop()
+    return _result(len(latencies) * chunk_size, t - t_start, latencies, errors=errors)
+
+
+def continuous_callback(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Continuous acquisition read by an every-N-samples callback
+    (ai.hardwareContinuousVoltageWithCallBackNoPlot)
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+    data = np.zeros((num_channels, chunk_size))
+    times = []
+    latencies = []
+    errors = []
+
+    def read_chunk(task_handle, event_type, num_samples, callback_data):
+        t = time.perf_counter()
+        times.append(t)
+        try:
+            reader.read_many_sample(data, number_of_samples_per_channel=chunk_size)
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        latencies.append(time.perf_counter() - t)
+        return 0
+
+    with nidaqmx.Task() as task:
+        task.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size * 2,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        task.register_every_n_samples_acquired_into_buffer_event(chunk_size, read_chunk)
+        task.start()
+        t_start = time.perf_counter()
+        time.sleep(duration)
+        acquired = task.in_stream.total_samp_per_chan_acquired
+        elapsed = time.perf_counter() - t_start
+        task.stop()
+        rate = task.timing.samp_clk_rate
+    return _result(acquired, elapsed, latencies, times, chunk_size / rate, errors)
+
+
+def continuous_spectrum(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Continuous acquisition read by an every-N-samples callback that also adds each chunk
+    to a Welch spectrum (utils.SpectrumAnalyzer, nfft=4096, 50% overlap, as in
+    ai.hardwareContinuousVoltageSpectrum). The latency is that of the read and the FFTs.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+    from pynidaqmxegs.utils import SpectrumAnalyzer
+
+    data = np.zeros((num_channels, chunk_size))
+    analyzer = SpectrumAnalyzer(num_channels, sample_rate, nfft=4096, overlap=0.5, averages=16)
+    times = []
+    latencies = []
+    errors = []
+
+    def read_chunk(task_handle, event_type, num_samples, callback_data):
+        t = time.perf_counter()
+        times.append(t)
+        try:
+            reader.read_many_sample(data, number_of_samples_per_channel=chunk_size)
+            analyzer.update(data)
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        latencies.append(time.perf_counter() - t)
+        return 0
+
+    with nidaqmx.Task() as task:
+        task.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size * 2,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        reader = AnalogMultiChannelReader(task.in_stream)
+        task.register_every_n_samples_acquired_into_buffer_event(chunk_size, read_chunk)
+        task.start()
+        t_start = time.perf_counter()
+        time.sleep(duration)
+        acquired = task.in_stream.total_samp_per_chan_acquired
+        elapsed = time.perf_counter() - t_start
+        task.stop()
+        rate = task.timing.samp_clk_rate
+    return _result(acquired, elapsed, latencies, times, chunk_size / rate, errors)
+
+
+def ao_regeneration(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    A waveform of chunk_size samples written once and regenerated (ao.hardwareContinuousVoltageNoCallback).
+    The latency is that of the single buffer write.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, RegenerationMode
+    from nidaqmx.stream_writers import AnalogMultiChannelWriter
+
+    waveform = _waveform(num_channels, chunk_size)
+    with nidaqmx.Task() as task:
+        task.ao_channels.add_ao_voltage_chan(_channels(device, 'ao', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        task.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+        writer = AnalogMultiChannelWriter(task.out_stream)
+        t = time.perf_counter()
+        writer.write_many_sample(waveform)
+        latency = time.perf_counter() - t
+        t_start = time.perf_counter()
+        task.start()
+        time.sleep(duration)
+        generated = task.out_stream.total_samp_per_chan_generated
+        elapsed = time.perf_counter() - t_start
+        task.stop()
+    return _result(generated, elapsed, [latency])
+
+
+def ao_callback(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Streaming AO without regeneration, topped up by a samples-transferred callback
+    (ao.hardwareContinuousVoltageCallback). The latency is that of each top-up write.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, RegenerationMode
+    from nidaqmx.stream_writers import AnalogMultiChannelWriter
+
+    waveform = _waveform(num_channels, chunk_size)
+    times = []
+    latencies = []
+    errors = []
+    filling = [True]
+
+    def top_up(task_handle, event_type, num_samples, callback_data):
+        t = time.perf_counter()
+        # The events fire in a burst at the start while the onboard FIFO fills, and are only
+        # paced by the sample clock once it is full: leave the burst out of the jitter
+        if filling[0]:
+            filling[0] = task.out_stream.total_samp_per_chan_generated < onboard
+        if not filling[0]:
+            times.append(t)
+        try:
+            writer.write_many_sample(waveform, timeout=5)
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        latencies.append(time.perf_counter() - t)
+        return 0
+
+    with nidaqmx.Task() as task:
+        task.ao_channels.add_ao_voltage_chan(_channels(device, 'ao', num_channels))
+        task.timing.cfg_samp_clk_timing(sample_rate, samps_per_chan=chunk_size * 4,
+                                        sample_mode=AcquisitionType.CONTINUOUS)
+        task.out_stream.regen_mode = RegenerationMode.DONT_ALLOW_REGENERATION
+        task.out_stream.output_buf_size = chunk_size * 4
+        writer = AnalogMultiChannelWriter(task.out_stream)
+        onboard = task.out_stream.output_onbrd_buf_size
+        for _ in range(4):
+            writer.write_many_sample(waveform)
+        task.register_every_n_samples_transferred_from_buffer_event(chunk_size, top_up)
+        t_start = time.perf_counter()
+        task.start()
+        time.sleep(duration)
+        try:
+            generated = task.out_stream.total_samp_per_chan_generated
+        except nidaqmx.errors.DaqError as err:  # Underflow
+            errors.append(err)
+            generated = 0
+        elapsed = time.perf_counter() - t_start
+        task.stop()
+        rate = task.timing.samp_clk_rate
+    return _result(generated, elapsed, latencies, times, chunk_size / rate, errors)
+
+
+def shared_clock(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Regenerated AO with AI clocked by the AO sample clock and AO triggered by the AI start
+    trigger (mixed.AOandAI_sharedClock). AI is read in chunks by a polling loop.
+    '''
+    import nidaqmx
+    from nidaqmx.constants import AcquisitionType, RegenerationMode
+    from nidaqmx.stream_readers import AnalogMultiChannelReader
+    from nidaqmx.stream_writers import AnalogMultiChannelWriter
+
+    data = np.zeros((num_channels, chunk_size))
+    latencies = []
+    errors = []
+    with nidaqmx.Task() as task_ao, nidaqmx.Task() as task_ai:
+        task_ao.ao_channels.add_ao_voltage_chan(_channels(device, 'ao', num_channels))
+        task_ai.ai_channels.add_ai_voltage_chan(_channels(device, 'ai', num_channels))
+
+        task_ai.timing.cfg_samp_clk_timing(sample_rate, source='/%s/ao/SampleClock' % device,
+                                           samps_per_chan=chunk_size * 2,
+                                           sample_mode=AcquisitionType.CONTINUOUS)
+        task_ao.timing.cfg_samp_clk_timing(sample_rate, sample_mode=AcquisitionType.CONTINUOUS)
+        task_ao.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+        AnalogMultiChannelWriter(task_ao.out_stream).write_many_sample(_waveform(num_channels, chunk_size))
+        task_ao.triggers.start_trigger.cfg_dig_edge_start_trig('/%s/ai/StartTrigger' % device)
+
+        reader = AnalogMultiChannelReader(task_ai.in_stream)
+        task_ao.start()
+        task_ai.start()
+        t_start = time.perf_counter()
+        t = t_start
+        try:
+            while t - t_start < duration:
+                reader.read_many_sample(data, number_of_samples_per_channel=chunk_size)
+                t_end = time.perf_counter()
+                latencies.append(t_end - t)
+                t = t_end
+        except nidaqmx.errors.DaqError as err:
+            errors.append(err)
+        task_ai.stop()
+        task_ao.stop()
+    return _result(len(latencies) * chunk_size, t - t_start, latencies, errors=errors)
+
+
+def _do_updates(num_lines, count=1024):
+    # A repeatable sequence of random values for num_lines lines, one port-format value per update
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 1 << num_lines, count).tolist()
+
+
+def do_per_line(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    Software-timed DO with one task per line and a write to every line at each update
+    (do.softwareBasic). num_channels is the number of lines. The latency is that of one
+    update of all the lines.
+    '''
+    import nidaqmx
+
+    updates = _do_updates(num_channels)
+    latencies = []
+    tasks = []
+    try:
+        for line in range(num_channels):
+            task = nidaqmx.Task()
+            tasks.append(task)
+            task.do_channels.add_do_chan('%s/port0/line%d' % (device, line))
+        t_start = time.perf_counter()
+        t = t_start
+        while t - t_start < duration:
+            value = updates[len(latencies) % len(updates)]
+            for line, task in enumerate(tasks):
+                task.write(bool(value >> line & 1))
+            t_end = time.perf_counter()
+            latencies.append(t_end - t)
+            t = t_end
+    finally:
+        for task in tasks:
+            task.close()
+    result = _result(len(latencies), t - t_start, latencies)
+    result['writes'] = len(latencies) * num_channels
+    return result
+
+
+def do_cached_port(sample_rate, num_channels, chunk_size, duration, device='Dev1'):
+    '''
+    The same updates as do_per_line through one port-wide task with a cached state
+    (do.softwarePort): the lines are set in the shadow and flushed in one write, which is
+    skipped if nothing changed.
+    '''
+    from pynidaqmxegs.do.softwarePort import softwarePort
+
+    updates = _do_updates(num_channels)
+    mask = (1 << num_channels) - 1
+    latencies = []
+    port = softwarePort()
+    port.dev_name = device
+    port.task_name = ''
+    port.lines = 'line0:%d' % (num_channels - 1)
+    port.create_task()
+    try:
+        t_start = time.perf_counter()
+        t = t_start
+        while t - t_start < duration:
+            port.assign(updates[len(latencies) % len(updates)], mask)
+            port.flush()
+            t_end = time.perf_counter()
+            latencies.append(t_end - t)
+            t = t_end
+    finally:
+        port.close()
+    result = _result(len(latencies), t - t_start, latencies)
+    result['writes'] = port.writes - 1  # Not counting the initial state
+    return result
+
+
+# name: (function, depends on sample_rate, depends on chunk_size)
+PATTERNS = {
+    'software_timed': (software_timed, False, False),
+    'finite': (finite, True, False),
+    'continuous_polling': (continuous_polling, True, True),
+    'continuous_callback': (continuous_callback, True, True),
+    'continuous_spectrum': (continuous_spectrum, True, True),
+    'ao_regeneration': (ao_regeneration, True, True),
+    'ao_callback': (ao_callback, True, True),
+    'shared_clock': (shared_clock, True, True),
+    'do_per_line': (do_per_line, False, False),
+    'do_cached_port': (do_cached_port, False, False),
+}
@@ -0,0 +1,163 @@
+'''
+ Runs the benchmark patterns over a sweep of parameters and saves the results as JSON
+
+ pynidaqmxegs.bench.runner
+
+ Purpose
+ Every combination of pattern, sample rate, channel count and chunk size is run for a
+ fixed duration against the simulated device (or real hardware if backend='nidaqmx').
+ By default each combination runs in a fresh process so that the peak RSS reported
+ belongs to that run alone and one run can not affect the next. Combinations the device
+ can not do (e.g. too high an aggregate rate) are kept in the results with their error.
+
+ Each result holds the parameters, the sustained sample rate per channel and in total,
+ the read latency percentiles, the callback jitter (callback patterns only), the peak
+ RSS in MB and any errors.
+
+
+ Example session:
+ from pynidaqmxegs import bench
+ results = bench.run_benchmark(patterns=['continuous_callback'], sample_rates=[1E5], channel_counts=[1, 4])
+ bench.save_results(results, 'bench.json')
+
+ From the system command line:
+ python -m pynidaqmxegs.bench --rates 1e4 1e5 --channels 1 4 --chunks 100 1000 -o bench.json
+'''
+
+import itertools
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pynidaqmxegs import backend
+from pynidaqmxegs.bench.measure import peak_rss_mb
+from pynidaqmxegs.bench.patterns import PATTERNS
+
+
+def cases(patterns=None, sample_rates=(1E4, 1E5, 1E6), channel_counts=(1, 4), chunk_sizes=(100, 1000, 10000), duration=1.0):
+    '''
+    Return the list of (pattern, sample_rate, num_channels, chunk_size) to run. Parameters a
+    pattern does not use are set to None, so it runs once per combination of the others.
+    Chunks longer than the whole run are skipped.
+    '''
+    if patterns is None:
+        patterns = list(PATTERNS)
+    out = []
+    for name in patterns:
+        if name not in PATTERNS:
+            raise ValueError('Unknown pattern "%s". Choose from: %s' % (name, ', '.join(PATTERNS)))
+        _, uses_rate, uses_chunk = PATTERNS[name]
+        rates = sample_rates if uses_rate else [None]
+        chunks = chunk_sizes if uses_chunk else [None]
+        for rate, num_channels, chunk in itertools.product(rates, channel_counts, chunks):
+            if rate is not None and chunk is not None and chunk > rate * duration:
+                continue
+            case = (name, rate, num_channels, chunk)
+            if case not in out:
+                out.append(case)
+    return out
+
+
+def run_case(name, sample_rate, num_channels, chunk_size, duration=1.0, device='Dev1', backend_name='simulated'):
+    '''
+    Run one pattern once and return its result dict
+    '''
+    backend.use_backend(backend_name)
+    result = dict(pattern=name, sample_rate=sample_rate, num_channels=num_channels, chunk_size=chunk_size,
+                  duration=duration, device=device)
+    try:
+        measured = PATTERNS[name][0](sample_rate, num_channels, chunk_size, duration, device)
+    except Exception as err:
+        result.update(errors=['%s: %s' % (type(err).__name__, err)], peak_rss_mb=peak_rss_mb())
+        return result
+
+    elapsed = measured['elapsed_s']
+    per_channel = measured['samples_per_channel'] / elapsed if elapsed > 0 else 0.0
+    result.update(samples_per_second_per_channel=per_channel,
+                  samples_per_second=per_channel * num_channels,
+                  peak_rss_mb=peak_rss_mb(),
+                  **measured)
+    return result
+
+
+def run_benchmark(patterns=None, sample_rates=(1E4, 1E5, 1E6), channel_counts=(1, 4), chunk_sizes=(100, 1000, 10000),
+                  duration=1.0, device='Dev1', backend_name='simulated', isolate=True, verbose=False):
+    '''
+    Run every case (see cases) and return a dict with "meta" describing the run and "results",
+    a list of one result per case. If isolate is True each case runs in a new process.
+    '''
+    todo = cases(patterns, sample_rates, channel_counts, chunk_sizes, duration)
+    results = []
+    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) if isolate else None
+    try:
+        for ii, case in enumerate(todo):
+            if verbose:
+                print('[%d/%d] %s rate=%s channels=%s chunk=%s' % ((ii + 1, len(todo)) + case), file=sys.stderr)
+            args = case + (duration, device, backend_name)
+            if pool is None:
+                result = run_case(*args)
+            else:
+                try:
+                    result = pool.apply_async(run_case, args).get(timeout=10 * duration + 60)
+                except multiprocessing.TimeoutError:
+                    result = dict(zip(('pattern', 'sample_rate', 'num_channels', 'chunk_size'), case),
+                                  duration=duration, device=device, errors=['benchmark timed out'])
+                    pool.terminate()
+                    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1)
+            results.append(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    meta = dict(date=datetime.now(timezone.utc).isoformat(),
+                backend=backend_name,
+                device=device,
+                isolated=isolate,
+                python=platform.python_version(),
+                numpy=np.__version__,
+                platform=platform.platform(),
+                machine=platform.machine(),
+                processor=platform.processor())
+    return dict(meta=meta, results=results)
+
+
+def save_results(results, path=None):
+    '''
+    Write results as JSON to the file "path", or to stdout if path is None
+    '''
+    text = json.dumps(results, indent=1)
+    if path is None:
+        print(text)
+    else:
+        with open(path, 'w') as fid:
+            fid.write(text)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m pynidaqmxegs.bench',
+                                     description='Benchmark the acquisition patterns used by the pynidaqmxegs examples.')
+    parser.add_argument('--patterns', nargs='+', choices=list(PATTERNS), default=None,
+                        help='patterns to run (default: all)')
+    parser.add_argument('--rates', nargs='+', type=float, default=[1E4, 1E5, 1E6], help='sample rates in Hz')
+    parser.add_argument('--channels', nargs='+', type=int, default=[1, 4], help='channel counts')
+    parser.add_argument('--chunks', nargs='+', type=int, default=[100, 1000, 10000], help='chunk sizes in samples per channel')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds to run each case for')
+    parser.add_argument('--device', default='Dev1', help='device name')
+    parser.add_argument('--backend', default='simulated', choices=backend.BACKENDS, help='DAQmx backend')
+    parser.add_argument('--no-isolate', action='store_true', help='run every case in this process')
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    t = time.perf_counter()
+    results = run_benchmark(args.patterns, args.rates, args.channels, args.chunks, args.duration,
+                            args.device, args.backend, isolate=not args.no_isolate, verbose=True)
+    save_results(results, args.output)
+    print('Ran %d cases in %0.1f s' % (len(results['results']), time.perf_counter() - t), file=sys.stderr)
@@ -1 +1,10 @@
-from pynidaqmxegs.do.softwareBasic import softwareBasic
+# The examples are imported when first used, so importing the package is quick and does
+# not load plotting libraries that only some of them need
+from pynidaqmxegs._lazy import lazy_exports
+
+_EXPORTS = ('softwareBasic',
+            'hardwarePattern',
+            'softwarePort')
+
+# Each example is a function or class with the same name as its module
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,312 @@
+'''
+ Example showing hardware-timed digital output of a TTL sequence
+
+ pynidaqmxegs.do.hardwarePattern
+
+ Purpose
+ softwareBasic sets lines one write at a time with time.sleep in between, so the timing
+ of each edge depends on Python and the operating system: errors of a millisecond or
+ more are common. This class plays a sequence of line transitions from a buffer using a
+ sample clock, so every edge is placed to within one sample period (1 us at 1 MHz).
+
+ The sequence is described by a pynidaqmxegs.utils.DigitalTimeline: the times at which
+ lines go high or low. It is compiled to port-format samples (one uint32 per sample
+ whose bit N is line N) and written with DigitalSingleChannelWriter, whose
+ write_many_sample_port_uint32 passes the array straight to DAQmxWriteDigitalU32.
+
+ How the pattern is played depends on its length and on "repeat":
+  * repeat False, fits in max_buffer_samples: a finite task plays the pattern once
+  * repeat True, fits in max_buffer_samples: the pattern is written once and regenerated
+    by the device until stop_signal is called. The CPU does nothing while it plays.
+  * longer than max_buffer_samples (or stream=True): regeneration is off and the pattern
+    is rendered a chunk at a time in an every-N-samples-transferred callback, so it can
+    be far longer than the buffer. With repeat True it wraps round, otherwise the lines
+    hold their final state after the last transition.
+
+ Sharing a sample clock
+ Set clock_source to another task's sample clock, e.g. '/Dev1/ai/SampleClock', and
+ sample_rate to that task's rate, to lock the pattern to an acquisition or to AO: sample
+ N of the pattern is output on the same clock edge as sample N of the other task. Start
+ this task first: it waits for the other task's clock. Devices whose DO has no timing
+ engine of its own (e.g. M series) can only do hardware-timed DO this way.
+
+
+ Wiring suggestion
+ As for softwareBasic: wire port0/line0 to USER1 and port0/line1 to USER2 and those to
+ AI0 and AI1, or look at the lines with a scope.
+
+
+ Example session:
+ from pynidaqmxegs.utils import DigitalTimeline
+ tl = DigitalTimeline()
+ tl.pulse(line=0, start=0.001, width=20E-6, period=0.01, count=100)   # Camera trigger at 100 Hz
+ tl.set(0.0005, line=1, value=True)                                   # Shutter open...
+ tl.set(0.9995, line=1, value=False)                                  # ...and closed
+ DO = hardwarePattern()
+ DO.timeline = tl
+ DO.create_task()
+ DO.start_signal()
+ DO.wait_until_done()
+ DO.close()
+
+ You can also run from the system command line:
+ - cd to path containing the function
+ - python hardwarePattern.py to run the demo
+
+
+ Also see:
+ ANSI C: DAQmx_ANSI_C_examples/DO/ContWriteDigPort-ExtClk.c
+ Correlated DIO: https://www.ni.com/docs/en-US/bundle/ni-daqmx/page/mxcncpts/correlatedio.html
+'''
+
+import time
+
+import nidaqmx
+from nidaqmx.constants import (AcquisitionType, LineGrouping, RegenerationMode)
+from nidaqmx.stream_writers import DigitalSingleChannelWriter
+import numpy as np
+from pynidaqmxegs.utils import sizing
+
+
+OUTPUT_UNDERFLOW = -200290  # DAQmx error code when the output buffer runs out of samples
+
+class hardwarePattern():
+
+    # Class properties
+
+    # Parameters for the generation (device and lines)
+    dev_name = 'Dev1'            # The name of the DAQ device as shown in MAX
+    task_name = 'patternDO'      # A string that will provide a label for the task
+    lines = 'port0/line0:7'      # Lines on one port. Bit N of each sample drives line N of the port.
+
+    # Task configuration
+    sample_rate = 1E6            # Sample Rate in Hz: the timing resolution of the pattern
+    timeline = None              # pynidaqmxegs.utils.DigitalTimeline to play
+    duration = None              # Length of the pattern in seconds. None to end just after the last transition.
+    repeat = False               # True to play the pattern over and over until stopped
+    stream = None                # True to stream chunks rather than write the whole pattern. None to stream only if needed.
+    max_buffer_samples = 2**22   # Longest pattern written to the buffer in one go (16 MB of uint32)
+    clock_source = ''            # e.g. '/Dev1/ai/SampleClock' to share the AI sample clock. '' for the DO's own clock.
+
+    h_task = []                  # DAQmx task handle
+
+    # Internal state
+    _writer = None               # DigitalSingleChannelWriter for the task
+    _chunk = None                # Pre-allocated uint32 chunk rendered into when streaming
+    _streaming = False
+
+
+    def __init__(self, autoconnect=False):
+
+        if autoconnect:
+            self.create_task()
+
+
+    def create_task(self):
+        '''
+        Compiles the timeline, creates the task and fills its buffer. Set timeline first.
+        '''
+        if self.timeline is None:
+            raise ValueError('Set timeline to a DigitalTimeline before creating the task')
+
+        self.num_samples = self.timeline.num_samples(self.sample_rate, self.duration)
+        self._streaming = self.stream if self.stream is not None else self.num_samples > self.max_buffer_samples
+        print('%d transitions on line(s) %s: %d samples (%0.3f s) at %0.3g us resolution' %
+              (len(self.timeline), self.timeline.lines, self.num_samples,
+               self.num_samples / self.sample_rate, 1E6 / self.sample_rate))
+
+
+        # * Create a DAQmx task
+        #   C equivalent - DAQmxCreateTask
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
+        self.h_task = nidaqmx.Task(self.task_name)
+
+
+        # * Define one digital output channel covering all the lines, so each sample is a
+        #   whole port value rather than one boolean per line
+        #   C equivalent - DAQmxCreateDOChan
+        #   http://zone.ni.com/reference/en-XX/help/370471AC-01/daqmxcfunc/daqmxcreatedochan/
+        connect_at = '%s/%s' % (self.dev_name, self.lines)
+        self.h_task.do_channels.add_do_chan(connect_at, line_grouping=LineGrouping.CHAN_FOR_ALL_LINES)
+        self._writer = DigitalSingleChannelWriter(self.h_task.out_stream)
+
+
+        # * Configure the sample clock, either the DO's own or one shared with another task
+        #   C equivalent - DAQmxCfgSampClkTiming
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
+        if self._streaming:
+            plan = sizing.plan_buffers(self.sample_rate, 1, device=self.dev_name)
+            self._chunk = np.zeros(plan.chunk_size, dtype=np.uint32)
+            buffer_length = plan.buffer_size
+            sample_mode = AcquisitionType.CONTINUOUS
+        else:
+            buffer_length = self.num_samples
+            sample_mode = AcquisitionType.CONTINUOUS if self.repeat else AcquisitionType.FINITE
+        self.h_task.timing.cfg_samp_clk_timing(rate = self.sample_rate, \
+                                               source = self.clock_source, \
+                                               samps_per_chan = buffer_length, \
+                                               sample_mode = sample_mode)
+
+
+        # * Regenerate a repeating pattern that fits in the buffer. Otherwise each sample is
+        #   written once.
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/mxcprop/attr1453/
+        if self._streaming:
+            self.h_task.out_stream.regen_mode = RegenerationMode.DONT_ALLOW_REGENERATION
+            self.h_task.out_stream.output_buf_size = buffer_length
+        else:
+            self.h_task.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+
+
+        # * Write the pattern, or the first buffer-full of it, before the task starts
+        #   Writes port-format samples using DAQmxWriteDigitalU32
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxwritedigitalu32/
+        self.samples_written = 0
+        self.error = None
+        if self._streaming:
+            for _ in range(buffer_length // len(self._chunk)):
+                self._write_next_chunk()
+
+            # * Render and write the next chunk each time one has left the buffer
+            self.h_task.register_every_n_samples_transferred_from_buffer_event(len(self._chunk), self._top_up_buffer)
+        else:
+            self._writer.write_many_sample_port_uint32(self.timeline.compile(self.sample_rate, self.duration))
+            self.samples_written = self.num_samples
+
+
+    def _write_next_chunk(self):
+        '''
+        Render the next chunk of the pattern into the pre-allocated chunk and write it
+        '''
+        chunk = self._chunk
+        position = self.samples_written
+        if not self.repeat:
+            self.timeline.render(self.sample_rate, position, len(chunk), out=chunk)
+        else:
+            # Wrap round to the start of the pattern as often as needed
+            filled = 0
+            while filled < len(chunk):
+                start = (position + filled) % self.num_samples
+                n = min(len(chunk) - filled, self.num_samples - start)
+                self.timeline.render(self.sample_rate, start, n, out=chunk[filled:filled + n])
+                filled += n
+        self._writer.write_many_sample_port_uint32(chunk, timeout=0)
+        self.samples_written += len(chunk)
+
+
+    def _top_up_buffer(self, hTask, event_type, num_samples, callback_data):
+        '''
+        Callback run each time a chunk has been transferred out of the buffer
+        '''
+        try:
+            while self.h_task.out_stream.space_avail >= len(self._chunk):
+                self._write_next_chunk()
+        except nidaqmx.errors.DaqError as err:
+            self.error = err
+        return 0
+
+
+    @property
+    def samples_generated(self):
+        '''
+        Samples of the pattern output so far
+        '''
+        return self.h_task.out_stream.total_samp_per_chan_generated
+
+
+    def start_signal(self):
+        if not self._task_created():
+            return
+
+        self.h_task.start()
+
+
+    def wait_until_done(self, timeout=None):
+        '''
+        Wait until the pattern has been played once, then stop the task. Returns False if
+        timeout (seconds) elapsed first. A repeating pattern plays until stop_signal is called.
+        '''
+        if not self._task_created():
+            return False
+        if self.repeat:
+            raise ValueError('A repeating pattern plays until stop_signal is called')
+
+        if not self._streaming:
+            try:
+                self.h_task.wait_until_done(timeout=-1 if timeout is None else timeout)
+            except nidaqmx.errors.DaqError:
+                if timeout is None:
+                    raise
+                return False
+            self.stop_signal()
+            return True
+
+        t_end = None if timeout is None else time.perf_counter() + timeout
+        while self.samples_generated < self.num_samples:
+            if self.error is not None:
+                raise self.error
+            if t_end is not None and time.perf_counter() > t_end:
+                return False
+            time.sleep(min(0.05, (self.num_samples - self.samples_generated) / self.sample_rate))
+        try:
+            self.stop_signal()
+        except nidaqmx.errors.DaqError as err:
+            # Only the final state was still being output, so an underflow does not matter
+            if err.error_code != OUTPUT_UNDERFLOW:
+                raise
+        return True
+
+
+    def stop_signal(self):
+        if not self._task_created():
+            return
+
+        self.h_task.stop()
+
+
+    def close(self):
+        if not self._task_created():
+            return
+
+        self.h_task.close()
+        self.h_task = []
+
+
+    # House-keeping methods follow
+    def _task_created(self):
+        '''
+        Return True if a task has been created
+        '''
+
+        if isinstance(self.h_task,nidaqmx.task.Task):
+            return True
+        else:
+            print('No task created: run the create_task method')
+            return False
+
+
+def _demo_timeline():
+    '''
+    A 100 ms sequence: a 1 kHz clock on line 0, a 10 us trigger 250 us after each clock
+    edge on line 1 and a gate on line 2 high from 20 to 70 ms
+    '''
+    from pynidaqmxegs.utils import DigitalTimeline
+    timeline = DigitalTimeline()
+    timeline.clock(line=0, frequency=1E3, start=0, stop=0.1)
+    timeline.pulse(line=1, start=250E-6, width=10E-6, period=1E-3, count=100)
+    timeline.set(0.02, line=2, value=True)
+    timeline.set(0.07, line=2, value=False)
+    return timeline
+
+
+if __name__ == '__main__':
+    print('\nRunning demo for hardwarePattern\n\n')
+    DO = hardwarePattern()
+    DO.timeline = _demo_timeline()
+    DO.duration = 0.1
+    DO.repeat = True
+    DO.create_task()
+    DO.start_signal()
+    input('press return to stop')
+    DO.stop_signal()
+    DO.close()
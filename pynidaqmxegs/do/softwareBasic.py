@@ -11,7 +11,8 @@
 
     The class creates three tasks and makes DO channels in three different ways 
     to show the available options. It writes digital values one at a time to these 
-    lines.
+    lines. The time between writes is set by time.sleep, so it is only accurate to a
+    millisecond or so: see hardwarePattern for sequences timed by a sample clock.
 
 
     Wiring suggestion
@@ -0,0 +1,240 @@
+'''
+ Example showing software-timed digital output to a whole port with a cached state
+
+ pynidaqmxegs.do.softwarePort
+
+ Purpose
+ softwareBasic writes a list of booleans, one per line, each time any line changes, and
+ lines in different tasks need one driver round trip each. Each round trip costs
+ microseconds on a PCIe board and hundreds of microseconds on a USB one, so changing
+ several lines one at a time is slow and the lines do not change together.
+
+ This class opens one task on a port and keeps a copy (the "shadow") of the value the
+ port should have. set, clear, toggle and assign only change the shadow. flush then
+ writes the whole port in one call to DigitalSingleChannelWriter.write_one_sample_port_uint32
+ (DAQmxWriteDigitalU32), so any number of lines change in one round trip and at the same
+ instant. If the shadow is the same as the value last written, flush writes nothing.
+
+ The shadow is protected by a lock, so lines may be set from several threads. The state
+ of the port is only known if every write to it goes through this object: the task
+ writes initial_state when it is created so the two start out the same.
+
+
+ Wiring suggestion
+ As for softwareBasic.
+
+
+ Example session:
+ DO = softwarePort()
+ DO.create_task()
+ DO.set(0); DO.set(3); DO.clear(5)   # Nothing is written yet
+ DO.flush()                          # One write: lines 0 and 3 high, 5 low
+ DO.flush()                          # Nothing changed: no write
+ DO.write(0x0F)                      # Set the port and flush
+ print(DO.stats())
+ DO.close()
+
+ A benchmark of this against one write per line:
+ python -m pynidaqmxegs.bench --patterns do_per_line do_cached_port --channels 1 4 8
+
+
+ Also see:
+ ANSI C: DAQmx_ANSI_C_examples/DO/WriteDigPort.c
+'''
+
+import threading
+
+import nidaqmx
+from nidaqmx.constants import LineGrouping
+from nidaqmx.stream_writers import DigitalSingleChannelWriter
+
+
+class softwarePort():
+
+    # Class properties
+
+    # Parameters for the port (device and lines)
+    dev_name = 'Dev1'      # The name of the DAQ device as shown in MAX
+    task_name = 'DOport'   # A string that will provide a label for the task
+    port = 'port0'         # The port to control
+    lines = ''             # e.g. 'line0:7' to control only some lines of the port. '' for all of them.
+    initial_state = 0      # Port-format value written when the task is created
+
+    h_task = []            # DAQmx task handle
+
+    # Internal state
+    _writer = None         # DigitalSingleChannelWriter for the task
+    _lock = None           # Guards the shadow. Made by __init__, so each port has its own.
+    _state = 0             # The shadow: the port value flush() will write
+    _written = None        # The value last written to the port. None before the first write.
+    writes = 0             # Number of writes made by flush
+    skipped = 0            # Number of flushes with nothing to write
+
+
+    def __init__(self, autoconnect=False):
+
+        self._lock = threading.Lock()
+        if autoconnect:
+            self.create_task()
+
+
+    def create_task(self):
+        '''
+        Creates the task and writes initial_state, so the shadow matches the port
+        '''
+
+        # * Create a DAQmx task
+        #   C equivalent - DAQmxCreateTask
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
+        self.h_task = nidaqmx.Task(self.task_name)
+
+
+        # * Define one digital output channel covering the lines, so a single port-format
+        #   value sets all of them
+        #   C equivalent - DAQmxCreateDOChan
+        #   http://zone.ni.com/reference/en-XX/help/370471AC-01/daqmxcfunc/daqmxcreatedochan/
+        connect_at = '/'.join(part for part in (self.dev_name, self.port, self.lines) if part)
+        self.h_task.do_channels.add_do_chan(connect_at, line_grouping=LineGrouping.CHAN_FOR_ALL_LINES)
+        self._writer = DigitalSingleChannelWriter(self.h_task.out_stream)
+
+
+        # * Write the initial state with DAQmxWriteDigitalU32
+        #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxwritedigitalu32/
+        with self._lock:
+            self._state = int(self.initial_state) & 0xFFFFFFFF
+            self._written = None   # Unknown until the write below succeeds
+            self.writes = 0
+            self.skipped = 0
+            self._write(self._state)
+
+
+    # Changing the shadow. Nothing is written until flush.
+    def set(self, line, value=True):
+        '''
+        Set "line" high (or low if value is False)
+        '''
+        self.assign(-1 if value else 0, 1 << line)
+
+    def clear(self, line):
+        '''
+        Set "line" low
+        '''
+        self.assign(0, 1 << line)
+
+    def toggle(self, line):
+        with self._lock:
+            self._state ^= 1 << line
+
+    def assign(self, value, mask=0xFFFFFFFF):
+        '''
+        Set the lines whose bits are set in "mask" to the corresponding bits of "value"
+        '''
+        with self._lock:
+            self._state = (self._state & ~mask | value & mask) & 0xFFFFFFFF
+
+
+    @property
+    def state(self):
+        '''
+        The port-format value the port will have after the next flush
+        '''
+        return self._state
+
+    @property
+    def written(self):
+        '''
+        The port-format value last written to the port
+        '''
+        return self._written
+
+    @property
+    def pending(self):
+        '''
+        True if the shadow differs from the port
+        '''
+        return self._state != self._written
+
+    def line(self, line):
+        '''
+        State of "line" in the shadow
+        '''
+        return bool(self._state >> line & 1)
+
+
+    # Writing
+    def flush(self):
+        '''
+        Write the shadow to the port in one call if it has changed since the last write.
+        Returns True if a write was made.
+        '''
+        if not self._task_created():
+            return False
+
+        with self._lock:
+            state = self._state
+            if state == self._written:
+                self.skipped += 1
+                return False
+            self._write(state)
+        return True
+
+    def write(self, value, mask=0xFFFFFFFF):
+        '''
+        assign then flush. Returns True if a write was made.
+        '''
+        self.assign(value, mask)
+        return self.flush()
+
+    def _write(self, state):
+        self._writer.write_one_sample_port_uint32(state)
+        self._written = state
+        self.writes += 1
+
+
+    def stats(self):
+        '''
+        Return a dict of the number of writes made and of flushes skipped because nothing changed
+        '''
+        return dict(writes=self.writes, skipped=self.skipped, state=self._state, written=self._written)
+
+
+    def close(self):
+        if not self._task_created():
+            return
+
+        self.h_task.close()
+        self.h_task = []
+
+
+    # House-keeping methods follow
+    def _task_created(self):
+        '''
+        Return True if a task has been created
+        '''
+
+        if isinstance(self.h_task,nidaqmx.task.Task):
+            return True
+        else:
+            print('No task created: run the create_task method')
+            return False
+
+
+
+if __name__ == '__main__':
+    import time
+
+    print('\nRunning demo for softwarePort\n\n')
+    DO = softwarePort()
+    DO.lines = 'line0:7'
+    DO.create_task()
+
+    # A light chaser on lines 0 to 7: two lines change per step, in one write
+    for step in range(32):
+        DO.clear((step - 1) % 8)
+        DO.set(step % 8)
+        DO.flush()
+        time.sleep(0.05)
+    DO.flush()   # Nothing has changed, so this does not write
+    DO.write(0)
+    print(DO.stats())
+    DO.close()
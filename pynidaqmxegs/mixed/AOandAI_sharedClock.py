@@ -18,6 +18,19 @@
   Wiring instructions:
   connect AI0 to AO0 on the DAQ device you are working on. 
  
+  Plotting:
+  The AI callback only copies each chunk of data into a ring buffer (pynidaqmxegs.utils.RingBuffer).
+  The plot is updated from the Qt event loop by a timer that reads the newest data from the buffer,
+  so slow plotting can not hold up the driver's callback thread. Before plotting, the data
+  are reduced to the minimum and maximum of one bin per pixel (pynidaqmxegs.utils.MinMaxDecimator)
+  so the cost of drawing stays the same however many points are shown.
+
+  Recording:
+  Set record_to to a file name before calling start_acquisition and the AI data are saved
+  to that file by a background thread (pynidaqmxegs.utils.StreamRecorder). The callback
+  only queues each chunk, so saving does not slow it down.
+ 
+ 
   You may run this example by changing to the directory containing the file and
   running: python AOandAI_sharedClock.py
 
@@ -25,9 +38,9 @@
 
 import nidaqmx
 from nidaqmx.constants import (AcquisitionType,RegenerationMode)
+from nidaqmx.stream_readers import AnalogSingleChannelReader
 import numpy as np
-from pyqtgraph.Qt import QtGui, QtCore
-import pyqtgraph as pg
+from pynidaqmxegs.utils import RingBuffer, MinMaxDecimator, StreamRecorder, DeviceRegistry, waveforms, sizing
 
 class AOandAI_sharedClock():
 
@@ -57,6 +70,22 @@ class AOandAI_sharedClock():
     _win = []               # GraphicsLayoutWidget stored here
     _plot = []              # plot object stored here
     _curve = []             # pyqtgraph plot object
+    _timer = []             # QTimer that updates the plot
+    _plot_data = []         # pre-allocated array holding the data being plotted
+    _decimator = []         # MinMaxDecimator that reduces the data to the plot's width
+
+    # Properties associated with moving data out of the AI callback
+    _seconds_to_buffer = 2  # The ring buffer holds this many seconds of AI data
+    _reader = []            # stream reader for the AI task
+    _chunk = []             # pre-allocated array the callback reads into
+    _buffer = []            # RingBuffer shared by the callback and the plot
+
+    # Saving AI data to disk
+    record_to = None        # Path of a file to record the AI data to. None for no recording.
+    _recorder = None        # StreamRecorder that writes the data from a background thread
+
+    # Timing the AI callback
+    profiler = None         # A CallbackProfiler to time each call of the AI callback. None for no overhead.
 
 
     def __init__(self, autoconnect=False):
@@ -71,6 +100,13 @@ class AOandAI_sharedClock():
         regeneration. Connects AI to a callback function to handling plotting of data.
         '''
 
+        # * Check the device can run at the requested rate before creating any tasks. The
+        #   capabilities come from the device registry, so the driver is not queried each time.
+        registry = DeviceRegistry.local()
+        registry.check_ai_rate(self.dev_name, self.sample_rate)
+        registry.check_ao_rate(self.dev_name, self.sample_rate)
+        registry.check_voltage_range(self.dev_name, self.min_voltage, self.max_voltage)
+
         # * Create two separate DAQmx tasks for the AI and AO
         #   C equivalent - DAQmxCreateTask 
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcreatetask/
@@ -99,16 +135,31 @@ class AOandAI_sharedClock():
         #   http://zone.ni.com/reference/en-XX/help/370471AE-01/daqmxcfunc/daqmxcfgsampclktiming/
         #   More details at: "help(task.cfg_samp_clk_timing)
         #   https://nidaqmx-python.readthedocs.io/en/latest/constants.html
-        self._points_to_plot = round(self.sample_rate*0.1)
+        #   The callback runs, and the plot shows, about a tenth of a second of data (longer on USB
+        #   devices, which must not be serviced too often). The buffer holds a whole number of these.
+        plan = sizing.plan_buffers(self.sample_rate, 1, device=self.dev_name, target_latency=0.1)
+        self._points_to_plot = plan.chunk_size
         self.h_task_ai.timing.cfg_samp_clk_timing(self.sample_rate, \
                                     source= '/%s/ao/SampleClock' % self.dev_name, \
-                                    samps_per_chan=self._points_to_plot, \
+                                    samps_per_chan=plan.buffer_size, \
                                     sample_mode=AcquisitionType.CONTINUOUS)
 
 
 
+        # * The callback reads into a pre-allocated array and copies that into a ring buffer
+        #   https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
+        self._reader = AnalogSingleChannelReader(self.h_task_ai.in_stream)
+        self._chunk = np.zeros(self._points_to_plot)
+        self._buffer = RingBuffer(1, round(self.sample_rate*self._seconds_to_buffer))
+        self._plot_data = np.zeros((1, self._points_to_plot))
+
         # * Registera a callback funtion to be run every N samples
-        self.h_task_ai.register_every_n_samples_acquired_into_buffer_event(self._points_to_plot, self._read_and_plot)
+        #   With a profiler, a wrapper that times each call is registered in its place. It also
+        #   records the AI backlog and the free space in the AO buffer.
+        callback = self._read_into_buffer
+        if self.profiler is not None:
+            callback = self.profiler.wrap(callback, in_stream=self.h_task_ai.in_stream, out_stream=self.h_task_ao.out_stream)
+        self.h_task_ai.register_every_n_samples_acquired_into_buffer_event(self._points_to_plot, callback)
 
 
         '''
@@ -116,7 +167,7 @@ class AOandAI_sharedClock():
         '''
 
         # Build one cycle of a sine wave and scale to 5V to play through the AO line.
-        self.waveform=np.sin(np.linspace(-np.pi,np.pi, 260))*self.wave_amplitude
+        self.waveform = waveforms.sine(260, amplitude=self.wave_amplitude)
         self.num_samples_per_channel = len(self.waveform)  # The number of samples to be stored in the buffer per channel
         print('Constructed a waveform of length %d that will played at %d samples per second' % \
               (self.num_samples_per_channel, self.sample_rate))
@@ -166,6 +217,10 @@ class AOandAI_sharedClock():
 
 
     def setup_plot(self):
+        # Qt is only imported here, so the tasks can be used without a GUI toolkit installed
+        from pyqtgraph.Qt import QtGui, QtCore
+        import pyqtgraph as pg
+
         # Set up pyqtgraph plot window
         self._app = QtGui.QApplication([])
         self._win = pg.GraphicsLayoutWidget(show=True)
@@ -174,19 +229,40 @@ class AOandAI_sharedClock():
         self._plot.setLimits(yMin=-2, yMax=2)
         self._curve = self._plot.plot(pen='g')
         self._plot.setYRange(-self.wave_amplitude-0.1, self.wave_amplitude+0.1, padding=0)
+        self._decimator = MinMaxDecimator.for_plot(self._plot)
+
+        # Update the plot from the Qt event loop about 20 times a second
+        self._timer = QtCore.QTimer()
+        self._timer.timeout.connect(self._update_plot)
+        self._timer.start(50)
 
 
-    def _read_and_plot(self,tTask, event_type, num_samples, callback_data):
-        # Callback function that extract data and update plots
-        data = self.h_task_ai.read(number_of_samples_per_channel=self._points_to_plot)
-        self._curve.setData(np.array(data))
+    def _read_into_buffer(self,tTask, event_type, num_samples, callback_data):
+        # Callback function that copies the newly acquired data into the ring buffer. 
+        # Runs in the driver's thread so it does nothing else.
+        self._reader.read_many_sample(self._chunk, number_of_samples_per_channel=self._points_to_plot)
+        self._buffer.write(self._chunk)
+        if self._recorder is not None:
+            self._recorder.write(self._chunk)
         return 0
 
 
+    def _update_plot(self):
+        # Plot the newest data. Runs in the Qt event loop.
+        self._buffer.latest(self._points_to_plot, out=self._plot_data)
+        self._decimator.fit_to_plot(self._plot)
+        x, y = self._decimator(self._plot_data[0])
+        self._curve.setData(x, y)
+
+
     def start_acquisition(self):
         if not self._task_created():
             return
 
+        if self.record_to is not None:
+            self._recorder = StreamRecorder.from_task(self.h_task_ai, self.record_to)
+            self._recorder.start()
+
         self.h_task_ao.start()
         self.h_task_ai.start() # Starting this task triggers the AO task
 
@@ -198,6 +274,14 @@ class AOandAI_sharedClock():
         self.h_task_ai.stop()
         self.h_task_ao.stop()
 
+        if self._recorder is not None:
+            self._recorder.close()
+            print('Recorded to %s: %s' % (self.record_to, self._recorder.stats()))
+            self._recorder = None
+
+        if self.profiler is not None:
+            print(self.profiler.report())
+
     # House-keeping methods follow
     def _task_created(self):
         '''
@@ -217,7 +301,8 @@ if __name__ == '__main__':
     MIXED.set_up_tasks()
     MIXED.setup_plot()
     MIXED.start_acquisition()
-    input('press return to stop')
+    print('\nClose window to stop acquisition')
+    MIXED._app.exec_()
     MIXED.stop_acquisition()
     MIXED.h_task_ai.close()
     MIXED.h_task_ao.close()
\ No newline at end of file
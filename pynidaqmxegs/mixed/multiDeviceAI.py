@@ -0,0 +1,259 @@
+'''
+ Demonstration of synchronized analog input across several DAQ devices
+
+ pynidaqmx.mixed.multiDeviceAI.py
+
+ Description:
+  A DAQmx task can only use one device's sample clock, so to acquire from more channels
+  than one card has we need one task per card, all running off the same clock and started
+  by the same trigger. This example creates an AI task on each of several devices. The first
+  device is the master: it exports its AI sample clock and start trigger onto RTSI (or PFI)
+  lines. The other devices, the slaves, take their sample clock and start trigger from those
+  lines. The slaves are started first so they are armed and waiting when the master starts.
+  Every device then acquires sample N on the same clock edge.
+
+  The data are read from each device in turn into one pre-allocated array of shape
+  (total channels, samples per chunk), each device filling its own rows. So the result is
+  a single stream of time-aligned chunks, as if from one big device. After each chunk the
+  number of samples each device has acquired is compared with the master's, to catch a
+  slave that missed the start trigger or is not running from the master's clock.
+
+  mixed.AOandAI_sharedClock does the same thing for an AO and an AI task on one device.
+
+
+  Wiring instructions:
+  PCI/PCIe devices: connect the devices with an RTSI cable and register it in NI MAX.
+  Other devices: set clock_line and trigger_line to PFI lines and wire the master's PFI
+  lines to the same PFI lines on each slave. With the simulated backend no wiring is needed.
+
+  If clock_line and trigger_line are None the slaves use the master's terminals directly
+  (e.g. /Dev1/ai/SampleClock) and DAQmx chooses the route itself.
+
+
+  Example session:
+  MULTI = multiDeviceAI()
+  MULTI.devices = ['Dev1', 'Dev2']
+  MULTI.set_up_tasks()
+  MULTI.start_acquisition()
+  data = MULTI.read_chunk()     # (total channels, chunk_size). MULTI.channel_names labels the rows.
+  MULTI.stop_acquisition()
+  MULTI.close()
+
+
+  You may run this example by changing to the directory containing the file and
+  running: python multiDeviceAI.py
+
+'''
+
+import nidaqmx
+from nidaqmx.constants import (AcquisitionType, Signal)
+from nidaqmx.stream_readers import AnalogMultiChannelReader
+import numpy as np
+from pynidaqmxegs.utils import DeviceRegistry, sizing
+
+
+class multiDeviceAI():
+
+    # Class properties
+
+    # Parameters for the acquisition (devices and channels)
+    devices = ['Dev1', 'Dev2']  # The names of the DAQ devices as shown in MAX. The first is the master.
+    channels = 'ai0:3'          # Channels to acquire on every device, or a dict of device name: channels
+    clock_line = 'RTSI0'        # Line carrying the master's sample clock to the slaves
+    trigger_line = 'RTSI1'      # Line carrying the master's start trigger to the slaves
+
+    min_voltage = -10           # Channel input range minimum
+    max_voltage = 10            # Channel input range maximum
+
+    # Task configuration
+    sample_rate = 10000         # Sample Rate in Hz
+    max_skew = 16               # Most samples a slave's acquired count may differ from the master's
+    chunk_size = None           # Samples per channel read from each device at a time. None to size for the bus.
+    callback = None             # Optional function(data, sample_index) run on each merged chunk
+
+    h_tasks = []                # DAQmx task handles. The master is first.
+    channel_names = []          # Name of the channel in each row of the merged data
+    data = []                   # Pre-allocated merged chunk: (total channels, chunk_size)
+    sample_index = 0            # Index of the first sample of the last chunk read
+
+    _readers = []               # One stream reader per task
+    _rows = []                  # The rows of "data" filled by each task
+
+
+    def __init__(self, autoconnect=False):
+
+        if autoconnect:
+            self.set_up_tasks()
+
+
+    def set_up_tasks(self):
+        '''
+        Creates one AI task per device and routes the master's sample clock and start trigger
+        to the slaves
+        '''
+        master = self.devices[0]
+
+        # * Check, from the cached device capabilities, that every device has the lines carrying
+        #   the clock and trigger (USB devices have no RTSI) and supports the voltage range
+        registry = DeviceRegistry.local()
+        for dev_name in self.devices:
+            registry.check_voltage_range(dev_name, self.min_voltage, self.max_voltage)
+            terminals = registry[dev_name].terminals or []
+            for line in (self.clock_line, self.trigger_line):
+                if line is not None and terminals and '/%s/%s' % (dev_name, line) not in terminals:
+                    raise ValueError('%s has no %s terminal' % (dev_name, line))
+
+        # * Size the chunks and buffers for the slowest bus among the devices, e.g. a USB slave
+        #   must not be read more often than about five times a second
+        plans = [sizing.plan_buffers(self.sample_rate, device=dev_name) for dev_name in self.devices]
+        plan = max(plans, key=lambda p: p.chunk_size)
+        if self.chunk_size is None:
+            self.chunk_size = plan.chunk_size
+        buffer_size = self.chunk_size * max(4, int(np.ceil(plan.buffer_size / self.chunk_size)))
+
+        self.h_tasks = []
+        self._readers = []
+        self.channel_names = []
+
+        for dev_name in self.devices:
+            # * One task per device, each with its own channels
+            #   C equivalent - DAQmxCreateTask, DAQmxCreateAIVoltageChan
+            task = nidaqmx.Task('multiai_%s' % dev_name)
+            self.h_tasks.append(task)
+            chans = self.channels[dev_name] if isinstance(self.channels, dict) else self.channels
+            task.ai_channels.add_ai_voltage_chan('%s/%s' % (dev_name, chans),
+                                                 min_val=self.min_voltage, max_val=self.max_voltage)
+            self.channel_names += task.channel_names
+            registry.check_ai_rate(dev_name, self.sample_rate, task.number_of_channels)
+
+            if dev_name == master:
+                # * The master runs from its own clock and exports it and its start trigger
+                #   C equivalent - DAQmxExportSignal
+                #   http://zone.ni.com/reference/en-XX/help/370471AM-01/daqmxcfunc/daqmxexportsignal/
+                task.timing.cfg_samp_clk_timing(self.sample_rate, samps_per_chan=buffer_size,
+                                                sample_mode=AcquisitionType.CONTINUOUS)
+                if self.clock_line is not None:
+                    task.export_signals.export_signal(Signal.SAMPLE_CLOCK, '/%s/%s' % (master, self.clock_line))
+                if self.trigger_line is not None:
+                    task.export_signals.export_signal(Signal.START_TRIGGER, '/%s/%s' % (master, self.trigger_line))
+            else:
+                # * Slaves take the master's clock and start trigger. The rate supplied is nominal:
+                #   the slave acquires on each edge of the master's clock.
+                clock = '/%s/%s' % (dev_name, self.clock_line) if self.clock_line is not None \
+                        else '/%s/ai/SampleClock' % master
+                trigger = '/%s/%s' % (dev_name, self.trigger_line) if self.trigger_line is not None \
+                          else '/%s/ai/StartTrigger' % master
+                task.timing.cfg_samp_clk_timing(self.sample_rate, source=clock, samps_per_chan=buffer_size,
+                                                sample_mode=AcquisitionType.CONTINUOUS)
+                task.triggers.start_trigger.cfg_dig_edge_start_trig(trigger)
+
+            self._readers.append(AnalogMultiChannelReader(task.in_stream))
+
+        # * Each task reads straight into its own rows of the merged array. Rows of a C-contiguous
+        #   array are themselves contiguous, so the stream readers can fill them in place.
+        self.data = np.zeros((len(self.channel_names), self.chunk_size))
+        self._rows = []
+        first = 0
+        for task in self.h_tasks:
+            self._rows.append(self.data[first:first + task.number_of_channels])
+            first += task.number_of_channels
+
+        if self.callback is not None:
+            # * Read and merge from the master's callback. The slaves acquire on the same clock
+            #   edges so their data are ready at the same time.
+            self.h_tasks[0].register_every_n_samples_acquired_into_buffer_event(self.chunk_size, self._read_in_callback)
+
+        print('Acquiring %d channels from %d devices at %d samples per second' %
+              (len(self.channel_names), len(self.devices), self.h_tasks[0].timing.samp_clk_rate))
+
+
+    def read_chunk(self, timeout=10):
+        '''
+        Read the next chunk from every device into self.data and return it. Raises a RuntimeError
+        if the devices are no longer aligned.
+        '''
+        for reader, rows in zip(self._readers, self._rows):
+            reader.read_many_sample(rows, number_of_samples_per_channel=self.chunk_size, timeout=timeout)
+
+        # Every task has been read by the same amount, so only the samples acquired can differ.
+        # The master is queried before and after the slaves, so on a shared clock each slave's
+        # count lies between the two, give or take max_skew for transfers still in progress.
+        before = self.h_tasks[0].in_stream.total_samp_per_chan_acquired
+        acquired = [task.in_stream.total_samp_per_chan_acquired for task in self.h_tasks[1:]]
+        after = self.h_tasks[0].in_stream.total_samp_per_chan_acquired
+        if any(n < before - self.max_skew or n > after + self.max_skew for n in acquired):
+            raise RuntimeError('Devices are no longer aligned. Samples acquired by the master: %d to %d, by the slaves: %s'
+                               % (before, after, acquired))
+        self.sample_index = self.h_tasks[0].in_stream.curr_read_pos - self.chunk_size
+        return self.data
+
+
+    def chunks(self, num_chunks=None):
+        '''
+        Generator yielding merged chunks (the same array, refilled each time) until num_chunks
+        have been read, or forever if num_chunks is None
+        '''
+        count = 0
+        while num_chunks is None or count < num_chunks:
+            yield self.read_chunk()
+            count += 1
+
+
+    def _read_in_callback(self, tTask, event_type, num_samples, callback_data):
+        self.read_chunk()
+        self.callback(self.data, self.sample_index)
+        return 0
+
+
+    def start_acquisition(self):
+        if not self._task_created():
+            return
+
+        # Slaves first, so they are waiting for the master's start trigger
+        for task in self.h_tasks[1:]:
+            task.start()
+        self.h_tasks[0].start()
+
+
+    def stop_acquisition(self):
+        if not self._task_created():
+            return
+
+        self.h_tasks[0].stop()
+        for task in self.h_tasks[1:]:
+            task.stop()
+
+
+    def close(self):
+        for task in self.h_tasks:
+            task.close()
+        self.h_tasks = []
+
+
+    # House-keeping methods follow
+    def _task_created(self):
+        '''
+        Return True if the tasks have been created
+        '''
+
+        if len(self.h_tasks) > 0 and isinstance(self.h_tasks[0], nidaqmx.task.Task):
+            return True
+        else:
+            print('No tasks created: run the set_up_tasks method')
+            return False
+
+
+if __name__ == '__main__':
+    print('\nRunning demo for multiDeviceAI\n\n')
+    MULTI = multiDeviceAI()
+    MULTI.set_up_tasks()
+    MULTI.start_acquisition()
+    print('Reading 10 chunks (ctrl-c to stop)')
+    try:
+        for data in MULTI.chunks(10):
+            means = ', '.join('%s: %0.3f' % (name, mean) for name, mean in zip(MULTI.channel_names, data.mean(axis=1)))
+            print('Samples %d to %d. Means %s' % (MULTI.sample_index, MULTI.sample_index + MULTI.chunk_size - 1, means))
+    except KeyboardInterrupt:
+        pass
+    MULTI.stop_acquisition()
+    MULTI.close()
@@ -0,0 +1,58 @@
+'''
+ In-process simulated nidaqmx backend
+
+ pynidaqmxegs.simulated
+
+ Purpose
+ Provides the parts of the nidaqmx package used by the examples (Task, constants,
+ errors, system, stream_readers and stream_writers) without needing NI hardware or
+ the NI-DAQmx driver. This makes it possible to run, and time, every example on a
+ Linux machine. Hardware-timed reads and writes are paced by a virtual sample clock
+ so throughput and latency measurements are realistic.
+
+ Select it by setting the environment variable PYNIDAQMXEGS_BACKEND=simulated before
+ importing pynidaqmxegs, or call pynidaqmxegs.backend.use_backend('simulated') before
+ importing an example module. See pynidaqmxegs.backend.
+
+ The simulated devices are described in pynidaqmxegs.simulated.device
+'''
+
+import sys
+
+from pynidaqmxegs.simulated import constants
+from pynidaqmxegs.simulated import errors
+from pynidaqmxegs.simulated import device
+from pynidaqmxegs.simulated import system
+from pynidaqmxegs.simulated import stream_readers
+from pynidaqmxegs.simulated import stream_writers
+from pynidaqmxegs.simulated import task
+from pynidaqmxegs.simulated.task import Task
+from pynidaqmxegs.simulated.errors import DaqError, DaqWarning
+from pynidaqmxegs.simulated.device import add_device, remove_device
+
+_SUBMODULES = ('constants', 'errors', 'system', 'stream_readers', 'stream_writers', 'task')
+
+
+def install():
+    '''
+    Make "import nidaqmx" (and its submodules) return this package
+    '''
+    package = sys.modules[__name__]
+    sys.modules['nidaqmx'] = package
+    for name in _SUBMODULES:
+        sys.modules['nidaqmx.' + name] = getattr(package, name)
+
+
+def uninstall():
+    '''
+    Undo install(). The next "import nidaqmx" loads the real package.
+    '''
+    package = sys.modules[__name__]
+    if sys.modules.get('nidaqmx') is package:
+        del sys.modules['nidaqmx']
+        for name in _SUBMODULES:
+            sys.modules.pop('nidaqmx.' + name, None)
+
+
+def is_installed():
+    return sys.modules.get('nidaqmx') is sys.modules[__name__]
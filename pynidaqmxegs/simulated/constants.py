@@ -0,0 +1,98 @@
+'''
+ Constants used by the simulated nidaqmx backend
+
+ pynidaqmxegs.simulated.constants
+
+ Purpose
+ Mirrors the subset of nidaqmx.constants used by the examples. The enum values
+ are the same as those of the DAQmx C API, so code that compares against the
+ real nidaqmx enums (or their integer values) behaves identically.
+ https://nidaqmx-python.readthedocs.io/en/latest/constants.html
+'''
+
+from enum import Enum
+
+
+READ_ALL_AVAILABLE = -1
+WAIT_INFINITELY = -1.0
+
+
+class AcquisitionType(Enum):
+    FINITE = 10178
+    CONTINUOUS = 10123
+    HW_TIMED_SINGLE_POINT = 12522
+
+
+class RegenerationMode(Enum):
+    ALLOW_REGENERATION = 10097
+    DONT_ALLOW_REGENERATION = 10158
+
+
+class LineGrouping(Enum):
+    CHAN_PER_LINE = 0
+    CHAN_FOR_ALL_LINES = 1
+
+
+class Edge(Enum):
+    RISING = 10280
+    FALLING = 10171
+
+
+class EveryNSamplesEventType(Enum):
+    ACQUIRED_INTO_BUFFER = 1
+    TRANSFERRED_FROM_BUFFER = 2
+
+
+class TerminalConfiguration(Enum):
+    DEFAULT = -1
+    RSE = 10083
+    NRSE = 10078
+    DIFF = 10106
+    PSEUDO_DIFF = 12529
+
+
+class VoltageUnits(Enum):
+    VOLTS = 10348
+    FROM_CUSTOM_SCALE = 10065
+
+
+class SampleTimingType(Enum):
+    SAMPLE_CLOCK = 10388
+    ON_DEMAND = 10390
+
+
+class TriggerType(Enum):
+    DIGITAL_EDGE = 10150
+    NONE = 10230
+
+
+class Signal(Enum):
+    SAMPLE_CLOCK = 12487
+    START_TRIGGER = 12491
+    TEN_MHZ_REF_CLOCK = 12536
+
+
+class BusType(Enum):
+    PCI = 12582
+    PCIE = 13612
+    PXI = 12583
+    PXIE = 14706
+    USB = 12586
+    COMPACT_DAQ = 14637
+    UNKNOWN = 12588
+
+
+class ProductCategory(Enum):
+    X_SERIES_DAQ = 15858
+    M_SERIES_DAQ = 14643
+    S_SERIES_DAQ = 14644
+    AO_SERIES = 14647
+    UNKNOWN = 12588
+
+
+def enum_value(value):
+    '''
+    Return the integer value of a constant, whether it is one of our enums,
+    one of the real nidaqmx enums or a plain integer.
+    '''
+    return getattr(value, 'value', value)
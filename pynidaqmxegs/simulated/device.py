@@ -0,0 +1,441 @@
+'''
+ Simulated DAQ devices
+
+ pynidaqmxegs.simulated.device
+
+ Purpose
+ Holds the devices known to the simulated backend along with the state they share
+ between tasks: which task is driving each subsystem (so sample clocks and start
+ triggers can be routed between tasks), which task drives each AO line and the
+ current state of the digital ports.
+
+ By default three devices are present: 'Dev1' and 'Dev2' are PCIe-6363 boards and
+ 'Dev3' is a USB-6343. Each AI line is wired to the AO line with the same number
+ (i.e. AO0 to AI0, as suggested in the wiring instructions of the examples). AI lines
+ with no AO partner see a slow sine wave plus noise. Other products can be added with
+ add_device, e.g. a PXIe-6738 with 32 AO lines for multichannel output.
+
+ Signals exported to RTSI or PFI lines (task.export_signals) can be used as a clock or
+ trigger source by any device: all the simulated devices behave as if their RTSI lines
+ were joined by an RTSI cable, and PFI lines of the same number wired together.
+
+ Example session:
+ from pynidaqmxegs.simulated import device
+ device.add_device('Dev4', 'USB-6343')
+ device.get_device('Dev1').loopback = False
+'''
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from pynidaqmxegs.simulated import errors
+from pynidaqmxegs.simulated.constants import BusType, ProductCategory
+
+
+TIMEBASE = 100E6 # Sample clocks are derived from this timebase, so rates are coerced to TIMEBASE/N
+
+# Specifications of the products we can simulate. Numbers are from the NI data sheets.
+_X_SERIES_RANGES = [-10.0, 10.0, -5.0, 5.0, -2.0, 2.0, -1.0, 1.0, -0.5, 0.5, -0.2, 0.2, -0.1, 0.1]
+PRODUCTS = {
+    'PCIe-6363': dict(product_category=ProductCategory.X_SERIES_DAQ,
+                      bus_type=BusType.PCIE,
+                      num_ai=32,
+                      ai_max_single_chan_rate=2E6,
+                      ai_max_multi_chan_rate=1E6,  # Aggregate rate: the board has a single multiplexed ADC
+                      ai_simultaneous_sampling_supported=False,
+                      ai_voltage_rngs=_X_SERIES_RANGES,
+                      num_ao=4,
+                      ao_max_rate=2.86E6,
+                      ao_voltage_rngs=[-10.0, 10.0, -5.0, 5.0],
+                      ao_fifo_size=8191,           # Samples held on the board between the host buffer and the DACs
+                      port_widths=(32, 8, 8),
+                      do_max_rate=10E6,
+                      num_pfi=16,
+                      num_rtsi=8,
+                      on_demand_latency=8E-6),   # Round trip for one software-timed sample
+    'USB-6343': dict(product_category=ProductCategory.X_SERIES_DAQ,
+                     bus_type=BusType.USB,
+                     num_ai=32,
+                     ai_max_single_chan_rate=500E3,
+                     ai_max_multi_chan_rate=500E3,
+                     ai_simultaneous_sampling_supported=False,
+                     ai_voltage_rngs=_X_SERIES_RANGES,
+                     num_ao=4,
+                     ao_max_rate=900E3,
+                     ao_voltage_rngs=[-10.0, 10.0],
+                     ao_fifo_size=8191,
+                     port_widths=(32, 8, 8),
+                     do_max_rate=1E6,
+                     num_pfi=16,
+                     num_rtsi=0,
+                     on_demand_latency=250E-6),
+    'PCIe-6376': dict(product_category=ProductCategory.S_SERIES_DAQ,
+                      bus_type=BusType.PCIE,
+                      num_ai=8,
+                      ai_max_single_chan_rate=3.571E6,
+                      ai_max_multi_chan_rate=3.571E6,  # Per channel: one ADC per channel
+                      ai_simultaneous_sampling_supported=True,
+                      ai_voltage_rngs=[-10.0, 10.0, -5.0, 5.0, -2.0, 2.0, -1.0, 1.0],
+                      num_ao=4,
+                      ao_max_rate=3.3E6,
+                      ao_voltage_rngs=[-10.0, 10.0, -5.0, 5.0],
+                      ao_fifo_size=2047,
+                      port_widths=(8, 8, 8),
+                      do_max_rate=10E6,
+                      num_pfi=16,
+                      num_rtsi=8,
+                      on_demand_latency=8E-6),
+    'PXIe-6738': dict(product_category=ProductCategory.AO_SERIES,
+                      bus_type=BusType.PXIE,
+                      num_ai=0,
+                      ai_max_single_chan_rate=0.0,
+                      ai_max_multi_chan_rate=0.0,
+                      ai_simultaneous_sampling_supported=False,
+                      ai_voltage_rngs=[],
+                      num_ao=32,                   # For multichannel AO: add_device('Dev4', 'PXIe-6738')
+                      ao_max_rate=1E6,
+                      ao_voltage_rngs=[-10.0, 10.0],
+                      ao_fifo_size=8191,
+                      port_widths=(8, 8),
+                      do_max_rate=10E6,
+                      num_pfi=16,
+                      num_rtsi=8,
+                      on_demand_latency=8E-6),
+}
+
+_devices = OrderedDict()
+_devices_lock = threading.Lock()
+_serial_numbers = iter(range(0x1F2A3B01, 0x1F2A3C00))
+
+
+class PhysicalChannelCollection():
+    '''
+    Minimal stand-in for nidaqmx.system._collections.PhysicalChannelCollection
+    '''
+
+    def __init__(self, names):
+        self.channel_names = list(names)
+
+    def __len__(self):
+        return len(self.channel_names)
+
+    def __iter__(self):
+        return iter(self.channel_names)
+
+    def __getitem__(self, index):
+        return self.channel_names[index]
+
+
+class Device():
+    '''
+    A simulated DAQ device. Exposes the same properties as nidaqmx.system.Device for
+    everything the examples use.
+    '''
+
+    loopback = True          # If True, AI<n> reads the voltage generated by AO<n>
+    loopback_delay = 2E-6    # Analog settling delay between an AO update and AI seeing it
+    noise_rms = 1E-3         # RMS noise in Volts added to every AI sample
+
+    def __init__(self, name, product_type='PCIe-6363', **spec):
+        if product_type not in PRODUCTS:
+            raise ValueError('Unknown product type %s. Choose one of: %s' % (product_type, ', '.join(PRODUCTS)))
+
+        self.name = name
+        self.product_type = product_type
+        self.serial_num = next(_serial_numbers)
+        self.dev_is_simulated = True
+
+        for key, value in dict(PRODUCTS[product_type], **spec).items():
+            setattr(self, key, value)
+
+        # State shared by tasks using this device
+        self._lock = threading.Lock()
+        self._running = {}       # subsystem ('ai', 'ao', 'do') -> the timed task running on it
+        self._ao_sources = {}    # AO line number -> (task, column in that task's data)
+        self.do_port_state = [0] * len(self.port_widths)
+
+        # A fixed table of noise values avoids generating random numbers on every read
+        rng = np.random.default_rng(self.serial_num)
+        self._noise = rng.standard_normal(2**16) * self.noise_rms
+
+
+    def __repr__(self):
+        return 'Device(name=%s)' % self.name
+
+
+    # Properties mirroring nidaqmx.system.Device
+    @property
+    def ai_physical_chans(self):
+        return PhysicalChannelCollection('%s/ai%d' % (self.name, ii) for ii in range(self.num_ai))
+
+    @property
+    def ao_physical_chans(self):
+        return PhysicalChannelCollection('%s/ao%d' % (self.name, ii) for ii in range(self.num_ao))
+
+    @property
+    def do_ports(self):
+        return PhysicalChannelCollection('%s/port%d' % (self.name, ii) for ii in range(len(self.port_widths)))
+
+    @property
+    def do_lines(self):
+        return PhysicalChannelCollection('%s/port%d/line%d' % (self.name, port, line)
+                                         for port, width in enumerate(self.port_widths)
+                                         for line in range(width))
+
+    @property
+    def ai_min_rate(self):
+        return TIMEBASE / 2**32
+
+    @property
+    def terminals(self):
+        root = '/' + self.name
+        names = ['%s/PFI%d' % (root, ii) for ii in range(self.num_pfi)]
+        names += ['%s/RTSI%d' % (root, ii) for ii in range(self.num_rtsi)]
+        for subsystem in ('ai', 'ao', 'do'):
+            names += ['%s/%s/SampleClock' % (root, subsystem),
+                      '%s/%s/StartTrigger' % (root, subsystem),
+                      '%s/%s/SampleClockTimebase' % (root, subsystem)]
+        names += ['%s/%s' % (root, ii) for ii in ('10MHzRefClock', '20MHzTimebase', '100MHzTimebase')]
+        return names
+
+
+    def reset_device(self):
+        '''
+        Stop any tasks running on the device and return all outputs to 0 V / low
+        '''
+        with self._lock:
+            tasks = list(self._running.values())
+        for task in tasks:
+            task.stop()
+        self.do_port_state = [0] * len(self.port_widths)
+
+
+    # Signal generation
+    def ai_signal(self, line, times, out):
+        '''
+        Fill "out" with the voltage seen by AI line "line" at each of the times in "times"
+        (perf_counter seconds).
+        '''
+        source = self._ao_sources.get(line) if self.loopback else None
+        if source is not None:
+            task, column = source
+            task._ao_output(column, times - self.loopback_delay, out)
+        else:
+            # Nothing is wired to this line: a slow sine wave with a different frequency on each line
+            np.multiply(times, 2 * np.pi * (5 + line), out=out)
+            np.sin(out, out=out)
+            out *= 0.5
+
+        # Cheap, repeatable, noise: walk through the noise table at a line-dependent offset
+        index = (times * 1E7).astype(np.int64)
+        index += line * 7919
+        index &= (len(self._noise) - 1)
+        out += self._noise[index]
+        return out
+
+
+    def do_port_value(self, port, times):
+        '''
+        Return the value of digital port "port" at each of the times in "times" (perf_counter
+        seconds) as a uint32 array. Lines driven by a running hardware-timed DO task follow
+        its samples; the others hold their last on-demand value.
+        '''
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        value = np.full(times.shape, self.do_port_state[port], dtype=np.int64)
+        task = self.running_task('do')
+        if task is not None:
+            for column, chan in enumerate(task.do_channels):
+                if chan.device is self and chan.port == port:
+                    mask = sum(1 << line for line in chan.lines)
+                    driven = task._ao_output(column, times, np.empty(times.shape)).astype(np.int64)
+                    value = (value & ~mask) | (driven & mask)
+        return value.astype(np.uint32)
+
+
+    def on_demand_delay(self):
+        '''
+        Block for the time taken by one software-timed round trip to the device
+        '''
+        if self.on_demand_latency >= 100E-6:
+            time.sleep(self.on_demand_latency)
+        else:
+            # time.sleep is too coarse for sub-100 us delays so spin instead
+            t_end = time.perf_counter() + self.on_demand_latency
+            while time.perf_counter() < t_end:
+                pass
+
+
+    # Routing of shared signals between tasks
+    def register_running(self, subsystem, task):
+        with self._lock:
+            self._running[subsystem] = task
+
+    def unregister_running(self, subsystem, task):
+        with self._lock:
+            if self._running.get(subsystem) is task:
+                del self._running[subsystem]
+
+    def running_task(self, subsystem):
+        return self._running.get(subsystem)
+
+
+class OnDemandHistory():
+    '''
+    Remembers the times at which an on-demand output changed value, so that the value at
+    any recent time can be looked up (vectorised) by the AI loopback.
+    '''
+
+    def __init__(self, num_columns, maxlen=4096):
+        self.times = deque([-np.inf], maxlen=maxlen)
+        self.values = deque([np.zeros(num_columns)], maxlen=maxlen)
+
+    def append(self, t, values):
+        self.times.append(t)
+        self.values.append(np.array(values, dtype=np.float64))
+
+    def last(self):
+        return self.values[-1]
+
+    def lookup(self, column, times, out):
+        t = np.fromiter(self.times, dtype=np.float64, count=len(self.times))
+        ind = np.searchsorted(t, times, side='right') - 1
+        np.maximum(ind, 0, out=ind)
+        v = np.fromiter((v[column] for v in self.values), dtype=np.float64, count=len(self.values))
+        np.take(v, ind, out=out)
+        return out
+
+
+# Bus lines (e.g. 'RTSI0', 'PFI3') shared by all devices and the task whose signal is exported to each
+_bus = {}
+_bus_lock = threading.Lock()
+
+
+def _bus_line(terminal):
+    '''
+    Return the bus line name of a terminal such as /Dev1/RTSI0, or None if it is not a RTSI or PFI line
+    '''
+    parts = terminal.strip('/').split('/')
+    if len(parts) != 2 or not parts[1].upper().startswith(('RTSI', 'PFI')):
+        return None
+    if '/' + '/'.join(parts) not in get_device(parts[0]).terminals:
+        raise errors.DaqError('Terminal %s does not exist on the device' % terminal, errors.INVALID_CHANNEL)
+    return parts[1].upper()
+
+
+def export_to_bus(terminal, task):
+    '''
+    Drive the RTSI or PFI line "terminal" with a signal from "task"
+    '''
+    line = _bus_line(terminal)
+    if line is None:
+        raise errors.DaqError('Signals can only be exported to RTSI and PFI lines in the simulated device: %s' % terminal,
+                              errors.INVALID_CHANNEL, task.name)
+    with _bus_lock:
+        _bus[line] = task
+
+
+def release_bus(task):
+    '''
+    Stop "task" driving any bus lines
+    '''
+    with _bus_lock:
+        for line in [line for line, owner in _bus.items() if owner is task]:
+            del _bus[line]
+
+
+def bus_task(terminal):
+    '''
+    The task driving the RTSI or PFI line "terminal", or None
+    '''
+    return _bus.get(_bus_line(terminal))
+
+
+def add_device(name, product_type='PCIe-6363', **spec):
+    '''
+    Add a simulated device. Keyword arguments override entries of the product specification.
+    Returns the new device.
+    '''
+    dev = Device(name, product_type, **spec)
+    with _devices_lock:
+        _devices[name] = dev
+    return dev
+
+
+def remove_device(name):
+    with _devices_lock:
+        _devices.pop(name, None)
+
+
+def get_device(name):
+    '''
+    Return the device called "name", raising a DaqError like DAQmx does if it does not exist.
+    '''
+    try:
+        return _devices[name]
+    except KeyError:
+        raise errors.DaqError('Device identifier is invalid.\nDevice Specified: %s' % name,
+                              errors.INVALID_DEVICE_ID) from None
+
+
+def devices():
+    return list(_devices.values())
+
+
+def _expand_range(term):
+    '''
+    "ai0:3" -> ('ai', [0, 1, 2, 3]). Descending ranges (ai3:0) are allowed, as in DAQmx.
+    '''
+    prefix = term.rstrip('0123456789:')
+    numbers = term[len(prefix):]
+    if ':' in numbers:
+        first, last = [int(x) for x in numbers.split(':')]
+        step = 1 if last >= first else -1
+        return prefix, list(range(first, last + step, step))
+    return prefix, [int(numbers)]
+
+
+def parse_physical_channels(spec, kind):
+    '''
+    Parse a DAQmx physical channel string.
+
+    For kind 'ai' or 'ao' returns a list of (device, line) tuples, e.g. 'Dev1/ai0:1' gives
+    [(Dev1, 0), (Dev1, 1)]. For kind 'do' returns a list of (device, port, [lines]) with
+    one entry per comma-separated term, e.g. 'Dev1/port0/line3:5' gives [(Dev1, 0, [3, 4, 5])].
+    '''
+    out = []
+    for term in spec.split(','):
+        term = term.strip().lstrip('/')
+        parts = term.split('/')
+        dev = get_device(parts[0])
+        try:
+            if kind in ('ai', 'ao'):
+                prefix, lines = _expand_range(parts[1])
+                num = dev.num_ai if kind == 'ai' else dev.num_ao
+                if prefix != kind or len(parts) != 2 or max(lines) >= num:
+                    raise ValueError
+                out.extend((dev, line) for line in lines)
+            else:
+                prefix, ports = _expand_range(parts[1])
+                if prefix != 'port' or len(ports) != 1 or ports[0] >= len(dev.port_widths):
+                    raise ValueError
+                port = ports[0]
+                if len(parts) == 3:
+                    prefix, lines = _expand_range(parts[2])
+                    if prefix != 'line' or max(lines) >= dev.port_widths[port]:
+                        raise ValueError
+                else:
+                    lines = list(range(dev.port_widths[port]))
+                out.append((dev, port, lines))
+        except (ValueError, IndexError):
+            raise errors.DaqError('Physical channel specified does not exist on this device.\nPhysical Channel Name: %s' % term,
+                                  errors.INVALID_CHANNEL) from None
+    return out
+
+
+# The default set of devices
+add_device('Dev1', 'PCIe-6363')
+add_device('Dev2', 'PCIe-6363')
+add_device('Dev3', 'USB-6343')
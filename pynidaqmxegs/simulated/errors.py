@@ -0,0 +1,46 @@
+'''
+ Errors raised by the simulated nidaqmx backend
+
+ pynidaqmxegs.simulated.errors
+
+ Purpose
+ Mirrors nidaqmx.errors.DaqError so that error handling written for real hardware
+ works unchanged. Error codes are those that NI-DAQmx returns for the same condition.
+'''
+
+
+class DaqError(Exception):
+    '''
+    Error raised by the simulated driver. Same signature as nidaqmx.errors.DaqError
+    '''
+
+    def __init__(self, message, error_code, task_name=''):
+        if task_name:
+            message = '%s\n\nTask Name: %s' % (message, task_name)
+        message = '%s\n\nStatus Code: %d' % (message, error_code)
+        super().__init__(message)
+        self.error_code = error_code
+        self.task_name = task_name
+
+
+class DaqWarning(Warning):
+
+    def __init__(self, message, error_code):
+        super().__init__('\nWarning %d occurred.\n\n%s' % (error_code, message))
+        self.error_code = error_code
+
+
+# Status codes returned by NI-DAQmx for the conditions we simulate
+INVALID_DEVICE_ID = -200220
+INVALID_CHANNEL = -200170
+DUPLICATE_TASK = -200089
+INVALID_TASK = -200088
+RATE_TOO_HIGH = -200077
+READ_TIMEOUT = -200284
+WRITE_TIMEOUT = -200292
+INPUT_OVERWRITE = -200279
+OUTPUT_UNDERFLOW = -200290
+EMPTY_OUTPUT_BUFFER = -200462
+WAIT_TIMEOUT = -200560
+INVALID_ARRAY_SHAPE = -200229
+READ_PAST_END = -200278
@@ -0,0 +1,81 @@
+'''
+ Simulated stream readers
+
+ pynidaqmxegs.simulated.stream_readers
+
+ Purpose
+ Mirrors nidaqmx.stream_readers. The readers fill a caller-supplied NumPy array in
+ place rather than building a new list on every call.
+ https://nidaqmx-python.readthedocs.io/en/latest/stream_readers.html
+'''
+
+import numpy as np
+
+from pynidaqmxegs.simulated import errors
+from pynidaqmxegs.simulated.constants import READ_ALL_AVAILABLE
+
+
+class ChannelReaderBase():
+
+    def __init__(self, task_in_stream):
+        self._in_stream = task_in_stream
+        self._task = task_in_stream._task
+        self.verify_array_shape = True
+
+    def _verify_array(self, data, number_of_samples_per_channel, dtype):
+        if data.dtype != dtype:
+            raise errors.DaqError('The provided NumPy array must be of type %s.' % np.dtype(dtype).name,
+                                  errors.INVALID_ARRAY_SHAPE, self._task.name)
+        if not self.verify_array_shape:
+            return
+        num_chans = self._task.number_of_channels
+        expected = (num_chans, number_of_samples_per_channel)
+        if data.ndim == 1:
+            expected = (number_of_samples_per_channel,) if num_chans == 1 else (num_chans,)
+        if number_of_samples_per_channel == READ_ALL_AVAILABLE:
+            return
+        if data.shape != expected:
+            raise errors.DaqError('Read cannot be performed because the NumPy array passed into this function is not '
+                                  'shaped correctly. You must pass in a NumPy array of the correct shape based on the '
+                                  'number of channels in task and the number of samples per channel requested.\n\n'
+                                  'Shape of NumPy Array provided: %s\nShape of NumPy Array required: %s'
+                                  % (data.shape, expected), errors.INVALID_ARRAY_SHAPE, self._task.name)
+
+    def _samples_to_read(self, data, number_of_samples_per_channel):
+        if number_of_samples_per_channel != READ_ALL_AVAILABLE:
+            return number_of_samples_per_channel
+        available = self._in_stream.avail_samp_per_chan
+        return min(available, data.shape[-1])
+
+
+class AnalogSingleChannelReader(ChannelReaderBase):
+
+    def read_many_sample(self, data, number_of_samples_per_channel=READ_ALL_AVAILABLE, timeout=10.0):
+        self._verify_array(data, number_of_samples_per_channel, np.float64)
+        n = self._samples_to_read(data, number_of_samples_per_channel)
+        return self._task._read_into(data.reshape(1, -1), n, timeout)
+
+    def read_one_sample(self, timeout=10):
+        out = np.empty((1, 1))
+        self._task._read_into(out, 1, timeout)
+        return out[0, 0]
+
+
+class AnalogMultiChannelReader(ChannelReaderBase):
+
+    def read_many_sample(self, data, number_of_samples_per_channel=READ_ALL_AVAILABLE, timeout=10.0):
+        self._verify_array(data, number_of_samples_per_channel, np.float64)
+        n = self._samples_to_read(data, number_of_samples_per_channel)
+        return self._task._read_into(data, n, timeout)
+
+    def read_one_sample(self, data, timeout=10):
+        self._verify_array(data, 1, np.float64)
+        self._task._read_into(data.reshape(-1, 1), 1, timeout)
+
+
+class AnalogUnscaledReader(ChannelReaderBase):
+
+    def read_int16(self, data, number_of_samples_per_channel=READ_ALL_AVAILABLE, timeout=10.0):
+        self._verify_array(data, number_of_samples_per_channel, np.int16)
+        n = self._samples_to_read(data, number_of_samples_per_channel)
+        return self._task._read_raw_into(data.reshape(self._task.number_of_channels, -1), n, timeout)
@@ -0,0 +1,86 @@
+'''
+ Simulated stream writers
+
+ pynidaqmxegs.simulated.stream_writers
+
+ Purpose
+ Mirrors nidaqmx.stream_writers. Writers take NumPy arrays directly, avoiding the
+ list conversions done by Task.write.
+ https://nidaqmx-python.readthedocs.io/en/latest/stream_writers.html
+'''
+
+import numpy as np
+
+from pynidaqmxegs.simulated import errors
+
+
+class UnsetAutoStartSentinel():
+    pass
+
+AUTO_START_UNSET = UnsetAutoStartSentinel()
+
+
+class ChannelWriterBase():
+
+    def __init__(self, task_out_stream, auto_start=AUTO_START_UNSET):
+        self._out_stream = task_out_stream
+        self._task = task_out_stream._task
+        self._auto_start = False if auto_start is AUTO_START_UNSET else auto_start
+        self.verify_array_shape = True
+
+    @property
+    def auto_start(self):
+        return self._auto_start
+
+    @auto_start.setter
+    def auto_start(self, value):
+        self._auto_start = value
+
+    def _verify_array(self, data, dtype, is_many_chan):
+        if data.dtype != dtype:
+            raise errors.DaqError('The provided NumPy array must be of type %s.' % np.dtype(dtype).name,
+                                  errors.INVALID_ARRAY_SHAPE, self._task.name)
+        if not self.verify_array_shape:
+            return
+        num_chans = self._task.number_of_channels
+        if is_many_chan and (data.ndim != 2 or data.shape[0] != num_chans):
+            raise errors.DaqError('Write cannot be performed because the NumPy array passed into this function is not '
+                                  'shaped correctly. Number of channels in task: %d, shape of array: %s'
+                                  % (num_chans, data.shape), errors.INVALID_ARRAY_SHAPE, self._task.name)
+
+    def _write(self, data, timeout):
+        written = self._task._write_array(data, timeout)
+        if self._auto_start and not self._task._running:
+            self._task.start()
+        return written
+
+
+class AnalogSingleChannelWriter(ChannelWriterBase):
+
+    def write_many_sample(self, data, timeout=10.0):
+        self._verify_array(data, np.float64, False)
+        return self._write(data.reshape(1, -1), timeout)
+
+    def write_one_sample(self, data, timeout=10):
+        return self._write(np.full((1, 1), data, dtype=np.float64), timeout)
+
+
+class AnalogMultiChannelWriter(ChannelWriterBase):
+
+    def write_many_sample(self, data, timeout=10.0):
+        self._verify_array(data, np.float64, True)
+        return self._write(data, timeout)
+
+    def write_one_sample(self, data, timeout=10):
+        self._verify_array(data, np.float64, False)
+        return self._write(data.reshape(-1, 1), timeout)
+
+
+class DigitalSingleChannelWriter(ChannelWriterBase):
+
+    def write_many_sample_port_uint32(self, data, timeout=10.0):
+        self._verify_array(data, np.uint32, False)
+        return self._write(data.reshape(1, -1).astype(np.float64), timeout)
+
+    def write_one_sample_port_uint32(self, data, timeout=10):
+        return self._write(np.full((1, 1), data, dtype=np.float64), timeout)
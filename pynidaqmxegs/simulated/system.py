@@ -0,0 +1,54 @@
+'''
+ Simulated DAQmx system
+
+ pynidaqmxegs.simulated.system
+
+ Purpose
+ Mirrors nidaqmx.system so that device discovery (e.g. pynidaqmxegs.system.demo)
+ lists the simulated devices.
+'''
+
+from collections import namedtuple
+
+from pynidaqmxegs.simulated import device as _device
+from pynidaqmxegs.simulated.device import Device
+
+
+DriverVersion = namedtuple('DriverVersion', ['major_version', 'minor_version', 'update_version'])
+
+
+class DeviceCollection():
+
+    def __len__(self):
+        return len(_device.devices())
+
+    def __iter__(self):
+        return iter(_device.devices())
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return _device.get_device(index)
+        return _device.devices()[index]
+
+    @property
+    def device_names(self):
+        return [dev.name for dev in _device.devices()]
+
+
+class System():
+
+    _local = None
+
+    @staticmethod
+    def local():
+        if System._local is None:
+            System._local = System()
+        return System._local
+
+    @property
+    def driver_version(self):
+        return DriverVersion(20, 1, 0)
+
+    @property
+    def devices(self):
+        return DeviceCollection()
@@ -0,0 +1,1077 @@
+'''
+ Simulated DAQmx task
+
+ pynidaqmxegs.simulated.task
+
+ Purpose
+ A drop-in replacement for nidaqmx.Task that runs entirely in-process. Samples are
+ paced by a virtual sample clock derived from time.perf_counter: a hardware-timed
+ read blocks until the requested samples "exist", exactly as it would on a real
+ board, so timing measurements made against the simulation are realistic.
+
+ Supported:
+  * AI voltage, AO voltage and DO channels (ai_channels, ao_channels, do_channels)
+  * On-demand (software-timed) reads and writes
+  * cfg_samp_clk_timing with finite and continuous sample modes. Rates are coerced
+    to the 100 MHz timebase, and the driver's default input buffer sizes are used.
+  * Sample clocks shared between tasks, e.g. source='/Dev1/ao/SampleClock'
+  * Digital edge start triggers from other tasks, e.g. '/Dev1/ai/StartTrigger'
+  * AO regeneration, or streaming without regeneration, including output underflow errors
+  * Hardware-timed DO: port-format samples written with Task.write or
+    stream_writers.DigitalSingleChannelWriter. Device.do_port_value gives the port's
+    value at any time, so the generated pattern can be checked.
+  * Input buffer overwrite errors if the host does not read fast enough
+  * Unscaled int16 reads (stream_readers.AnalogUnscaledReader) with a per-channel
+    calibration polynomial in each channel's ai_dev_scaling_coeff
+  * register_every_n_samples_acquired_into_buffer_event,
+    register_every_n_samples_transferred_from_buffer_event and register_done_event.
+    Callbacks are run from a separate thread, as they are by the real driver.
+'''
+
+import itertools
+import math
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from pynidaqmxegs.simulated import errors
+from pynidaqmxegs.simulated.constants import (AcquisitionType, Edge, EveryNSamplesEventType,
+                                              LineGrouping, READ_ALL_AVAILABLE, RegenerationMode,
+                                              SampleTimingType, Signal, TerminalConfiguration, TriggerType,
+                                              VoltageUnits, enum_value, WAIT_INFINITELY)
+from pynidaqmxegs.simulated.device import (TIMEBASE, OnDemandHistory, bus_task, export_to_bus, get_device,
+                                           parse_physical_channels, release_bus)
+
+
+class UnsetNumSamplesSentinel():
+    pass
+
+class UnsetAutoStartSentinel():
+    pass
+
+NUM_SAMPLES_UNSET = UnsetNumSamplesSentinel()
+AUTO_START_UNSET = UnsetAutoStartSentinel()
+
+_handles = itertools.count(1)
+_open_tasks = {}   # task name -> task, so duplicate names can be rejected as DAQmx does
+_open_tasks_lock = threading.Lock()
+
+
+def default_input_buffer_size(rate, samps_per_chan):
+    '''
+    The input buffer size DAQmx picks for a continuous acquisition if none is set explicitly
+    http://zone.ni.com/reference/en-XX/help/370466AH-01/mxcncpts/buffersize/
+    '''
+    if rate <= 100:
+        size = 1000
+    elif rate <= 10E3:
+        size = 10000
+    elif rate <= 1E6:
+        size = 100000
+    else:
+        size = 1000000
+    return max(size, samps_per_chan)
+
+
+class Channel():
+    '''
+    One virtual channel in a task
+    '''
+
+    def __init__(self, task, name, physical_channel, device, kind, line=None, port=None, lines=()):
+        self._task = task
+        self.name = name
+        self.physical_channel = physical_channel
+        self.device = device
+        self.kind = kind
+        self.line = line       # AI/AO line number
+        self.port = port       # DO port number
+        self.lines = list(lines)  # DO line numbers
+
+    def __repr__(self):
+        return 'Channel(name=%s)' % self.name
+
+
+class ChannelCollection():
+
+    kind = ''
+
+    def __init__(self, task):
+        self._task = task
+        self._channels = []
+
+    @property
+    def channel_names(self):
+        return [chan.name for chan in self._channels]
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __iter__(self):
+        return iter(self._channels)
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            for chan in self._channels:
+                if chan.name == index:
+                    return chan
+            raise KeyError(index)
+        return self._channels[index]
+
+    def _add(self, channels):
+        self._task._claim_kind(self.kind)
+        self._channels.extend(channels)
+        return channels[0] if len(channels) == 1 else channels
+
+    def _name(self, assigned, physical, ii, count):
+        if not assigned:
+            return physical
+        return assigned if count == 1 else '%s%d' % (assigned, ii)
+
+
+def _coerce_range(device_ranges, min_val, max_val):
+    '''
+    DAQmx picks the smallest device range that includes the requested limits
+    '''
+    ranges = sorted(zip(device_ranges[0::2], device_ranges[1::2]), key=lambda r: r[1] - r[0])
+    for low, high in ranges:
+        if low <= min_val and high >= max_val:
+            return low, high
+    return ranges[-1]
+
+
+def _ai_scaling_coeff(line, low, high):
+    '''
+    Polynomial (c0 + c1*x + c2*x**2 + c3*x**3) that turns the raw int16 code x from AI line
+    "line" into volts on the range (low, high). Each line has its own small offset, gain error
+    and non-linearity, as a calibrated board does, so the coefficients differ by channel.
+    '''
+    lsb = (high - low) / 65536
+    return [lsb * 0.5 * ((line % 5) - 2), lsb * (1 + 1E-5 * ((line % 7) - 3)), 0.0, lsb * 2E-15 * ((line % 3) - 1)]
+
+
+class AIChannelCollection(ChannelCollection):
+
+    kind = 'ai'
+
+    def add_ai_voltage_chan(self, physical_channel, name_to_assign_to_channel='',
+                            terminal_config=TerminalConfiguration.DEFAULT, min_val=-5.0,
+                            max_val=5.0, units=VoltageUnits.VOLTS, custom_scale_name=''):
+        pairs = parse_physical_channels(physical_channel, 'ai')
+        channels = []
+        for ii, (dev, line) in enumerate(pairs):
+            physical = '%s/ai%d' % (dev.name, line)
+            chan = Channel(self._task, self._name(name_to_assign_to_channel, physical, ii, len(pairs)),
+                           physical, dev, 'ai', line=line)
+            chan.ai_min, chan.ai_max = min_val, max_val
+            chan.ai_rng_low, chan.ai_rng_high = _coerce_range(dev.ai_voltage_rngs, min_val, max_val)
+            chan.ai_term_cfg = terminal_config
+            chan.ai_resolution = 16
+            chan.ai_dev_scaling_coeff = _ai_scaling_coeff(line, chan.ai_rng_low, chan.ai_rng_high)
+            channels.append(chan)
+        return self._add(channels)
+
+
+class AOChannelCollection(ChannelCollection):
+
+    kind = 'ao'
+
+    def add_ao_voltage_chan(self, physical_channel, name_to_assign_to_channel='', min_val=-10.0,
+                            max_val=10.0, units=VoltageUnits.VOLTS, custom_scale_name=''):
+        pairs = parse_physical_channels(physical_channel, 'ao')
+        channels = []
+        for ii, (dev, line) in enumerate(pairs):
+            physical = '%s/ao%d' % (dev.name, line)
+            chan = Channel(self._task, self._name(name_to_assign_to_channel, physical, ii, len(pairs)),
+                           physical, dev, 'ao', line=line)
+            chan.ao_min, chan.ao_max = min_val, max_val
+            chan.ao_dac_rng_low, chan.ao_dac_rng_high = _coerce_range(dev.ao_voltage_rngs, min_val, max_val)
+            channels.append(chan)
+        added = self._add(channels)
+        self._task._register_ao_sources()
+        return added
+
+
+class DOChannelCollection(ChannelCollection):
+
+    kind = 'do'
+
+    def add_do_chan(self, lines, name_to_assign_to_channel='', line_grouping=LineGrouping.CHAN_FOR_ALL_LINES):
+        groups = parse_physical_channels(lines, 'do')
+        if enum_value(line_grouping) == LineGrouping.CHAN_PER_LINE.value:
+            groups = [(dev, port, [line]) for dev, port, port_lines in groups for line in port_lines]
+        channels = []
+        for ii, (dev, port, port_lines) in enumerate(groups):
+            physical = '%s/port%d/line%s' % (dev.name, port,
+                                             port_lines[0] if len(port_lines) == 1 else '%d:%d' % (port_lines[0], port_lines[-1]))
+            channels.append(Channel(self._task, self._name(name_to_assign_to_channel, physical, ii, len(groups)),
+                                    physical, dev, 'do', port=port, lines=port_lines))
+        return self._add(channels)
+
+
+class Timing():
+    '''
+    Mirrors nidaqmx task.timing
+    '''
+
+    def __init__(self, task):
+        self._task = task
+        self.samp_timing_type = SampleTimingType.ON_DEMAND
+        self.samp_clk_src = ''
+        self.samp_clk_active_edge = Edge.RISING
+        self.samp_quant_samp_mode = AcquisitionType.FINITE
+        self.samp_quant_samp_per_chan = 1000
+        self._rate = None
+
+    def cfg_samp_clk_timing(self, rate, source='', active_edge=Edge.RISING,
+                            sample_mode=AcquisitionType.FINITE, samps_per_chan=1000):
+        self.samp_timing_type = SampleTimingType.SAMPLE_CLOCK
+        self.samp_clk_rate = rate
+        self.samp_clk_src = '' if source in ('', 'OnboardClock') else source
+        self.samp_clk_active_edge = active_edge
+        self.samp_quant_samp_mode = sample_mode
+        self.samp_quant_samp_per_chan = int(samps_per_chan)
+
+    @property
+    def samp_clk_rate(self):
+        return self._rate
+
+    @samp_clk_rate.setter
+    def samp_clk_rate(self, rate):
+        # The sample clock is the timebase divided by an integer
+        divisor = max(1, round(TIMEBASE / rate))
+        self._rate = TIMEBASE / divisor
+
+    @property
+    def samp_clk_max_rate(self):
+        return self._task._max_rate()
+
+    @property
+    def _is_timed(self):
+        return self.samp_timing_type is SampleTimingType.SAMPLE_CLOCK
+
+    @property
+    def _is_finite(self):
+        return enum_value(self.samp_quant_samp_mode) == AcquisitionType.FINITE.value
+
+
+class StartTrigger():
+
+    def __init__(self, task):
+        self._task = task
+        self.trig_type = TriggerType.NONE
+        self.dig_edge_src = ''
+        self.dig_edge_edge = Edge.RISING
+
+    def cfg_dig_edge_start_trig(self, trigger_source, trigger_edge=Edge.RISING):
+        self.trig_type = TriggerType.DIGITAL_EDGE
+        self.dig_edge_src = trigger_source
+        self.dig_edge_edge = trigger_edge
+
+    def disable_start_trig(self):
+        self.trig_type = TriggerType.NONE
+        self.dig_edge_src = ''
+
+
+class Triggers():
+
+    def __init__(self, task):
+        self.start_trigger = StartTrigger(task)
+
+
+class ExportSignals():
+    '''
+    Mirrors nidaqmx task.export_signals. Only RTSI and PFI lines can be driven.
+    '''
+
+    def __init__(self, task):
+        self._task = task
+        self._terminals = {}
+
+    def export_signal(self, signal_id, output_terminal):
+        export_to_bus(output_terminal, self._task)
+        self._terminals[enum_value(signal_id)] = output_terminal
+
+    @property
+    def samp_clk_output_term(self):
+        return self._terminals.get(Signal.SAMPLE_CLOCK.value, '')
+
+    @samp_clk_output_term.setter
+    def samp_clk_output_term(self, terminal):
+        self.export_signal(Signal.SAMPLE_CLOCK, terminal)
+
+    @property
+    def start_trig_output_term(self):
+        return self._terminals.get(Signal.START_TRIGGER.value, '')
+
+    @start_trig_output_term.setter
+    def start_trig_output_term(self, terminal):
+        self.export_signal(Signal.START_TRIGGER, terminal)
+
+
+class InStream():
+    '''
+    Mirrors nidaqmx task.in_stream. Stream readers are constructed from this object.
+    '''
+
+    def __init__(self, task):
+        self._task = task
+        self._input_buf_size = None
+        self.read_all_avail_samp = False
+
+    @property
+    def input_buf_size(self):
+        timing = self._task.timing
+        if self._input_buf_size is not None:
+            return self._input_buf_size
+        if not timing._is_timed:
+            return 0
+        if timing._is_finite:
+            return timing.samp_quant_samp_per_chan
+        return default_input_buffer_size(timing.samp_clk_rate, timing.samp_quant_samp_per_chan)
+
+    @input_buf_size.setter
+    def input_buf_size(self, value):
+        self._input_buf_size = int(value)
+
+    @property
+    def total_samp_per_chan_acquired(self):
+        return self._task._samples_done()
+
+    @property
+    def curr_read_pos(self):
+        return self._task._read_pos
+
+    @property
+    def avail_samp_per_chan(self):
+        return self._task._samples_done() - self._task._read_pos
+
+    @property
+    def num_chans(self):
+        return self._task.number_of_channels
+
+
+class OutStream():
+    '''
+    Mirrors nidaqmx task.out_stream. Stream writers are constructed from this object.
+    '''
+
+    def __init__(self, task):
+        self._task = task
+        self.regen_mode = RegenerationMode.ALLOW_REGENERATION
+        self._output_buf_size = None
+
+    @property
+    def output_buf_size(self):
+        if self._output_buf_size is not None:
+            return self._output_buf_size
+        return self._task._obuf_capacity()
+
+    @output_buf_size.setter
+    def output_buf_size(self, value):
+        self._output_buf_size = int(value)
+
+    @property
+    def output_onbrd_buf_size(self):
+        task = self._task
+        return task.ao_channels[0].device.ao_fifo_size if task._kind == 'ao' else 0
+
+    @property
+    def space_avail(self):
+        task = self._task
+        if self._regenerating:
+            return task._obuf_capacity()
+        return task._obuf_capacity() - (task._written - task._samples_transferred())
+
+    @property
+    def total_samp_per_chan_generated(self):
+        return self._task._samples_done()
+
+    @property
+    def curr_write_pos(self):
+        return self._task._written
+
+    @property
+    def num_chans(self):
+        return self._task.number_of_channels
+
+    @property
+    def _regenerating(self):
+        return enum_value(self.regen_mode) == RegenerationMode.ALLOW_REGENERATION.value
+
+
+class _EveryNSamplesEvent(threading.Thread):
+    '''
+    Calls the user's callback each time another N samples have been acquired or generated
+    '''
+
+    def __init__(self, task, sample_interval, callback, event_type):
+        super().__init__(name='%s-every-n-samples' % task.name, daemon=True)
+        self._task = task
+        self._interval = sample_interval
+        self._callback = callback
+        self._event_type = event_type
+
+    def run(self):
+        task = self._task
+        timing = task.timing
+        fired = 0
+        while not task._stopping.is_set():
+            target = (fired + 1) * self._interval
+            if timing._is_finite and target > timing.samp_quant_samp_per_chan:
+                break
+            if self._event_type is EveryNSamplesEventType.TRANSFERRED_FROM_BUFFER:
+                # Samples leave the host buffer as soon as there is room for them in the onboard FIFO
+                target -= task._fifo_size()
+            if not task._wait_for_samples(target, WAIT_INFINITELY, raise_on_stop=False):
+                break
+            try:
+                self._callback(task._handle, self._event_type.value, self._interval, None)
+            except Exception:
+                if not task._stopping.is_set():
+                    traceback.print_exc()
+            fired += 1
+
+
+class _DoneEvent(threading.Thread):
+
+    def __init__(self, task, callback):
+        super().__init__(name='%s-done' % task.name, daemon=True)
+        self._task = task
+        self._callback = callback
+
+    def run(self):
+        task = self._task
+        if not task._wait_for_samples(task.timing.samp_quant_samp_per_chan, WAIT_INFINITELY, raise_on_stop=False):
+            return
+        try:
+            self._callback(task._handle, 0, None)
+        except Exception:
+            traceback.print_exc()
+
+
+class Task():
+    '''
+    Simulated stand-in for nidaqmx.Task
+    '''
+
+    def __init__(self, new_task_name=''):
+        self._handle = next(_handles)
+        if not new_task_name:
+            new_task_name = '_unnamedTask<%d>' % self._handle
+        with _open_tasks_lock:
+            if new_task_name in _open_tasks:
+                raise errors.DaqError('Specified task name is already in use by another task.\nTask Name: %s' % new_task_name,
+                                      errors.DUPLICATE_TASK)
+            _open_tasks[new_task_name] = self
+        self._name = new_task_name
+        self._closed = False
+
+        self._kind = None
+        self.ai_channels = AIChannelCollection(self)
+        self.ao_channels = AOChannelCollection(self)
+        self.do_channels = DOChannelCollection(self)
+        self.timing = Timing(self)
+        self.triggers = Triggers(self)
+        self.export_signals = ExportSignals(self)
+        self.in_stream = InStream(self)
+        self.out_stream = OutStream(self)
+
+        # Run-time state
+        self._running = False
+        self._stopping = threading.Event()
+        self._arm_time = None
+        self._t0 = None
+        self._rate = None
+        self._read_pos = 0
+        self._raw_scratch = None  # Volts read before conversion to raw codes
+        self._events = []
+        self._threads = []
+        self._error = None
+
+        # Output buffer: a ring of shape (channels, capacity) and the number of samples written into it
+        self._obuf = np.zeros((0, 0))
+        self._written = 0
+        self._capacity = None
+        self._static = None       # The value held by each output when not generating
+        self._history = None      # On-demand output history, for the AI loopback
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return 'Task(name=%s)' % self._name
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def _channels(self):
+        return {'ai': self.ai_channels, 'ao': self.ao_channels, 'do': self.do_channels}.get(self._kind, [])
+
+    @property
+    def channel_names(self):
+        return [chan.name for chan in self._channels]
+
+    @property
+    def number_of_channels(self):
+        return len(self._channels)
+
+    @property
+    def devices(self):
+        seen = []
+        for chan in self._channels:
+            if chan.device not in seen:
+                seen.append(chan.device)
+        return seen
+
+
+    # Channel and device housekeeping
+    def _claim_kind(self, kind):
+        if self._kind not in (None, kind):
+            raise errors.DaqError('A task can only contain one type of channel (%s channels already present)' % self._kind,
+                                  errors.INVALID_CHANNEL, self._name)
+        self._kind = kind
+
+    def _register_ao_sources(self):
+        num = len(self.ao_channels)
+        self._static = np.zeros(num)
+        self._history = OnDemandHistory(num)
+        for column, chan in enumerate(self.ao_channels):
+            chan.device._ao_sources[chan.line] = (self, column)
+
+    def _release_ao_sources(self):
+        for chan in self.ao_channels:
+            if chan.device._ao_sources.get(chan.line, (None,))[0] is self:
+                del chan.device._ao_sources[chan.line]
+
+    def _max_rate(self):
+        channels = list(self._channels)
+        if not channels:
+            return 0
+        dev = channels[0].device
+        if self._kind == 'ai':
+            if len(channels) == 1:
+                return dev.ai_max_single_chan_rate
+            if dev.ai_simultaneous_sampling_supported:
+                return dev.ai_max_multi_chan_rate
+            return dev.ai_max_multi_chan_rate / len(channels)
+        if self._kind == 'ao':
+            return dev.ao_max_rate
+        return dev.do_max_rate
+
+
+    # Sample clock
+    def _resolve_terminal(self, terminal):
+        '''
+        Return the task driving a terminal such as /Dev1/ai/StartTrigger or /Dev2/RTSI0, or
+        None if that subsystem is not running or nothing is exported to that line.
+        '''
+        parts = terminal.strip('/').split('/')
+        if len(parts) == 2:
+            source = bus_task(terminal)
+            return source if source is not None and source._running else None
+        if len(parts) != 3:
+            raise errors.DaqError('Terminal %s can not be routed in the simulated device' % terminal,
+                                  errors.INVALID_CHANNEL, self._name)
+        return get_device(parts[0]).running_task(parts[1])
+
+    def _trigger_time(self):
+        '''
+        The time at which this task received its start trigger, or None if it has not
+        been triggered yet.
+        '''
+        if not self._running:
+            return None
+        trigger = self.triggers.start_trigger
+        if trigger.trig_type is TriggerType.NONE:
+            return self._arm_time
+        source = self._resolve_terminal(trigger.dig_edge_src)
+        if source is None:
+            return None
+        t = source._trigger_time()
+        if t is None or t < self._arm_time:
+            # Triggers arriving before we were armed are missed, as on the hardware
+            return None
+        return t
+
+    def _clock(self):
+        '''
+        Return (t0, rate): the time of the first sample clock edge and the sample rate.
+        t0 is None if the task is not running or has not been triggered.
+        '''
+        if self._t0 is not None or not self._running:
+            return self._t0, self._rate
+        t_start = self._trigger_time()
+        if t_start is None:
+            return None, self._rate
+        rate = self.timing.samp_clk_rate
+        source = self.timing.samp_clk_src
+        if source:
+            source_task = self._resolve_terminal(source)
+            if source_task is None:
+                return None, self._rate
+            src_t0, rate = source_task._clock()
+            if src_t0 is None:
+                return None, self._rate
+            # The first edge of the shared clock after we are triggered
+            edges = max(0, math.ceil((t_start - src_t0) * rate - 1E-9))
+            t_start = src_t0 + edges / rate
+        self._t0, self._rate = t_start, rate
+        return self._t0, self._rate
+
+    def _samples_done(self, now=None):
+        '''
+        The number of samples per channel acquired or generated so far
+        '''
+        if not self.timing._is_timed:
+            return 0
+        t0, rate = self._clock()
+        if t0 is None:
+            return 0
+        if now is None:
+            now = time.perf_counter()
+        done = max(0, int((now - t0) * rate))
+        if self.timing._is_finite:
+            done = min(done, self.timing.samp_quant_samp_per_chan)
+        return done
+
+    def _wait_for_samples(self, target, timeout, raise_on_stop=True):
+        '''
+        Block until "target" samples per channel have been acquired or generated.
+        Returns False if the task was stopped while waiting (and raise_on_stop is False).
+        '''
+        deadline = None if timeout == WAIT_INFINITELY else time.perf_counter() + timeout
+        while True:
+            now = time.perf_counter()
+            t0, rate = self._clock()
+            if t0 is not None:
+                wait = t0 + target / rate - now
+                if wait <= 0:
+                    return True
+            else:
+                wait = 1E-3  # Not triggered yet: poll
+            if deadline is not None:
+                if now >= deadline:
+                    raise errors.DaqError('Wait Until Done did not indicate that the task was done within the specified timeout.'
+                                          if self._kind == 'ao' else
+                                          'Some or all of the samples requested have not yet been acquired.',
+                                          errors.READ_TIMEOUT if self._kind != 'ao' else errors.WAIT_TIMEOUT,
+                                          self._name)
+                wait = min(wait, deadline - now)
+            if self._stopping.wait(wait):
+                if raise_on_stop:
+                    raise errors.DaqError('Task specified is invalid or does not exist.', errors.INVALID_TASK, self._name)
+                return False
+
+
+    # Task control
+    def start(self):
+        if self._running:
+            return
+        if self._kind is None:
+            raise errors.DaqError('Task contains no channels.', errors.INVALID_CHANNEL, self._name)
+
+        if self.timing._is_timed:
+            if self.timing.samp_clk_rate > self._max_rate() * 1.0001:
+                raise errors.DaqError('Requested sample rate %g exceeds the maximum of %g for this task.'
+                                      % (self.timing.samp_clk_rate, self._max_rate()), errors.RATE_TOO_HIGH, self._name)
+            if self._kind in ('ao', 'do'):
+                if self._written == 0:
+                    raise errors.DaqError('Generation cannot be started, because the output buffer is empty.',
+                                          errors.EMPTY_OUTPUT_BUFFER, self._name)
+                self._fix_obuf_capacity()
+            for dev in self.devices:
+                dev.register_running(self._kind, self)
+
+        self._stopping.clear()
+        self._read_pos = 0
+        self._t0 = None
+        self._rate = self.timing.samp_clk_rate
+        self._error = None
+        self._arm_time = time.perf_counter()
+        self._running = True
+
+        self._threads = [event(self) for event in self._events]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        if self._kind == 'ao' and self.timing._is_timed:
+            # The outputs hold the last value generated
+            now = np.array([time.perf_counter()])
+            held = np.zeros(1)
+            for column in range(len(self.ao_channels)):
+                self._ao_output(column, now, held)
+                self._static[column] = held[0]
+            self._history.append(now[0], self._static)
+        elif self._kind == 'do' and self.timing._is_timed:
+            # The lines hold the last sample generated
+            now = np.array([time.perf_counter()])
+            held = np.zeros(1)
+            values = []
+            for column in range(len(self.do_channels)):
+                self._ao_output(column, now, held)
+                values.append(int(held[0]))
+            self._write_digital(values)
+
+        self._running = False
+        self._stopping.set()
+        for dev in self.devices:
+            dev.unregister_running(self._kind, self)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+        self._t0 = None
+        self._written = 0 if self.timing._is_timed and not self.out_stream._regenerating else self._written
+
+    def close(self):
+        if self._closed:
+            return
+        self.stop()
+        self._release_ao_sources()
+        release_bus(self)
+        with _open_tasks_lock:
+            _open_tasks.pop(self._name, None)
+        self._closed = True
+
+    def is_task_done(self):
+        if not self._running:
+            return True
+        if not self.timing._is_timed or not self.timing._is_finite:
+            return False
+        return self._samples_done() >= self.timing.samp_quant_samp_per_chan
+
+    def wait_until_done(self, timeout=10.0):
+        if not self._running or not self.timing._is_timed:
+            return
+        if not self.timing._is_finite:
+            raise errors.DaqError('Wait Until Done can not be used with continuous tasks.', errors.WAIT_TIMEOUT, self._name)
+        self._wait_for_samples(self.timing.samp_quant_samp_per_chan, timeout)
+
+
+    # Events
+    def register_every_n_samples_acquired_into_buffer_event(self, sample_interval, callback_method):
+        self._register_event(sample_interval, callback_method, EveryNSamplesEventType.ACQUIRED_INTO_BUFFER)
+
+    def register_every_n_samples_transferred_from_buffer_event(self, sample_interval, callback_method):
+        self._register_event(sample_interval, callback_method, EveryNSamplesEventType.TRANSFERRED_FROM_BUFFER)
+
+    def _register_event(self, sample_interval, callback_method, event_type):
+        self._events = [e for e in self._events if getattr(e, 'event_type', None) is not event_type]
+        if callback_method is not None:
+            factory = lambda task: _EveryNSamplesEvent(task, int(sample_interval), callback_method, event_type)
+            factory.event_type = event_type
+            self._events.append(factory)
+
+    def register_done_event(self, callback_method):
+        self._events = [e for e in self._events if getattr(e, 'event_type', None) != 'done']
+        if callback_method is not None:
+            factory = lambda task: _DoneEvent(task, callback_method)
+            factory.event_type = 'done'
+            self._events.append(factory)
+
+
+    # Reading
+    def _read_into(self, out, number_of_samples_per_channel, timeout):
+        '''
+        Fill out[:, :n] (channels x samples, float64) with the next n samples per channel.
+        Returns the number of samples per channel read.
+        '''
+        if self._kind != 'ai':
+            raise errors.DaqError('Reading is only supported for analog input tasks in the simulated backend.',
+                                  errors.INVALID_CHANNEL, self._name)
+        timing = self.timing
+
+        if not timing._is_timed:
+            # On-demand: one conversion per channel, now
+            self.ai_channels[0].device.on_demand_delay()
+            times = np.full(1, time.perf_counter())
+            for ii, chan in enumerate(self.ai_channels):
+                row = out[ii, :1]
+                chan.device.ai_signal(chan.line, times, row)
+                np.clip(row, chan.ai_rng_low, chan.ai_rng_high, out=row)
+            return 1
+
+        if not self._running:
+            self.start()  # DAQmx implicitly starts a task that is read before it was started
+
+        n = number_of_samples_per_channel
+        if n == READ_ALL_AVAILABLE:
+            if timing._is_finite:
+                n = timing.samp_quant_samp_per_chan - self._read_pos
+                self._wait_for_samples(timing.samp_quant_samp_per_chan, timeout)
+            else:
+                n = self._samples_done() - self._read_pos
+        elif timing._is_finite and self._read_pos + n > timing.samp_quant_samp_per_chan:
+            raise errors.DaqError('Attempted to read samples beyond the final sample acquired.',
+                                  errors.READ_PAST_END, self._name)
+        if n == 0:
+            return 0
+
+        self._wait_for_samples(self._read_pos + n, timeout)
+
+        # A finite task's buffer holds every sample unless input_buf_size was made smaller
+        acquired = self._samples_done()
+        if acquired - self._read_pos > self.in_stream.input_buf_size:
+            raise errors.DaqError('The application is not able to keep up with the hardware acquisition.\n'
+                                  'Increasing the buffer size, reading the data more frequently, or specifying a '
+                                  'fixed number of samples to read instead of reading all available samples might correct the problem.',
+                                  errors.INPUT_OVERWRITE, self._name)
+
+        t0, rate = self._clock()
+        times = np.arange(self._read_pos, self._read_pos + n, dtype=np.float64)
+        times /= rate
+        times += t0
+        for ii, chan in enumerate(self.ai_channels):
+            row = out[ii, :n]
+            chan.device.ai_signal(chan.line, times, row)
+            np.clip(row, chan.ai_rng_low, chan.ai_rng_high, out=row)
+        self._read_pos += n
+        return n
+
+    def _read_raw_into(self, out, number_of_samples_per_channel, timeout):
+        '''
+        Fill out[:, :n] (channels x samples, int16) with the next n raw samples per channel: the
+        codes the ADC produced, which ai_dev_scaling_coeff turns back into volts.
+        Returns the number of samples per channel read.
+        '''
+        width = out.shape[1] if number_of_samples_per_channel == READ_ALL_AVAILABLE else number_of_samples_per_channel
+        if self._raw_scratch is None or self._raw_scratch.shape[0] != out.shape[0] or self._raw_scratch.shape[1] < width:
+            self._raw_scratch = np.empty((out.shape[0], width))
+        volts = self._raw_scratch[:, :width]
+        n = self._read_into(volts, number_of_samples_per_channel, timeout)
+
+        # The non-linear terms are far below one code, so inverting the linear part is exact enough
+        coeff = np.array([chan.ai_dev_scaling_coeff for chan in self.ai_channels])
+        volts = volts[:, :n]
+        volts -= coeff[:, 0:1]
+        volts /= coeff[:, 1:2]
+        np.rint(volts, out=volts)
+        np.clip(volts, -32768, 32767, out=volts)
+        np.copyto(out[:, :n], volts, casting='unsafe')
+        return n
+
+    def read(self, number_of_samples_per_channel=NUM_SAMPLES_UNSET, timeout=10.0):
+        '''
+        Returns a float (one channel, one sample), a list of samples (one channel) or a list of
+        lists (several channels) just as nidaqmx.Task.read does.
+        '''
+        num_chans = self.number_of_channels
+        single_sample = number_of_samples_per_channel is NUM_SAMPLES_UNSET
+        n = 1 if single_sample else number_of_samples_per_channel
+        if n == READ_ALL_AVAILABLE:
+            if self.timing._is_finite:
+                n = self.timing.samp_quant_samp_per_chan - self._read_pos
+            else:
+                n = max(self.in_stream.avail_samp_per_chan, 0)
+        data = np.empty((num_chans, max(n, 1)))
+        n = self._read_into(data, n, timeout)
+        data = data[:, :n]
+
+        if single_sample:
+            return data[0, 0] if num_chans == 1 else data[:, 0].tolist()
+        return data[0].tolist() if num_chans == 1 else data.tolist()
+
+
+    # Writing
+    def _obuf_capacity(self):
+        if self._capacity is not None:
+            return self._capacity
+        if self.out_stream._output_buf_size is not None:
+            return self.out_stream._output_buf_size
+        return self._written
+
+    def _fifo_size(self):
+        '''
+        Samples of the onboard output FIFO available to a streaming (non-regenerating) task
+        '''
+        if self._kind != 'ao' or self.out_stream._regenerating:
+            return 0
+        return self.ao_channels[0].device.ao_fifo_size
+
+    def _samples_transferred(self):
+        '''
+        Samples per channel moved from the host buffer to the device so far
+        '''
+        return min(self._written, self._samples_done() + self._fifo_size())
+
+    def _fix_obuf_capacity(self):
+        '''
+        At start the output buffer size is fixed to the explicitly requested size, or else
+        to the number of samples written before the task started.
+        '''
+        capacity = self._obuf_capacity()
+        if self._obuf.shape[1] != capacity:
+            grown = np.zeros((self._obuf.shape[0], capacity))
+            keep = min(capacity, self._obuf.shape[1])
+            grown[:, :keep] = self._obuf[:, :keep]
+            self._obuf = grown
+        self._capacity = capacity
+
+    def _write_array(self, data, timeout):
+        '''
+        Write a (channels x samples) float64 array to the output buffer.
+        Returns the number of samples per channel written.
+        '''
+        num_chans, n = data.shape
+        if num_chans != self.number_of_channels:
+            raise errors.DaqError('Write cannot be performed, because the number of channels in the data does not '
+                                  'match the number of channels in the task.', errors.INVALID_ARRAY_SHAPE, self._name)
+
+        if not self.timing._is_timed:
+            if n != 1:
+                raise errors.DaqError('Only one sample per channel can be written by an on-demand task.',
+                                      errors.INVALID_ARRAY_SHAPE, self._name)
+            self._channels[0].device.on_demand_delay()
+            self._write_on_demand(data[:, 0])
+            return 1
+
+        self._check_underflow()
+        if self._obuf.shape[0] != num_chans:
+            self._obuf = np.zeros((num_chans, 0))
+
+        if not self._running and self._capacity is None:
+            # Before the first start the buffer grows to hold everything written
+            self._obuf = np.concatenate((self._obuf[:, :self._written], data), axis=1)
+            self._written += n
+            return n
+
+        capacity = self._capacity
+        regenerating = self.out_stream._regenerating
+        offset = 0
+        while offset < n:
+            if regenerating or not self._running:
+                chunk = min(n - offset, capacity)
+            else:
+                # Streaming: block until the device has made space in the buffer
+                chunk = min(n - offset, capacity)
+                self._wait_for_samples(self._written + chunk - capacity - self._fifo_size(), timeout)
+                self._check_underflow()
+            start = self._written % capacity
+            first = min(chunk, capacity - start)
+            self._obuf[:, start:start + first] = data[:, offset:offset + first]
+            self._obuf[:, :chunk - first] = data[:, offset + first:offset + chunk]
+            self._written += chunk
+            offset += chunk
+        return n
+
+    def _check_underflow(self):
+        if self._error is not None:
+            raise self._error
+        if not self._running or self.out_stream._regenerating or self.timing._is_finite:
+            return
+        if self._samples_done() > self._written:
+            self._error = errors.DaqError('Onboard device memory underflow. Because of system and/or bus-bandwidth limitations, '
+                                          'the driver could not write data to the device fast enough to keep up with the device output rate.',
+                                          errors.OUTPUT_UNDERFLOW, self._name)
+            raise self._error
+
+    def _write_on_demand(self, values):
+        now = time.perf_counter()
+        if self._kind == 'ao':
+            self._static = np.array(values, dtype=np.float64)
+            self._history.append(now, self._static)
+        else:
+            self._write_digital(values)
+
+    def _write_digital(self, values):
+        '''
+        Update the port state from one sample per channel. Each value is either a boolean
+        (applied to every line of the channel) or an integer in port format.
+        '''
+        for chan, value in zip(self.do_channels, values):
+            dev = chan.device
+            state = dev.do_port_state[chan.port]
+            for line in chan.lines:
+                if isinstance(value, (bool, np.bool_)):
+                    bit = bool(value)
+                else:
+                    bit = (int(value) >> line) & 1
+                state = (state | (1 << line)) if bit else (state & ~(1 << line))
+            dev.do_port_state[chan.port] = state
+
+    def _held_output(self, column, times, out):
+        '''
+        The value of output channel "column" at the supplied times when it is not generating
+        '''
+        if self._kind == 'ao':
+            return self._history.lookup(column, times, out)
+        chan = self.do_channels[column]
+        out[:] = chan.device.do_port_state[chan.port]
+        return out
+
+    def _ao_output(self, column, times, out):
+        '''
+        The voltage on AO channel "column" of this task at each of the supplied times. For a
+        DO task, the port-format value of DO channel "column".
+        '''
+        t0, rate = self._clock() if self.timing._is_timed else (None, None)
+        if t0 is None or self._written == 0:
+            return self._held_output(column, times, out)
+
+        k = np.floor((times - t0) * rate).astype(np.int64)
+        before = k < 0
+        if self.timing._is_finite:
+            np.minimum(k, self.timing.samp_quant_samp_per_chan - 1, out=k)
+        if not self.out_stream._regenerating:
+            # Once the buffer runs dry the output holds the last sample written
+            np.minimum(k, self._written - 1, out=k)
+        np.maximum(k, 0, out=k)
+        capacity = self._obuf.shape[1]
+        if self.out_stream._regenerating and not self.timing._is_finite:
+            k %= min(self._written, capacity)
+        else:
+            k %= capacity
+        np.take(self._obuf[column], k, out=out)
+        if before.any():
+            out[before] = self._held_output(column, times[before], np.empty(before.sum()))
+        return out
+
+    def write(self, data, auto_start=AUTO_START_UNSET, timeout=10.0):
+        '''
+        Accepts a scalar, a list or a 1D/2D array, just as nidaqmx.Task.write does.
+        Returns the number of samples per channel written.
+        '''
+        num_chans = self.number_of_channels
+        if self._kind == 'do':
+            values = np.atleast_1d(np.asarray(data))
+            if values.dtype == np.bool_ and values.size > num_chans:
+                # A list of booleans, one per line, for a channel that spans several lines
+                lines = [line for chan in self.do_channels for line in chan.lines]
+                values = np.array([sum(int(v) << line for v, line in zip(values, lines))], dtype=np.uint32)
+            array = values.reshape(num_chans, -1).astype(object)
+        else:
+            array = np.asarray(data, dtype=np.float64)
+            if array.ndim == 0:
+                array = array.reshape(1, 1)
+            elif array.ndim == 1:
+                array = array.reshape(1, -1) if num_chans == 1 else array.reshape(num_chans, 1)
+
+        n = array.shape[1]
+        if self._kind == 'do':
+            if not self.timing._is_timed:
+                self._channels[0].device.on_demand_delay()
+                self._write_digital(array[:, 0])
+                return 1
+            # Hardware-timed: port-format samples. A boolean drives every line of its channel.
+            masks = np.array([[sum(1 << line for line in chan.lines)] for chan in self.do_channels], dtype=object)
+            is_bool = np.vectorize(lambda v: isinstance(v, (bool, np.bool_)), otypes=[bool])(array)
+            array = np.where(is_bool, np.where(array.astype(bool), masks, 0), array).astype(np.float64)
+
+        written = self._write_array(array, timeout)
+        if auto_start is AUTO_START_UNSET:
+            auto_start = n == 1
+        if auto_start and self.timing._is_timed and not self._running:
+            self.start()
+        return written
@@ -1,6 +1,7 @@
 import nidaqmx as ni
+from pynidaqmxegs.utils import DeviceRegistry
 
-def demo():
+def demo(devName=None):
 
     sys = ni.system.System.local()
 
@@ -8,27 +9,42 @@ def demo():
     print('\nNI DAQmx driver version: %s\n' % str(sys.driver_version))
 
 
-    # List all connected device
+    # List all connected devices with their main capabilities. These come from the device
+    # registry, which queries each device in full only the first time it is seen (or after
+    # the driver is updated) and otherwise reads them from its cache file.
+    registry = DeviceRegistry.local()
     print('Connected devices:')
 
     n=1
-    for device in sys.devices:
-        print('%d. %s' % (n,device))
+    for caps in registry:
+        print('%d. %s: %s (serial %X, %s). AI max %g S/s (%g S/s aggregate%s), AO max %s S/s' %
+              (n, caps.name, caps.product_type, caps.serial_num, caps.bus_type,
+               caps.ai_max_single_chan_rate, caps.ai_max_multi_chan_rate,
+               ', simultaneous' if caps.ai_simultaneous_sampling_supported else '',
+               '%g' % caps.ao_max_rate if caps.ao_max_rate else '-'))
         n+=1
 
+    if registry.queried:
+        print('\nQueried from the driver: %s' % ', '.join(registry.queried))
+    print('Capabilities cache: %s' % registry.cache_file)
 
-    # Let's examin Dev1 more closely
-    t_dev = sys.devices['Dev1']
 
-    # Now we have access to loads of info such as all ther terminals in t_dev.ternminals
+    # Let's examine one device more closely: the first with analog inputs unless one was named
+    if devName is None:
+        devName = registry.default_device()
+    t_dev = registry[devName]
 
-    print('\n\nAvailable termninals on this DAQ:')
+    print('\n\nAI voltage ranges on %s:' % devName)
+    print(t_dev.ai_voltage_rngs)
+
+    # Now we have access to loads of info such as all the terminals in t_dev.terminals
+    print('\n\nAvailable terminals on this DAQ:')
     print(t_dev.terminals)
 
     print('\n\nWhat''s available:')
-    print(dir(t_dev))
+    print(dir(sys.devices[devName]))
 
 
 
 if __name__ == '__main__':
-    demo()
\ No newline at end of file
+    demo()
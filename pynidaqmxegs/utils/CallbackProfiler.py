@@ -0,0 +1,169 @@
+'''
+ Timing of DAQmx callbacks
+
+ pynidaqmxegs.utils.CallbackProfiler
+
+ Purpose
+ Every-N-samples callbacks must finish before the next one is due or the buffer fills
+ (AI) or empties (AO). This class records what happens in each call of a callback so
+ it is possible to see where the time goes: when the call started, how long it took,
+ how many samples it was called for, how many samples were waiting in the input buffer
+ (in_stream.avail_samp_per_chan) and how much space was free in the output buffer
+ (out_stream.space_avail) when it started. A growing backlog, or shrinking space, means
+ the callback is not keeping up.
+
+ Records go into a pre-allocated structured NumPy array of fixed size. When it is full
+ the oldest records are overwritten, so profiling can be left on for a long run. Nothing
+ is allocated per call and no lock is taken.
+
+ Profiling is opt-in. wrap() returns a callback to register in place of the original.
+ If no profiler is used the original is registered and nothing is added to the hot path.
+ The examples with callbacks take a profiler as an argument or a "profiler" property.
+
+
+ Example session:
+ profiler = CallbackProfiler(capacity=10000)
+ task.register_every_n_samples_acquired_into_buffer_event(1000, profiler.wrap(read_chunk, in_stream=task.in_stream))
+ ...
+ print(profiler.report())
+ profiler.summary()['duration']['p99_us']
+ profiler.records()['avail_samp_per_chan']
+'''
+
+import itertools
+import time
+
+import numpy as np
+
+
+RECORD_DTYPE = np.dtype([('start', np.float64),            # time.perf_counter() at entry, s
+                         ('duration', np.float64),         # time spent in the callback, s
+                         ('samples', np.int64),            # number of samples the callback was called for
+                         ('avail_samp_per_chan', np.int64),  # in_stream backlog at entry. -1 if not recorded.
+                         ('space_avail', np.int64)])       # out_stream free space at entry. -1 if not recorded.
+
+
+class CallbackProfiler():
+
+    def __init__(self, capacity=10000):
+        '''
+        capacity - number of calls kept. Older calls are overwritten.
+        '''
+        self.capacity = int(capacity)
+        self._log = np.zeros(self.capacity, dtype=RECORD_DTYPE)
+        self.reset()
+
+
+    def reset(self):
+        '''
+        Discard all records
+        '''
+        # next() on itertools.count is atomic under the GIL, so callbacks running in different
+        # driver threads can share a profiler without a lock
+        self._counter = itertools.count()
+        self._count = 0
+
+
+    def wrap(self, callback, in_stream=None, out_stream=None):
+        '''
+        Return a DAQmx callback that calls "callback" and records the call. in_stream and
+        out_stream are the streams whose backlog and free space are recorded, e.g.
+        task.in_stream for an AI callback or task.out_stream for an AO one. Either may be None.
+        '''
+        log = self._log
+        capacity = self.capacity
+        perf_counter = time.perf_counter
+
+        def profiled(task_handle, event_type, num_samples, callback_data):
+            start = perf_counter()
+            avail = in_stream.avail_samp_per_chan if in_stream is not None else -1
+            space = out_stream.space_avail if out_stream is not None else -1
+            try:
+                return callback(task_handle, event_type, num_samples, callback_data)
+            finally:
+                index = next(self._counter)
+                log[index % capacity] = (start, perf_counter() - start, num_samples, avail, space)
+                self._count = index + 1
+
+        profiled.__wrapped__ = callback
+        return profiled
+
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+
+    @property
+    def total_calls(self):
+        '''
+        Number of calls recorded since the last reset, including those overwritten
+        '''
+        return self._count
+
+
+    def records(self):
+        '''
+        Return a copy of the records kept, oldest first, as a structured array with the
+        fields start, duration, samples, avail_samp_per_chan and space_avail
+        '''
+        count = self._count
+        if count <= self.capacity:
+            return self._log[:count].copy()
+        first = count % self.capacity
+        return np.concatenate((self._log[first:], self._log[:first]))
+
+
+    def summary(self):
+        '''
+        Return a dict summarising the records kept: percentiles of the callback duration and
+        of the interval between calls in us (from pynidaqmxegs.utils.timing), of the input
+        backlog and of the output space in samples per channel, and the fraction of time spent
+        in the callback. Buffer statistics are None if they were not recorded.
+        '''
+        from pynidaqmxegs.utils.timing import latency_summary
+
+        records = self.records()
+        result = dict(calls=self._count, kept=len(records),
+                      duration=latency_summary(records['duration']),
+                      interval=latency_summary(np.diff(records['start'])),
+                      avail_samp_per_chan=_level_summary(records['avail_samp_per_chan']),
+                      space_avail=_level_summary(records['space_avail']),
+                      busy_fraction=None)
+        if len(records) > 1:
+            elapsed = records['start'][-1] + records['duration'][-1] - records['start'][0]
+            result['busy_fraction'] = float(records['duration'].sum() / elapsed)
+        return result
+
+
+    def report(self):
+        '''
+        Return the summary as a few lines of text
+        '''
+        summary = self.summary()
+        lines = ['%d callback(s), last %d kept' % (summary['calls'], summary['kept'])]
+        for key in ('duration', 'interval'):
+            if summary[key] is not None:
+                lines.append('%-9s p50 %8.1f us  p90 %8.1f us  p99 %8.1f us  max %8.1f us' %
+                             ((key,) + tuple(summary[key][k] for k in ('p50_us', 'p90_us', 'p99_us', 'max_us'))))
+        for key, label in (('avail_samp_per_chan', 'backlog'), ('space_avail', 'space')):
+            if summary[key] is not None:
+                lines.append('%-9s p50 %8d     p99 %8d     min %8d     max %8d   samples/chan' %
+                             ((label,) + tuple(summary[key][k] for k in ('p50', 'p99', 'min', 'max'))))
+        if summary['busy_fraction'] is not None:
+            lines.append('busy      %0.1f%% of the time' % (100 * summary['busy_fraction']))
+        return '\n'.join(lines)
+
+
+    def save(self, path):
+        '''
+        Save the records kept to a .npy file
+        '''
+        np.save(path, self.records())
+
+
+def _level_summary(values):
+    values = values[values >= 0]
+    if values.size == 0:
+        return None
+    p50, p99 = np.percentile(values, [50, 99])
+    return dict(p50=int(p50), p99=int(p99), min=int(values.min()), max=int(values.max()))
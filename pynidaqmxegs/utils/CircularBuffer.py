@@ -0,0 +1,102 @@
+'''
+ Fixed-size circular buffer for scrolling plots
+
+ pynidaqmxegs.utils.CircularBuffer
+
+ Purpose
+ A scrolling plot needs the last N samples, oldest first, as one contiguous array.
+ Keeping them in a collections.deque means converting N Python floats back into an
+ array (np.array(deque)) every time the plot is updated.
+
+ This class keeps the samples in a NumPy array instead. Appending is O(1) and the
+ buffer can be viewed "unrolled" (oldest sample first) without any copying at all:
+ every sample is stored twice, at position i and at position i+N of an array of
+ length 2N, so the last N samples are always the contiguous slice [pos:pos+N].
+ The price is that each append writes two values instead of one.
+
+ Both single channel (1D) and multi-channel (channels x samples) buffers are supported.
+
+
+ Example session:
+ buf = CircularBuffer(1000)                  # or CircularBuffer(1000, num_channels=4)
+ buf.append(task.read())                     # one sample (one per channel)
+ buf.extend(chunk)                           # many samples, shape (samples,) or (channels, samples)
+ curve.setData(buf.view())                   # the last 1000 samples, oldest first. No copy.
+'''
+
+import numpy as np
+
+
+class CircularBuffer():
+
+    def __init__(self, length, num_channels=None, dtype=np.float64, fill_value=0):
+        '''
+        length - number of samples per channel held
+        num_channels - None for a 1D buffer, otherwise the number of rows
+        dtype - data type of the buffer
+        fill_value - initial contents
+        '''
+        self.length = int(length)
+        shape = (2 * self.length,) if num_channels is None else (int(num_channels), 2 * self.length)
+        self._data = np.full(shape, fill_value, dtype=dtype)
+        self._pos = 0          # Index of the oldest sample, in the range [0, length)
+        self.total_appended = 0
+
+
+    def __len__(self):
+        return self.length
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.view()
+        return view if dtype is None else view.astype(dtype)
+
+
+    def view(self):
+        '''
+        The buffer contents, oldest sample first, as a contiguous read-only view. The view
+        changes as data are appended: copy it if the contents need to be kept.
+        '''
+        view = self._data[..., self._pos:self._pos + self.length]
+        view.flags.writeable = False
+        return view
+
+
+    def append(self, value):
+        '''
+        Append one sample (a scalar, or one value per channel)
+        '''
+        pos = self._pos
+        self._data[..., pos] = value
+        self._data[..., pos + self.length] = value
+        self._pos = pos + 1 if pos + 1 < self.length else 0
+        self.total_appended += 1
+
+
+    def extend(self, chunk):
+        '''
+        Append several samples: shape (samples,) for a 1D buffer or (channels, samples)
+        '''
+        chunk = np.asarray(chunk)
+        n = chunk.shape[-1]
+        self.total_appended += n
+        if n >= self.length:
+            chunk = chunk[..., n - self.length:]
+            self._data[..., :self.length] = chunk
+            self._data[..., self.length:] = chunk
+            self._pos = 0
+            return
+
+        pos = self._pos
+        first = min(n, self.length - pos)
+        for offset in (0, self.length):
+            self._data[..., pos + offset:pos + offset + first] = chunk[..., :first]
+            if first < n:
+                self._data[..., offset:offset + n - first] = chunk[..., first:]
+        self._pos = (pos + n) % self.length
+
+
+    def fill(self, value):
+        '''
+        Set every sample to "value"
+        '''
+        self._data[...] = value
@@ -0,0 +1,314 @@
+'''
+ Cached capabilities of the connected DAQ devices
+
+ pynidaqmxegs.utils.DeviceRegistry
+
+ Purpose
+ Each property of a device (maximum rates, voltage ranges, terminals, ...) is a separate
+ call into the driver, and some of them, terminals in particular, are slow. Examples that
+ check a sample rate or pick a device would otherwise make these calls every time they
+ run. This class enumerates the devices once per process and keeps their capabilities
+ in a JSON file in the user's cache directory, so later runs read them from disk.
+
+ Cached entries are keyed by the device's serial number and the driver version. At each
+ enumeration only the name, serial number and product type of each device are read from
+ the driver. A device whose serial number is not in the cache, or whose entry was made
+ with another driver version or product type, is queried in full and its entry replaced.
+ So swapping a board or upgrading DAQmx invalidates the cache without any action.
+
+ Device names come from the driver each time, since they can be changed in MAX. Channel
+ and terminal names contain the device name ('Dev2/ai0', '/Dev2/RTSI0'), so each entry
+ records the name the device had when it was queried, and on loading the names that
+ start with it are given the current name instead. Names of other devices, such as the
+ chassis terminals of a cDAQ module ('/cDAQ1/ai/SampleClock'), are left as they are.
+ Devices with serial number 0 (NI's simulated devices all have it) are keyed by name as
+ well, so they never share an entry.
+
+ The cache file is ~/.cache/pynidaqmxegs/devices.json (%LOCALAPPDATA%\\pynidaqmxegs on
+ Windows) unless the environment variable PYNIDAQMXEGS_DEVICE_CACHE names another file.
+
+
+ Example session:
+ registry = DeviceRegistry.local()       # Shared instance, enumerated on first use
+ registry.names                          # ['Dev1', 'Dev2', 'Dev3']
+ caps = registry['Dev1']
+ caps.ai_max_multi_chan_rate             # 1000000.0
+ registry.check_ai_rate('Dev1', 5E5, num_channels=4)   # ValueError: above the aggregate rate
+ registry.find(ai_simultaneous_sampling_supported=True)
+ registry.refresh()                      # Enumerate again, e.g. after plugging in a device
+'''
+
+import json
+import os
+from collections import namedtuple
+
+
+CACHE_ENV_VAR = 'PYNIDAQMXEGS_DEVICE_CACHE'
+CACHE_FORMAT = 3
+
+# Properties read from the driver and cached. Enums are stored by name.
+_CACHED_PROPERTIES = ('product_category', 'bus_type', 'is_simulated',
+                      'ai_physical_chans', 'ao_physical_chans', 'do_ports', 'do_lines',
+                      'ai_max_single_chan_rate', 'ai_max_multi_chan_rate', 'ai_min_rate',
+                      'ai_simultaneous_sampling_supported', 'ai_voltage_rngs',
+                      'ao_max_rate', 'ao_min_rate', 'ao_voltage_rngs',
+                      'terminals')
+
+# Cached properties whose values are names starting with the device name
+_CHANNEL_PROPERTIES = ('ai_physical_chans', 'ao_physical_chans', 'do_ports', 'do_lines')
+_TERMINAL_PROPERTIES = ('terminals',)
+
+DeviceCapabilities = namedtuple('DeviceCapabilities',
+                                ('name', 'serial_num', 'product_type', 'driver_version') + _CACHED_PROPERTIES)
+
+
+def default_cache_file():
+    '''
+    Return the path of the cache file: PYNIDAQMXEGS_DEVICE_CACHE if set, otherwise
+    devices.json in the user's cache directory
+    '''
+    if os.environ.get(CACHE_ENV_VAR):
+        return os.environ[CACHE_ENV_VAR]
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pynidaqmxegs', 'devices.json')
+
+
+def _read_property(device, prop):
+    '''
+    Read one capability from the driver. Devices without a subsystem raise an error, or
+    lack the attribute, when asked about it: these are recorded as None.
+    '''
+    import nidaqmx
+    if prop == 'is_simulated':
+        prop = 'dev_is_simulated'
+    try:
+        value = getattr(device, prop)
+    except (AttributeError, nidaqmx.errors.DaqError):
+        return None
+    if hasattr(value, 'channel_names'):         # Physical channel collections
+        return list(value.channel_names)
+    if hasattr(value, 'name') and hasattr(value, 'value'):  # Enums
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return value
+
+
+def _cache_key(serial_num, dev_name):
+    # Serial number 0 is shared by every NI simulated device, so the name must tell them apart
+    if serial_num == 0:
+        return '%08X:%s' % (serial_num, dev_name)
+    return '%08X' % serial_num
+
+
+def _prefix(prop, dev_name):
+    if prop in _CHANNEL_PROPERTIES:
+        return dev_name + '/'
+    if prop in _TERMINAL_PROPERTIES:
+        return '/%s/' % dev_name
+    return None
+
+
+def _renamed(prop, value, old_name, new_name):
+    '''
+    Return a cached property with the names it contains that start with device old_name
+    moved to device new_name. Names of other devices are unchanged.
+    '''
+    old_prefix = _prefix(prop, old_name)
+    if old_prefix is None or value is None or old_name == new_name:
+        return value
+    new_prefix = _prefix(prop, new_name)
+    return [new_prefix + name[len(old_prefix):] if name.startswith(old_prefix) else name for name in value]
+
+
+class DeviceRegistry():
+
+    _local = None
+
+    def __init__(self, cache_file=None):
+        '''
+        cache_file - path of the JSON cache. Default: default_cache_file(). False to keep
+                     the capabilities in memory only.
+        '''
+        self.cache_file = default_cache_file() if cache_file is None else cache_file
+        self.driver_version = None
+        self.queried = []           # Names of the devices queried in full at the last enumeration
+        self._devices = None        # Device name -> DeviceCapabilities
+
+
+    @staticmethod
+    def local():
+        '''
+        Return the registry shared by the whole process
+        '''
+        if DeviceRegistry._local is None:
+            DeviceRegistry._local = DeviceRegistry()
+        return DeviceRegistry._local
+
+
+    def refresh(self):
+        '''
+        Enumerate the devices, re-using cached capabilities where the serial number, driver version
+        and product type still match, and update the cache file
+        '''
+        import nidaqmx
+
+        system = nidaqmx.system.System.local()
+        version = system.driver_version
+        self.driver_version = '%d.%d.%d' % (version.major_version, version.minor_version, version.update_version)
+
+        cache = self._load()
+        self._devices = {}
+        self.queried = []
+        changed = False
+        for device in system.devices:
+            serial_num = device.serial_num
+            product_type = device.product_type
+            name = device.name
+            key = _cache_key(serial_num, name)
+            entry = cache.get(key)
+            if entry is None or entry.get('driver_version') != self.driver_version \
+               or entry.get('product_type') != product_type:
+                entry = {prop: _read_property(device, prop) for prop in _CACHED_PROPERTIES}
+                entry.update(name=name, product_type=product_type, driver_version=self.driver_version)
+                cache[key] = entry
+                self.queried.append(name)
+                changed = True
+            fields = {prop: _renamed(prop, entry.get(prop), entry.get('name'), name) for prop in _CACHED_PROPERTIES}
+            self._devices[name] = DeviceCapabilities(name=name, serial_num=serial_num,
+                                                       product_type=product_type,
+                                                       driver_version=self.driver_version, **fields)
+        if changed:
+            self._save(cache)
+        return self
+
+
+    def _load(self):
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file) as fid:
+                contents = json.load(fid)
+        except (OSError, ValueError):
+            return {}
+        if contents.get('format') != CACHE_FORMAT:
+            return {}
+        return contents.get('devices', {})
+
+
+    def _save(self, cache):
+        # The cache only saves time, so failing to write it is not an error
+        if not self.cache_file:
+            return
+        temp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(temp_file, 'w') as fid:
+                json.dump({'format': CACHE_FORMAT, 'devices': cache}, fid, indent=1)
+            os.replace(temp_file, self.cache_file)  # Atomic, so other processes never see half a file
+        except OSError:
+            pass
+
+
+    @property
+    def devices(self):
+        '''
+        Dict of device name: DeviceCapabilities, enumerating the devices on first use
+        '''
+        if self._devices is None:
+            self.refresh()
+        return self._devices
+
+
+    @property
+    def names(self):
+        return list(self.devices)
+
+
+    def __getitem__(self, dev_name):
+        try:
+            return self.devices[dev_name]
+        except KeyError:
+            raise KeyError('No device called %s. Connected devices: %s' %
+                           (dev_name, ', '.join(self.names) or 'none')) from None
+
+    def __contains__(self, dev_name):
+        return dev_name in self.devices
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+
+    def find(self, **criteria):
+        '''
+        Return the capabilities of the devices whose properties equal all the keyword arguments,
+        e.g. find(bus_type='PCIE') or find(ai_simultaneous_sampling_supported=True)
+        '''
+        return [caps for caps in self if all(getattr(caps, key) == value for key, value in criteria.items())]
+
+
+    def default_device(self, subsystem='ai'):
+        '''
+        Return the name of the first device with channels in subsystem ('ai', 'ao' or 'do')
+        '''
+        prop = {'ai': 'ai_physical_chans', 'ao': 'ao_physical_chans', 'do': 'do_lines'}[subsystem]
+        for caps in self:
+            if getattr(caps, prop):
+                return caps.name
+        raise LookupError('No connected device has %s channels' % subsystem.upper())
+
+
+    def max_ai_rate(self, dev_name, num_channels=1):
+        '''
+        Maximum sample rate per channel for an AI task with num_channels channels. Multiplexed
+        devices share the aggregate rate between the channels.
+        '''
+        caps = self[dev_name]
+        if num_channels <= 1:
+            return caps.ai_max_single_chan_rate
+        if caps.ai_simultaneous_sampling_supported:
+            return caps.ai_max_multi_chan_rate
+        return caps.ai_max_multi_chan_rate / num_channels
+
+
+    def check_ai_rate(self, dev_name, sample_rate, num_channels=1):
+        '''
+        Raise a ValueError if dev_name can not acquire num_channels AI channels at sample_rate
+        '''
+        max_rate = self.max_ai_rate(dev_name, num_channels)
+        if max_rate is not None and sample_rate > max_rate:
+            raise ValueError('%s (%s) can acquire %d AI channel(s) at up to %g samples/s per channel. %g requested.' %
+                             (dev_name, self[dev_name].product_type, num_channels, max_rate, sample_rate))
+        min_rate = self[dev_name].ai_min_rate
+        if min_rate is not None and sample_rate < min_rate:
+            raise ValueError('%s has a minimum AI sample rate of %g samples/s. %g requested.' %
+                             (dev_name, min_rate, sample_rate))
+
+
+    def check_ao_rate(self, dev_name, sample_rate):
+        '''
+        Raise a ValueError if dev_name can not generate AO at sample_rate
+        '''
+        caps = self[dev_name]
+        if not caps.ao_physical_chans:
+            raise ValueError('%s (%s) has no analog outputs' % (dev_name, caps.product_type))
+        if caps.ao_max_rate is not None and sample_rate > caps.ao_max_rate:
+            raise ValueError('%s (%s) can generate AO at up to %g samples/s. %g requested.' %
+                             (dev_name, caps.product_type, caps.ao_max_rate, sample_rate))
+
+
+    def check_voltage_range(self, dev_name, min_val, max_val, subsystem='ai'):
+        '''
+        Raise a ValueError if [min_val, max_val] does not fit within one of the device's ranges
+        '''
+        rngs = getattr(self[dev_name], '%s_voltage_rngs' % subsystem) or []
+        pairs = list(zip(rngs[::2], rngs[1::2]))
+        if pairs and not any(low <= min_val and max_val <= high for low, high in pairs):
+            raise ValueError('%s %s ranges are %s. %g to %g V is outside all of them.' %
+                             (dev_name, subsystem.upper(), ', '.join('%g to %g V' % p for p in pairs), min_val, max_val))
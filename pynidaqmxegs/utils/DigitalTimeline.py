@@ -0,0 +1,219 @@
+'''
+ Timelines of digital line transitions, compiled to port samples
+
+ pynidaqmxegs.utils.DigitalTimeline
+
+ Purpose
+ A TTL sequence (shutter open, camera trigger, stimulus gate) is most naturally written
+ as a list of times at which lines go high or low. A hardware-timed DO task instead
+ wants one port-format sample per tick of its sample clock: a uint32 whose bit N is the
+ state of line N. This class holds the transitions and compiles them into those samples,
+ so the timing of every edge is set by the sample clock to within one period rather than
+ by time.sleep and the operating system.
+
+ Transitions are rounded to the nearest sample. Two transitions on the same line that
+ fall on the same sample would lose a pulse, so compiling raises a ValueError instead.
+ Compilation is vectorised: the port value after each transition is worked out once
+ (one pass per line used) and the samples between transitions are filled with
+ np.repeat, so the cost is proportional to the number of samples plus transitions.
+
+ render() produces any stretch of the sample stream without compiling the rest, so a
+ sequence far longer than the DO buffer can be streamed a chunk at a time.
+
+
+ Example session:
+ tl = DigitalTimeline()
+ tl.clock(line=0, frequency=1E3, start=0, stop=0.01)             # 1 kHz, 50% duty
+ tl.pulse(line=1, start=250E-6, width=10E-6, period=1E-3, count=10)
+ tl.set(0.002, line=2, value=True)
+ tl.set(0.007, line=2, value=False)
+ samples = tl.compile(1E6)            # uint32, one sample per microsecond
+ chunk = tl.render(1E6, 5000, 1000)   # samples 5000 to 5999
+'''
+
+import math
+
+import numpy as np
+
+
+class DigitalTimeline():
+
+    def __init__(self, initial=0):
+        '''
+        initial - port-format value of all lines before the first transition
+        '''
+        self.initial = int(initial)
+        self._times = []
+        self._lines = []
+        self._values = []
+        self._compiled = {}   # sample_rate: (sample indices, port value from each index on)
+
+
+    # Building the timeline
+    def set(self, time, line, value=True):
+        '''
+        Set "line" to "value" (True is high) at "time" seconds from the start
+        '''
+        self._add(np.atleast_1d(time), line, np.atleast_1d(value))
+        return self
+
+    def pulse(self, line, start, width, period=None, count=1, active_high=True):
+        '''
+        Add "count" pulses of "width" seconds on "line", the first at "start" and the rest
+        every "period" seconds. The line idles in the opposite state.
+        '''
+        if count > 1 and period is None:
+            raise ValueError('period is needed for more than one pulse')
+        if count > 1 and width >= period:
+            raise ValueError('The pulse width (%g s) must be shorter than the period (%g s)' % (width, period))
+        edges = start + np.arange(count) * (period or 0)
+        times = np.stack((edges, edges + width), axis=1).ravel()
+        values = np.tile([active_high, not active_high], count)
+        self._add(times, line, values)
+        return self
+
+    def clock(self, line, frequency, start=0.0, stop=None, cycles=None, duty=0.5):
+        '''
+        Add a square wave of "frequency" Hz on "line" from "start" to "stop" seconds, or for
+        "cycles" cycles. duty is the fraction of each cycle spent high.
+        '''
+        if (stop is None) == (cycles is None):
+            raise ValueError('Give one of stop or cycles')
+        period = 1 / frequency
+        if cycles is None:
+            cycles = int(math.floor((stop - start) / period + 1E-9))
+        return self.pulse(line, start, duty * period, period=period, count=cycles)
+
+    def _add(self, times, line, values):
+        if not 0 <= line < 32:
+            raise ValueError('line must be from 0 to 31, not %r' % line)
+        times = np.asarray(times, dtype=np.float64)
+        if np.any(times < 0):
+            raise ValueError('Transitions can not be before time 0')
+        self._times.append(times)
+        self._lines.append(np.full(times.shape, line, dtype=np.int64))
+        self._values.append(np.broadcast_to(np.asarray(values, dtype=bool), times.shape))
+        self._compiled.clear()
+
+
+    # Properties of the timeline
+    def __len__(self):
+        return sum(len(t) for t in self._times)
+
+    @property
+    def duration(self):
+        '''
+        Time of the last transition in seconds
+        '''
+        return max((t.max() for t in self._times if len(t)), default=0.0)
+
+    @property
+    def lines(self):
+        '''
+        Sorted list of the lines that change
+        '''
+        return sorted(set(int(line[0]) for line in self._lines if len(line)))
+
+    @property
+    def final(self):
+        '''
+        Port-format value of the lines after the last transition
+        '''
+        if len(self) == 0:
+            return self.initial
+        return int(self._port_values_by_time()[-1])
+
+    def num_samples(self, sample_rate, duration=None):
+        '''
+        Number of samples compile() returns: enough to include the last transition and
+        at least "duration" seconds
+        '''
+        last = int(np.rint(self.duration * sample_rate)) + 1 if len(self) else 1
+        if duration is not None:
+            last = max(last, int(math.ceil(duration * sample_rate - 1E-9)))
+        return last
+
+
+    # Compiling
+    def compile(self, sample_rate, duration=None):
+        '''
+        Return the timeline as a uint32 array of port-format samples at sample_rate,
+        num_samples(sample_rate, duration) long. Lines hold their final state to the end.
+        '''
+        return self.render(sample_rate, 0, self.num_samples(sample_rate, duration))
+
+    def render(self, sample_rate, start, num_samples, out=None):
+        '''
+        Return samples start to start+num_samples-1 of the compiled timeline as uint32.
+        Samples after the last transition hold the final state. Writes into "out" if given.
+        '''
+        indices, values = self._transitions(sample_rate)
+        stop = start + num_samples
+        first = np.searchsorted(indices, start, side='right')   # Transitions up to and including start
+        last = np.searchsorted(indices, stop, side='left')      # Transitions before stop
+        value_at_start = values[first - 1] if first > 0 else self.initial
+        bounds = np.concatenate(([start], indices[first:last], [stop]))
+        segment_values = np.concatenate(([value_at_start], values[first:last])).astype(np.uint32)
+        samples = np.repeat(segment_values, np.diff(bounds))
+        if out is None:
+            return samples
+        out[:num_samples] = samples
+        return out
+
+    def _transitions(self, sample_rate):
+        '''
+        Return (indices, values): the sorted sample indices at which the port changes and
+        the port value from each of them on. Cached for each sample rate.
+        '''
+        compiled = self._compiled.get(sample_rate)
+        if compiled is not None:
+            return compiled
+        if len(self) == 0:
+            compiled = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32))
+            self._compiled[sample_rate] = compiled
+            return compiled
+
+        times = np.concatenate(self._times)
+        lines = np.concatenate(self._lines)
+        values = np.concatenate(self._values)
+        indices = np.rint(times * sample_rate).astype(np.int64)
+
+        # Two transitions of one line on one sample: the shorter state would vanish
+        by_line = np.lexsort((indices, lines))
+        clash = (np.diff(lines[by_line]) == 0) & (np.diff(indices[by_line]) == 0)
+        clash &= np.diff(values[by_line].astype(np.int8)) != 0
+        if clash.any():
+            ii = by_line[np.flatnonzero(clash)[0]]
+            raise ValueError('A transition of line %d at %g s is less than one sample (%g s) from the next one. '
+                             'Increase the sample rate or lengthen the pulse.' % (lines[ii], times[ii], 1 / sample_rate))
+
+        # Time order, keeping the order they were added for transitions on the same sample
+        order = np.argsort(indices, kind='stable')
+        indices, lines, values = indices[order], lines[order], values[order]
+        port = self._port_values(lines, values)
+
+        # Only the value after the last transition on each sample matters
+        keep = np.ones(len(indices), dtype=bool)
+        keep[:-1] = indices[1:] != indices[:-1]
+        compiled = (indices[keep], port[keep])
+        self._compiled[sample_rate] = compiled
+        return compiled
+
+    def _port_values(self, lines, values):
+        '''
+        Port value after each of a time-ordered list of transitions
+        '''
+        port = np.full(len(lines), self.initial, dtype=np.int64)
+        positions = np.arange(len(lines))
+        for line in np.unique(lines):
+            # The most recent transition of this line at or before each transition
+            latest = np.maximum.accumulate(np.where(lines == line, positions, -1))
+            bit = np.where(latest >= 0, values[np.maximum(latest, 0)], (self.initial >> line) & 1).astype(np.int64)
+            port &= ~(1 << int(line))
+            port |= bit << int(line)
+        return port.astype(np.uint32)
+
+    def _port_values_by_time(self):
+        times = np.concatenate(self._times)
+        order = np.argsort(times, kind='stable')
+        return self._port_values(np.concatenate(self._lines)[order], np.concatenate(self._values)[order])
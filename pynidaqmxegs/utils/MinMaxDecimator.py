@@ -0,0 +1,108 @@
+'''
+ Min/max (envelope) decimation of data before plotting
+
+ pynidaqmxegs.utils.MinMaxDecimator
+
+ Purpose
+ A plot can not show more points than it has horizontal pixels, yet pushing every
+ raw sample to pyqtgraph's curve.setData costs time in proportion to the number of
+ samples. At high sample rates and long display windows this saturates the Qt thread.
+
+ This class reduces a chunk of data to the minimum and maximum of each of a fixed
+ number of bins. With about one bin per pixel the plot looks the same as the raw
+ data: narrow spikes are kept, unlike with plain sub-sampling. The two points of each
+ bin are returned in the order in which they occurred, with their original sample
+ index as the x value. The number of points plotted, and so the rendering cost, is
+ then fixed regardless of the sample rate.
+
+ The reduction is vectorised: the data are reshaped to (bins, samples per bin) and
+ reduced with argmin/argmax along the last axis.
+
+
+ Example session:
+ decimator = MinMaxDecimator.for_plot(plot_item)   # one bin per pixel of the plot
+ x, y = decimator(data)                             # data may be 1D or (channels, samples)
+ curve.setData(x, y)
+ decimator.fit_to_plot(plot_item)                   # after the window was resized
+'''
+
+import numpy as np
+
+
+class MinMaxDecimator():
+
+    def __init__(self, num_bins=1000):
+        '''
+        num_bins - the number of bins. Each bin produces two points, so about the width of
+                   the plot in pixels is a good choice.
+        '''
+        self.num_bins = int(num_bins)
+
+
+    @classmethod
+    def for_plot(cls, plot_item, default_width=1000):
+        '''
+        Make a decimator with one bin per horizontal pixel of a pyqtgraph PlotItem. If the
+        plot has not been drawn yet default_width is used.
+        '''
+        decimator = cls(default_width)
+        decimator.fit_to_plot(plot_item)
+        return decimator
+
+
+    def fit_to_plot(self, plot_item):
+        '''
+        Set one bin per horizontal pixel of a pyqtgraph PlotItem. Call again whenever the
+        plot may have been resized. Does nothing if the plot has not been drawn yet.
+        '''
+        width = int(plot_item.getViewBox().width())
+        if width > 0:
+            self.num_bins = width
+
+
+    def __call__(self, data):
+        '''
+        Decimate "data" (1D, or 2D with one row per channel). Returns (x, y) with the same number
+        of dimensions as the data: y holds the decimated values and x the index of each of them
+        in the original data. Data that are already short enough are returned unchanged.
+        '''
+        data = np.asarray(data)
+        n = data.shape[-1]
+        if n <= 2 * self.num_bins:
+            x = np.broadcast_to(np.arange(n, dtype=np.float64), data.shape)
+            return x, data
+
+        # All bins but the last have the same size. The last holds whatever is left over.
+        bin_size = -(-n // self.num_bins)  # ceil
+        num_full = n // bin_size
+        parts = [self._reduce(data[..., :num_full * bin_size], bin_size, 0)]
+        if num_full * bin_size < n:
+            parts.append(self._reduce(data[..., num_full * bin_size:], n - num_full * bin_size, num_full * bin_size))
+
+        x = np.concatenate([p[0] for p in parts], axis=-1)
+        y = np.concatenate([p[1] for p in parts], axis=-1)
+        return x, y
+
+
+    @staticmethod
+    def _reduce(data, bin_size, offset):
+        '''
+        Reduce data whose length is a multiple of bin_size to two points per bin
+        '''
+        binned = data.reshape(data.shape[:-1] + (-1, bin_size))
+        i_min = binned.argmin(axis=-1)
+        i_max = binned.argmax(axis=-1)
+        v_min = np.take_along_axis(binned, i_min[..., np.newaxis], axis=-1)[..., 0]
+        v_max = np.take_along_axis(binned, i_max[..., np.newaxis], axis=-1)[..., 0]
+
+        # Keep each bin's pair of points in time order so the trace is drawn correctly
+        min_first = i_min <= i_max
+        starts = offset + bin_size * np.arange(binned.shape[-2])
+
+        y = np.empty(data.shape[:-1] + (2 * binned.shape[-2],), dtype=data.dtype)
+        x = np.empty(y.shape, dtype=np.float64)
+        y[..., 0::2] = np.where(min_first, v_min, v_max)
+        y[..., 1::2] = np.where(min_first, v_max, v_min)
+        x[..., 0::2] = starts + np.minimum(i_min, i_max)
+        x[..., 1::2] = starts + np.maximum(i_min, i_max)
+        return x, y
@@ -0,0 +1,176 @@
+'''
+ Analysis of acquired chunks in a pool of worker processes
+
+ pynidaqmxegs.utils.ProcessPoolStage
+
+ Purpose
+ Analysis done in the DAQmx callback, or in any other thread of the acquiring process,
+ competes with the acquisition for the GIL and can use only one core. This class runs
+ a user's analysis function on each chunk in a pool of worker processes instead.
+
+ The chunks are not pickled. A block of shared memory (multiprocessing.shared_memory)
+ is divided into slots of one chunk each. submit() copies a chunk into a free slot and
+ sends the worker only the slot number. The worker runs the function on a NumPy view of
+ the slot and sends back the result, which is all that is pickled. The slot is then
+ free again. If every slot is in use, the chunk is dropped and counted rather than
+ making the caller wait.
+
+ Results are returned in the order the chunks were submitted, whichever worker finishes
+ first. The analysis function must be defined at the top level of a module so the
+ workers can import it. It must not keep a reference to its argument, which is only
+ valid during the call.
+
+
+ Example session:
+ def band_power(chunk):                       # At the top level of a module
+     return np.abs(np.fft.rfft(chunk, axis=1))[:, 10:50].sum(axis=1)
+
+ stage = ProcessPoolStage(band_power, num_channels=4, chunk_size=1000)
+ stage.submit(chunk)                           # e.g. from a DAQmx callback
+ for result in stage.completed():              # in submission order, without blocking
+     print(result)
+ stage.close()
+'''
+
+import collections
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Per-worker state, set up by _attach
+_worker_shm = None
+_worker_slots = None
+_worker_func = None
+
+
+def _attach(shm_name, shape, dtype, func):
+    '''
+    Pool initializer: map the shared memory block into the worker
+    '''
+    global _worker_shm, _worker_slots, _worker_func
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_slots = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    _worker_func = func
+
+
+def _analyse(slot, num_samples):
+    return _worker_func(_worker_slots[slot, :, :num_samples])
+
+
+class ProcessPoolStage():
+
+    def __init__(self, func, num_channels, chunk_size, num_slots=None, num_workers=None, dtype=np.float64, context=None):
+        '''
+        func - function called with each chunk, a (channels, samples) array. Its return value is
+               the result. Must be importable by the workers (defined at module level).
+        num_channels - rows in each chunk
+        chunk_size - maximum samples per channel in each chunk
+        num_slots - chunks that can be queued or in progress at once. Default: 4 per worker.
+        num_workers - worker processes. Default: the number of CPUs.
+        dtype - data type of the slots
+        context - multiprocessing start method ('fork', 'spawn', ...). Default: the platform's.
+        '''
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.num_slots = num_slots or 4 * self.num_workers
+        self.shape = (self.num_slots, int(num_channels), int(chunk_size))
+        dtype = np.dtype(dtype)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * dtype.itemsize)
+        self.slots = np.ndarray(self.shape, dtype=dtype, buffer=self._shm.buf)
+        self._free = queue.SimpleQueue()
+        for ii in range(self.num_slots):
+            self._free.put(ii)
+        self._pending = collections.deque()  # AsyncResults in submission order
+
+        ctx = multiprocessing.get_context(context)
+        self._pool = ctx.Pool(self.num_workers, initializer=_attach,
+                              initargs=(self._shm.name, self.shape, dtype.str, func))
+        self.submitted = 0
+        self.dropped = 0
+
+
+    def submit(self, chunk):
+        '''
+        Copy a (channels, samples) chunk, or a 1D chunk for one channel, into a free slot and queue
+        it for analysis. Returns True if queued and False if dropped because no slot was free.
+        Never blocks.
+        '''
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)
+        n = chunk.shape[1]
+        if n > self.shape[2]:
+            raise ValueError('Chunk of %d samples is longer than the slots (%d samples)' % (n, self.shape[2]))
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        self.slots[slot, :, :n] = chunk
+        release = lambda _: self._free.put(slot)  # Runs in the pool's result thread when the worker is done
+        self._pending.append(self._pool.apply_async(_analyse, (slot, n), callback=release, error_callback=release))
+        self.submitted += 1
+        return True
+
+    __call__ = submit
+
+
+    @property
+    def pending(self):
+        '''
+        Number of chunks submitted whose results have not yet been collected
+        '''
+        return len(self._pending)
+
+
+    def get(self, timeout=None):
+        '''
+        Return the result for the oldest chunk not yet collected, waiting up to timeout seconds
+        for it. Raises IndexError if nothing is pending, multiprocessing.TimeoutError on timeout,
+        or the exception raised by the analysis function. A chunk whose analysis raised is
+        collected like any other, so its exception is raised once and the next get moves on.
+        '''
+        if not self._pending:
+            raise IndexError('No results pending')
+        self._pending[0].wait(timeout)
+        if not self._pending[0].ready():
+            raise multiprocessing.TimeoutError
+        return self._pending.popleft().get()
+
+
+    def completed(self):
+        '''
+        Yield, in submission order, the results that are ready, stopping at the first that is not
+        '''
+        while self._pending and self._pending[0].ready():
+            yield self.get()
+
+
+    def close(self, wait=True):
+        '''
+        Shut down the workers and free the shared memory. If wait is True, chunks already submitted
+        are analysed first (their results can still be collected with get).
+        '''
+        if self._pool is None:
+            return
+        if wait:
+            self._pool.close()
+            for result in self._pending:
+                result.wait()
+        else:
+            self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        self.slots = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
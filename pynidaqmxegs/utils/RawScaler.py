@@ -0,0 +1,138 @@
+'''
+ Conversion of raw (unscaled) AI samples to volts
+
+ pynidaqmxegs.utils.RawScaler
+
+ Purpose
+ The ADC of a 16-bit device produces int16 codes. The driver normally converts each
+ code to a float64 voltage before the program sees it, which makes every sample four
+ times larger: four times the memory bandwidth in the read, the ring buffer and the
+ recording. nidaqmx.stream_readers.AnalogUnscaledReader.read_int16 returns the codes
+ themselves. They can be kept, passed around and saved as int16 and only turned into
+ volts when something needs volts (a plot, an analysis, an export).
+
+ Each channel has its own calibration polynomial, read from the driver as the channel's
+ ai_dev_scaling_coeff property:
+   volts = c0 + c1*raw + c2*raw**2 + c3*raw**3
+ The coefficients depend on the channel's input range, so they must be read after the
+ channels have been added, and saved alongside the raw data (StreamRecorder does this).
+
+ to_volts() evaluates the polynomials for all channels at once with Horner's method.
+ It writes into a caller-supplied array if one is given, so converting each new chunk
+ allocates nothing, and it can produce float32 rather than float64 to halve the size of
+ the result again. Coefficients of higher order that are zero on every channel are
+ dropped, so a linear calibration costs one multiply and one add per sample.
+
+
+ Example session:
+ reader = AnalogUnscaledReader(task.in_stream)
+ raw = np.zeros((num_channels, 1000), dtype=np.int16)
+ reader.read_int16(raw, number_of_samples_per_channel=1000)
+
+ scaler = RawScaler.from_task(task)
+ volts = np.zeros(raw.shape, dtype=np.float32)
+ scaler.to_volts(raw, out=volts)
+
+ header, data = StreamRecorder.load('raw.bin')        # (samples x channels) int16
+ volts = RawScaler.from_header(header).to_volts(data[:10000], channel_axis=1)
+'''
+
+import numpy as np
+
+
+class RawScaler():
+
+    def __init__(self, coefficients):
+        '''
+        coefficients - one sequence of polynomial coefficients per channel, lowest order
+                       first (c0, c1, c2, ...), as returned by ai_dev_scaling_coeff
+        '''
+        order = max(2, max(len(coeff) for coeff in coefficients))
+        self.coefficients = np.zeros((len(coefficients), order))
+        for ii, coeff in enumerate(coefficients):
+            self.coefficients[ii, :len(coeff)] = coeff
+
+        # Only evaluate up to the highest order that is non-zero on some channel
+        nonzero = np.flatnonzero(np.any(self.coefficients != 0, axis=0))
+        self._order = max(1, nonzero[-1] if nonzero.size else 1)
+        self._by_dtype = {}
+
+
+    @classmethod
+    def from_task(cls, task):
+        '''
+        Make a scaler for the AI channels of task "task", in the order they are read
+        '''
+        return cls([list(chan.ai_dev_scaling_coeff) for chan in task.ai_channels])
+
+
+    @classmethod
+    def from_header(cls, header):
+        '''
+        Make a scaler from the header of a raw StreamRecorder recording
+        '''
+        if header.get('scaling_coeff') is None:
+            raise ValueError('The recording has no scaling coefficients. Was it recorded raw?')
+        return cls(header['scaling_coeff'])
+
+
+    @property
+    def num_channels(self):
+        return self.coefficients.shape[0]
+
+    def __len__(self):
+        return self.num_channels
+
+    def tolist(self):
+        '''
+        Return the coefficients as a list of lists, e.g. for a JSON header
+        '''
+        return self.coefficients.tolist()
+
+
+    def to_volts(self, raw, out=None, dtype=np.float64, channel_axis=0):
+        '''
+        Return raw codes converted to volts.
+
+        raw - integer array of shape (channels, samples), or (samples, channels) with
+              channel_axis=1. A 1D array is allowed for a single channel.
+        out - optional floating point array of the same shape to write the volts into.
+              Its dtype is used in place of "dtype".
+        dtype - dtype of the result if out is None, e.g. np.float32
+        channel_axis - the axis of raw that indexes the channels: 0 for chunks from a
+                       reader and 1 for (samples x channels) recordings
+        '''
+        raw = np.asarray(raw)
+        if out is None:
+            out = np.empty(raw.shape, dtype=dtype)
+        elif out.shape != raw.shape:
+            raise ValueError('out has shape %s but raw has shape %s' % (out.shape, raw.shape))
+
+        coeff = self._coefficients_for(out.dtype)
+        if raw.ndim == 1:
+            if self.num_channels != 1:
+                raise ValueError('A 1D array of raw samples needs a single-channel scaler, not %d channels'
+                                 % self.num_channels)
+            coeff = coeff[:, 0]  # One scalar per order
+        elif raw.shape[channel_axis] != self.num_channels:
+            raise ValueError('raw has %d channels on axis %d but the scaler has %d'
+                             % (raw.shape[channel_axis], channel_axis, self.num_channels))
+        elif channel_axis == 0:
+            coeff = coeff[:, :, np.newaxis]  # Each order is a (channels, 1) column
+
+        # Horner's method, in place: ((c3*x + c2)*x + c1)*x + c0
+        np.multiply(raw, coeff[self._order], out=out)
+        out += coeff[self._order - 1]
+        for order in range(self._order - 2, -1, -1):
+            out *= raw
+            out += coeff[order]
+        return out
+
+
+    def _coefficients_for(self, dtype):
+        # (order, channels) array of the coefficients in the output dtype, made once per dtype
+        coeff = self._by_dtype.get(dtype)
+        if coeff is None:
+            coeff = np.ascontiguousarray(self.coefficients[:, :self._order + 1].T, dtype=dtype)
+            self._by_dtype[dtype] = coeff
+        return coeff
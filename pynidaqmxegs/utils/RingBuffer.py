@@ -0,0 +1,228 @@
+'''
+ Pre-allocated ring buffer for passing data from a DAQmx callback to other threads
+
+ pynidaqmxegs.utils.RingBuffer
+
+ Purpose
+ Anything slow done inside a DAQmx every-N-samples callback (plotting, printing,
+ analysis) delays the next read and can cause the driver's buffer to overflow.
+ This class lets the callback do nothing but copy each chunk into a pre-allocated
+ NumPy array. Any number of consumers then read from the buffer at their own pace.
+
+ There is a single producer and one or more consumers. No locks are used: the
+ producer never waits for a consumer. If a consumer falls more than one buffer
+ length behind, the oldest data are overwritten and the samples lost are counted
+ on that consumer's reader. Each reader also checks, after copying, that the
+ producer did not overwrite the data while the copy was in progress.
+
+
+ Example session:
+ buf = RingBuffer(num_channels=2, capacity=10000)
+ reader = buf.reader()
+
+ # In the DAQmx callback
+ reader_ai.read_many_sample(chunk, number_of_samples_per_channel=100)
+ buf.write(chunk)
+
+ # In a consumer thread
+ data = reader.read()           # copy of all unread samples, shape (channels, samples)
+ views = reader.read_views()    # zero-copy: one or two views onto the buffer
+ print(reader.fill_level, reader.overwritten)
+'''
+
+import numpy as np
+
+
+class RingBuffer():
+
+    def __init__(self, num_channels, capacity, dtype=np.float64):
+        '''
+        num_channels - number of rows (channels) in each chunk
+        capacity - number of samples per channel the buffer holds
+        dtype - data type of the buffer
+        '''
+        self.num_channels = int(num_channels)
+        self.capacity = int(capacity)
+        self.data = np.zeros((self.num_channels, self.capacity), dtype=dtype)
+
+        # Both counters are the total number of samples per channel ever written, so they only
+        # increase. _reserved is advanced before a write starts and _head after it completes.
+        # Consumers use _reserved to detect data overwritten while they were copying it.
+        self._head = 0
+        self._reserved = 0
+
+
+    def __len__(self):
+        return self.fill_level
+
+    @property
+    def total_written(self):
+        '''
+        Total number of samples per channel written since the buffer was created or reset
+        '''
+        return self._head
+
+    @property
+    def fill_level(self):
+        '''
+        Number of samples per channel currently held
+        '''
+        return min(self._head, self.capacity)
+
+
+    def write(self, chunk):
+        '''
+        Copy a chunk of shape (num_channels, samples) into the buffer. A 1D chunk is accepted
+        for a single-channel buffer. This is the only thing the producer needs to do.
+        '''
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)
+        n = chunk.shape[1]
+        if n > self.capacity:
+            # Only the newest data fit
+            self._head += n - self.capacity
+            self._reserved = self._head
+            chunk = chunk[:, n - self.capacity:]
+            n = self.capacity
+
+        head = self._head
+        self._reserved = head + n
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[:, start:start + first] = chunk[:, :first]
+        if first < n:
+            self.data[:, :n - first] = chunk[:, first:]
+        self._head = head + n
+
+
+    def reset(self):
+        self._head = 0
+        self._reserved = 0
+
+
+    def reader(self):
+        '''
+        Return a new reader positioned at the current end of the buffer. Create one per consumer.
+        '''
+        return RingBufferReader(self)
+
+
+    def _views(self, start, end):
+        '''
+        Views onto the samples with absolute indices start to end-1: one view, or two if the
+        range wraps around the end of the buffer.
+        '''
+        a = start % self.capacity
+        n = end - start
+        if a + n <= self.capacity:
+            return (self.data[:, a:a + n],)
+        return (self.data[:, a:], self.data[:, :a + n - self.capacity])
+
+    def _intact(self, start):
+        '''
+        True if the samples from absolute index "start" onwards have not been overwritten
+        '''
+        return self._reserved - self.capacity <= start
+
+
+    def latest(self, num_samples, out=None):
+        '''
+        Copy the newest num_samples samples per channel into "out" (allocated if not supplied)
+        without consuming them. Useful for plotting the most recent data. If fewer samples
+        have been written, the start of "out" is left untouched.
+        '''
+        if out is None:
+            out = np.zeros((self.num_channels, num_samples), dtype=self.data.dtype)
+        num_samples = min(num_samples, self.capacity)
+        while True:
+            end = self._head
+            start = max(0, end - num_samples)
+            offset = num_samples - (end - start)
+            for view in self._views(start, end):
+                out[:, offset:offset + view.shape[1]] = view
+                offset += view.shape[1]
+            if self._intact(start):
+                return out
+
+
+class RingBufferReader():
+    '''
+    One consumer's position in a RingBuffer
+    '''
+
+    def __init__(self, ring):
+        self.ring = ring
+        self._tail = ring.total_written
+        self.overwritten = 0   # Samples per channel lost because this consumer fell behind
+        self.overruns = 0      # Number of times that happened
+
+
+    @property
+    def fill_level(self):
+        '''
+        Number of unread samples per channel available to this reader
+        '''
+        return min(self.ring.total_written - self._tail, self.ring.capacity)
+
+
+    def _catch_up(self, head):
+        oldest = self.ring._reserved - self.ring.capacity
+        if self._tail < oldest:
+            self.overwritten += oldest - self._tail
+            self.overruns += 1
+            self._tail = oldest
+        return head - self._tail
+
+
+    def read_views(self, max_samples=None):
+        '''
+        Return (views, start) where views is a tuple of one or two zero-copy views onto the
+        unread samples (two if they wrap around the end of the buffer) and start is the
+        absolute index of the first sample. The samples are marked as read.
+
+        The views remain valid until the producer wraps around onto them. Call still_valid(start)
+        after using them to check this.
+        '''
+        head = self.ring.total_written
+        n = self._catch_up(head)
+        if max_samples is not None:
+            n = min(n, max_samples)
+        start = self._tail
+        self._tail = start + n
+        if n == 0:
+            return (), start
+        return self.ring._views(start, start + n), start
+
+
+    def still_valid(self, start):
+        '''
+        True if data read from absolute index "start" have not since been overwritten
+        '''
+        return self.ring._intact(start)
+
+
+    def read(self, max_samples=None, out=None):
+        '''
+        Copy unread samples into "out" (allocated if not supplied) and return the filled part,
+        shape (channels, samples). If "out" is supplied at most out.shape[1] samples are read.
+        Data torn by a concurrent overwrite are discarded and counted as overwritten.
+        '''
+        allocate = out is None
+        if not allocate:
+            max_samples = out.shape[1] if max_samples is None else min(max_samples, out.shape[1])
+        while True:
+            tail, overwritten, overruns = self._tail, self.overwritten, self.overruns
+            views, start = self.read_views(max_samples)
+            n = sum(view.shape[1] for view in views)
+            if allocate:
+                out = np.empty((self.ring.num_channels, n), dtype=self.ring.data.dtype)
+            offset = 0
+            for view in views:
+                out[:, offset:offset + view.shape[1]] = view
+                offset += view.shape[1]
+            if self.still_valid(start):
+                return out[:, :n]
+            # The producer lapped us mid-copy: go round again from the oldest intact sample. The
+            # retry counts everything lost since "tail", so forget what this attempt counted.
+            self._tail, self.overwritten, self.overruns = tail, overwritten, overruns
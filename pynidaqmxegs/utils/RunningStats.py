@@ -0,0 +1,208 @@
+'''
+ Running statistics of a stream of chunks, per channel
+
+ pynidaqmxegs.utils.RunningStats
+
+ Purpose
+ Printing np.mean of each chunk says nothing about the acquisition as a whole, and
+ keeping every sample to work out statistics later costs memory without limit. This
+ class keeps, for each channel, the statistics of every sample seen so far: count,
+ mean, variance, minimum, maximum and RMS, and optionally exponentially weighted mean
+ and variance that follow slow changes and forget old data.
+
+ Each chunk is reduced with NumPy along the sample axis and merged into the totals
+ with the parallel form of Welford's algorithm (Chan et al.), so an update costs
+ O(chunk) with no loop over samples in Python and the variance does not suffer from
+ the cancellation of the sum-of-squares formula. The exponentially weighted moments are
+ a dot product of each chunk with a weight vector made once per chunk length, taken
+ about the previous weighted mean for the same reason. They are exactly what a
+ sample-by-sample update with the same alpha would give.
+
+ There is one writer: update() is called from a single thread, e.g. the DAQmx
+ callback. Other threads call snapshot() (or the properties) at any time without a
+ lock. Each update builds new result arrays and publishes them with a single attribute
+ assignment, so a reader always sees the statistics after some whole chunk, never a
+ mixture of two. The writer never waits for a reader.
+
+
+ Example session:
+ stats = RunningStats(num_channels=2, alpha=RunningStats.alpha_for(time_constant=1.0, sample_rate=1E4))
+
+ # In the DAQmx callback
+ reader.read_many_sample(chunk, number_of_samples_per_channel=1000)
+ stats.update(chunk)            # chunk is (channels, samples), or 1D for one channel
+
+ # In any other thread
+ s = stats.snapshot()
+ print(s.count, s.mean, s.std, s.minimum, s.maximum, s.rms, s.ew_mean, s.ew_std)
+'''
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+
+class Statistics(namedtuple('Statistics', 'count mean variance minimum maximum rms ew_mean ew_variance')):
+    '''
+    The statistics of each channel after some number of samples. Every field but count is
+    an array with one value per channel. variance is the sample variance (divided by
+    count - 1). The ew_ fields are None if no alpha was given.
+    '''
+    __slots__ = ()
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def ew_std(self):
+        return None if self.ew_variance is None else np.sqrt(self.ew_variance)
+
+
+class RunningStats():
+
+    def __init__(self, num_channels=1, alpha=None):
+        '''
+        num_channels - number of rows (channels) in each chunk
+        alpha - weight of each new sample in the exponentially weighted statistics, between
+                0 and 1. None for no exponentially weighted statistics. See alpha_for.
+        '''
+        if alpha is not None and not 0 < alpha <= 1:
+            raise ValueError('alpha must be greater than 0 and at most 1, not %r' % alpha)
+        self.num_channels = int(num_channels)
+        self.alpha = alpha
+        self._weights = {}   # chunk length: (weight of each sample, weight of the previous state)
+        self.reset()
+
+
+    @staticmethod
+    def alpha_for(time_constant, sample_rate):
+        '''
+        alpha giving exponentially weighted statistics with a time constant of "time_constant"
+        seconds at sample_rate: the weight of old data falls by e every time_constant
+        '''
+        return -math.expm1(-1 / (time_constant * sample_rate))
+
+
+    def reset(self):
+        '''
+        Forget all the data seen so far
+        '''
+        nan = np.full(self.num_channels, np.nan)
+        self._count = 0
+        self._mean = np.zeros(self.num_channels)
+        self._m2 = np.zeros(self.num_channels)      # Sum of squared deviations from the mean
+        self._mean_square = np.zeros(self.num_channels)
+        self._min = np.full(self.num_channels, np.inf)
+        self._max = np.full(self.num_channels, -np.inf)
+        self._ew_mean = None
+        self._ew_variance = None
+        self._snapshot = Statistics(0, nan, nan, nan, nan, nan,
+                                    None if self.alpha is None else nan,
+                                    None if self.alpha is None else nan)
+
+
+    def update(self, chunk):
+        '''
+        Add a chunk of shape (num_channels, samples) to the statistics. A 1D chunk is accepted
+        for a single channel. Only call this from one thread.
+        '''
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)
+        if chunk.shape[0] != self.num_channels:
+            raise ValueError('Chunk has %d channels but the statistics have %d' % (chunk.shape[0], self.num_channels))
+        n = chunk.shape[1]
+        if n == 0:
+            return self._snapshot
+
+        # Statistics of the chunk on its own
+        chunk_mean = chunk.mean(axis=1, dtype=np.float64)
+        deviation = chunk - chunk_mean[:, np.newaxis]
+        chunk_m2 = np.einsum('ij,ij->i', deviation, deviation)
+        chunk_mean_square = np.einsum('ij,ij->i', chunk, chunk, dtype=np.float64) / n
+
+        # Merged with the totals (Chan et al.). New arrays every time: readers may hold the old ones.
+        total = self._count + n
+        delta = chunk_mean - self._mean
+        self._mean = self._mean + delta * (n / total)
+        self._m2 = self._m2 + chunk_m2 + delta**2 * (self._count * n / total)
+        self._mean_square = self._mean_square + (chunk_mean_square - self._mean_square) * (n / total)
+        self._min = np.minimum(self._min, chunk.min(axis=1))
+        self._max = np.maximum(self._max, chunk.max(axis=1))
+        self._count = total
+
+        if self.alpha is not None:
+            self._update_ew(chunk)
+
+        variance = self._m2 / (total - 1) if total > 1 else np.full(self.num_channels, np.nan)
+        self._snapshot = Statistics(total, self._mean, variance, self._min, self._max,
+                                    np.sqrt(self._mean_square), self._ew_mean, self._ew_variance)
+        return self._snapshot
+
+
+    def _update_ew(self, chunk):
+        # x_k weighted by alpha*(1-alpha)**(n-1-k) and the previous state by (1-alpha)**n, with
+        # moments taken about the previous weighted mean so the previous first moment is zero
+        if self._ew_mean is None:
+            # Start as if the signal had always had the value of the first sample
+            self._ew_mean = chunk[:, 0].astype(np.float64)
+            self._ew_variance = np.zeros(self.num_channels)
+        weights, decay = self._ew_weights(chunk.shape[1])
+        deviation = chunk - self._ew_mean[:, np.newaxis]
+        first = deviation @ weights
+        second = (deviation * deviation) @ weights + decay * self._ew_variance
+        self._ew_mean = self._ew_mean + first
+        self._ew_variance = np.maximum(second - first**2, 0)
+
+    def _ew_weights(self, n):
+        weights = self._weights.get(n)
+        if weights is None:
+            keep = 1 - self.alpha
+            weights = (self.alpha * keep ** np.arange(n - 1, -1, -1, dtype=np.float64), keep ** n)
+            self._weights[n] = weights
+        return weights
+
+
+    # Queries. Safe from any thread.
+    def snapshot(self):
+        '''
+        Return the Statistics after the last complete update
+        '''
+        return self._snapshot
+
+    @property
+    def count(self):
+        return self._snapshot.count
+
+    @property
+    def mean(self):
+        return self._snapshot.mean
+
+    @property
+    def std(self):
+        return self._snapshot.std
+
+    @property
+    def minimum(self):
+        return self._snapshot.minimum
+
+    @property
+    def maximum(self):
+        return self._snapshot.maximum
+
+    @property
+    def rms(self):
+        return self._snapshot.rms
+
+    def summary(self):
+        '''
+        Return the statistics as a dict of lists, one value per channel, e.g. for JSON
+        '''
+        s = self._snapshot
+        result = dict(count=s.count)
+        for name in ('mean', 'std', 'minimum', 'maximum', 'rms', 'ew_mean', 'ew_std'):
+            value = getattr(s, name)
+            result[name] = None if value is None else value.tolist()
+        return result
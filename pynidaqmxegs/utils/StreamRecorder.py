@@ -0,0 +1,326 @@
+'''
+ Background recording of continuous AI data to disk
+
+ pynidaqmxegs.utils.StreamRecorder
+
+ Purpose
+ Saves the chunks produced by a continuous AI task to a binary file without slowing
+ down the acquisition. write() is called from the acquisition loop or DAQmx callback
+ and does nothing more than copy the chunk into one of a pool of pre-allocated blocks
+ and queue it. A dedicated writer thread takes blocks off the queue and writes them
+ to disk. write() never waits: if the writer falls so far behind that every block is
+ queued, the chunk is dropped and counted in dropped_chunks.
+
+ Two modes are available:
+  'file'   - chunks are appended to the file with plain unbuffered writes
+  'memmap' - the file is sized up front for max_samples samples and chunks are copied
+             into a memory map of it. The OS writes the pages back in the background.
+
+ File format
+ The file starts with the 8 bytes b'PYDAQREC', a little-endian uint32 giving the length
+ of a UTF-8 JSON header, then the header itself. The header is padded with spaces so
+ the data start on a 4096 byte boundary (header['data_offset']). The data follow as a
+ C-ordered (samples x channels) array of header['dtype']. The header holds the sample
+ rate, channel names, input ranges and start time. header['num_samples'] is updated
+ about once a second while recording and at the end, so a recording can be read while
+ it is still being written.
+
+ Raw recordings
+ from_task(task, path, raw=True) records the int16 codes read with
+ AnalogUnscaledReader.read_int16, a quarter of the size of float64 volts, and stores
+ each channel's calibration polynomial in header['scaling_coeff']. Convert to volts
+ after loading with pynidaqmxegs.utils.RawScaler.from_header(header).
+
+
+ Example session:
+ rec = StreamRecorder.from_task(task, 'data.bin')  # or StreamRecorder('data.bin', sample_rate, num_channels)
+ rec.start()
+ rec.write(chunk)             # (channels x samples), e.g. from a DAQmx callback
+ rec.close()
+ print(rec.stats())
+
+ header, data = StreamRecorder.load('data.bin')   # data is a (samples x channels) memmap
+
+ rec = StreamRecorder.from_task(task, 'raw.bin', raw=True)   # Chunks are int16 from read_int16
+'''
+
+import json
+import queue
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+MAGIC = b'PYDAQREC'
+ALIGNMENT = 4096
+
+
+class StreamRecorder():
+
+    def __init__(self, path, sample_rate, num_channels, channel_names=None, ranges=None,
+                 dtype=np.float64, mode='file', max_samples=None, num_blocks=64, metadata=None,
+                 scaling_coeff=None):
+        '''
+        path - file to write. It is overwritten if it exists.
+        sample_rate - samples per second per channel, for the header
+        num_channels - number of channels (rows) in each chunk
+        channel_names - optional list of channel names for the header
+        ranges - optional list of (min, max) voltage ranges, one per channel, for the header
+        dtype - data type stored on disk. Chunks are converted to this type by the writer thread.
+        mode - 'file' or 'memmap'. 'memmap' requires max_samples.
+        max_samples - maximum samples per channel to record. Further data are dropped.
+        num_blocks - size of the pool of blocks queued for the writer thread
+        metadata - optional dict of anything else to store in the header
+        scaling_coeff - for raw recordings, the per-channel polynomial coefficients that
+                        convert the stored codes to volts (see RawScaler)
+        '''
+        if mode not in ('file', 'memmap'):
+            raise ValueError("mode must be 'file' or 'memmap'")
+        if mode == 'memmap' and max_samples is None:
+            raise ValueError("max_samples must be given in 'memmap' mode")
+
+        self.path = path
+        self.mode = mode
+        self.num_channels = int(num_channels)
+        self.dtype = np.dtype(dtype)
+        self.max_samples = max_samples
+        self.num_blocks = num_blocks
+        self.header = dict(format='pynidaqmxegs.StreamRecorder',
+                           version=1,
+                           sample_rate=sample_rate,
+                           num_channels=self.num_channels,
+                           channel_names=list(channel_names) if channel_names is not None else
+                                         ['ch%d' % ii for ii in range(self.num_channels)],
+                           ranges=[list(r) for r in ranges] if ranges is not None else None,
+                           dtype=self.dtype.str,
+                           layout='samples x channels',
+                           scaling_coeff=[list(c) for c in scaling_coeff] if scaling_coeff is not None else None,
+                           start_time=None,
+                           num_samples=0,
+                           data_offset=None)
+        if metadata:
+            self.header['metadata'] = metadata
+
+        self._blocks = None       # Allocated on the first write, when the chunk size is known
+        self._free = queue.SimpleQueue()
+        self._filled = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._memmap = None
+
+        # Statistics
+        self.samples_queued = 0
+        self.samples_written = 0
+        self.bytes_written = 0
+        self.dropped_chunks = 0
+        self.max_queue_depth = 0
+        self._time_writing = 0.0
+        self._t_start = None
+        self._t_stop = None
+
+
+    @classmethod
+    def from_task(cls, task, path, raw=False, **kwargs):
+        '''
+        Make a recorder whose header describes the AI task "task": its sample rate, channel
+        names and input ranges. With raw=True the chunks written are the int16 codes from
+        AnalogUnscaledReader.read_int16 and are stored as int16, with the channels'
+        scaling coefficients in the header.
+        '''
+        channels = list(task.ai_channels)
+        if raw:
+            kwargs.setdefault('dtype', np.int16)
+            kwargs.setdefault('scaling_coeff', [list(chan.ai_dev_scaling_coeff) for chan in channels])
+        return cls(path, task.timing.samp_clk_rate, len(channels),
+                   channel_names=[chan.name for chan in channels],
+                   ranges=[(chan.ai_min, chan.ai_max) for chan in channels],
+                   **kwargs)
+
+
+    # Starting and stopping
+    def start(self):
+        '''
+        Open the file, write the header and start the writer thread
+        '''
+        now = datetime.now(timezone.utc)
+        self.header['start_time'] = now.isoformat()
+        self.header['start_time_unix'] = now.timestamp()
+        self._file = open(self.path, 'w+b', buffering=0)
+        self._write_header()
+        if self.mode == 'memmap':
+            self._file.truncate(self.header['data_offset'] + self.max_samples * self.num_channels * self.dtype.itemsize)
+            self._memmap = np.memmap(self._file, dtype=self.dtype, mode='r+', offset=self.header['data_offset'],
+                                     shape=(self.max_samples, self.num_channels))
+
+        self._t_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._writer, name='StreamRecorder', daemon=True)
+        self._thread.start()
+
+
+    def close(self):
+        '''
+        Write everything still queued, finalise the header and close the file
+        '''
+        if self._thread is None:
+            return
+        self._filled.put(None)  # Tells the writer to finish
+        self._thread.join()
+        self._thread = None
+        self._t_stop = time.perf_counter()
+        if self._memmap is not None:
+            self._memmap.flush()
+            self._memmap = None
+        self._write_header()
+        self._file.close()
+        self._file = None
+
+    stop = close
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+    # Producer side
+    def write(self, chunk):
+        '''
+        Queue a chunk of shape (channels, samples) (or (samples,) for one channel) to be written.
+        Returns True if the chunk was queued and False if it was dropped. Never blocks.
+        '''
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)
+        if self._blocks is None:
+            self._allocate_blocks(chunk.shape[1], chunk.dtype)
+
+        # Chunks longer than a block (only if the chunk size changed) are split across blocks
+        block_size = self._blocks.shape[2]
+        needed = -(-chunk.shape[1] // block_size)
+        if self._free.qsize() < needed:
+            self.dropped_chunks += 1
+            return False
+
+        for start in range(0, chunk.shape[1], block_size):
+            piece = chunk[:, start:start + block_size]
+            n = piece.shape[1]
+            index = self._free.get_nowait()
+            self._blocks[index, :, :n] = piece
+            self._filled.put((index, n))
+        self.samples_queued += chunk.shape[1]
+        depth = self.num_blocks - self._free.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def __call__(self, chunk):
+        return self.write(chunk)
+
+
+    def _allocate_blocks(self, chunk_size, dtype):
+        self._blocks = np.zeros((self.num_blocks, self.num_channels, chunk_size), dtype=dtype)
+        for ii in range(self.num_blocks):
+            self._free.put(ii)
+
+
+    # Writer thread
+    def _writer(self):
+        transposed = None
+        last_header_update = time.perf_counter()
+        while True:
+            item = self._filled.get()
+            if item is None:
+                break
+            index, n = item
+            block = self._blocks[index]
+            if self.max_samples is not None:
+                n = min(n, self.max_samples - self.samples_written)
+
+            t = time.perf_counter()
+            if n > 0 and self.mode == 'memmap':
+                self._memmap[self.samples_written:self.samples_written + n] = block[:, :n].T
+            elif n > 0:
+                # Interleave the channels into a re-used array, then write that
+                if transposed is None or transposed.shape[0] < n:
+                    transposed = np.empty((block.shape[1], self.num_channels), dtype=self.dtype)
+                np.copyto(transposed[:n], block[:, :n].T, casting='unsafe')
+                self._file.write(memoryview(transposed[:n]).cast('B'))
+            self._time_writing += time.perf_counter() - t
+            self._free.put(index)
+
+            self.samples_written += max(n, 0)
+            self.bytes_written += max(n, 0) * self.num_channels * self.dtype.itemsize
+            if t - last_header_update > 1:
+                self._write_header()
+                last_header_update = t
+
+
+    def _write_header(self):
+        self.header['num_samples'] = self.samples_written
+        self.header['data_offset'] = self.header['data_offset'] or 0
+        text = json.dumps(self.header).encode('utf-8')
+        offset = -(-(len(MAGIC) + 4 + len(text) + 64) // ALIGNMENT) * ALIGNMENT  # Room for the header to grow a little
+        if self.header['data_offset'] == 0:
+            self.header['data_offset'] = offset
+            text = json.dumps(self.header).encode('utf-8')
+        space = self.header['data_offset'] - len(MAGIC) - 4
+        if len(text) > space:
+            raise ValueError('StreamRecorder header no longer fits before the data')
+        text = text.ljust(space)
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(MAGIC + struct.pack('<I', len(text)) + text)
+        self._file.seek(max(position, self.header['data_offset']))
+
+
+    # Statistics
+    @property
+    def queue_depth(self):
+        '''
+        Number of chunks waiting to be written
+        '''
+        return self._filled.qsize()
+
+    def stats(self):
+        '''
+        Return a dict of recording statistics. Bandwidths are in MB/s: "write_bandwidth" is
+        the average over the whole recording and "disk_bandwidth" the rate achieved while the
+        writer thread was actually writing.
+        '''
+        if self._t_start is None:
+            elapsed = 0
+        else:
+            elapsed = (self._t_stop or time.perf_counter()) - self._t_start
+        return dict(samples_queued=self.samples_queued,
+                    samples_written=self.samples_written,
+                    bytes_written=self.bytes_written,
+                    dropped_chunks=self.dropped_chunks,
+                    queue_depth=self.queue_depth,
+                    max_queue_depth=self.max_queue_depth,
+                    write_bandwidth=self.bytes_written / elapsed / 1E6 if elapsed > 0 else 0.0,
+                    disk_bandwidth=self.bytes_written / self._time_writing / 1E6 if self._time_writing > 0 else 0.0)
+
+
+    # Reading
+    @staticmethod
+    def load(path):
+        '''
+        Return (header, data) for a recording. data is a read-only (samples x channels) memmap.
+        Works on recordings still in progress.
+        '''
+        with open(path, 'rb') as fid:
+            if fid.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a StreamRecorder file' % path)
+            length, = struct.unpack('<I', fid.read(4))
+            header = json.loads(fid.read(length).decode('utf-8'))
+        num_samples = header['num_samples']
+        if num_samples == 0:
+            return header, np.zeros((0, header['num_channels']), dtype=header['dtype'])
+        data = np.memmap(path, dtype=header['dtype'], mode='r', offset=header['data_offset'],
+                         shape=(num_samples, header['num_channels']))
+        return header, data
@@ -0,0 +1,23 @@
+# The utilities are imported when first used, so importing one of them (e.g. waveforms
+# from an AO example) does not load the others and their dependencies
+from pynidaqmxegs._lazy import lazy_exports
+
+_EXPORTS = ('RingBuffer',
+            'MinMaxDecimator',
+            'CircularBuffer',
+            'StreamRecorder',
+            'ProcessPoolStage',
+            'DeviceRegistry',
+            'CallbackProfiler',
+            'RawScaler',
+            'DigitalTimeline',
+            'RunningStats',
+            'SpectrumAnalyzer')
+
+_MODULES = ('waveforms',
+            'sizing',
+            'aobuffer',
+            'timing')
+
+# Each class is in a module of the same name. The modules are exported as modules.
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS, _MODULES)
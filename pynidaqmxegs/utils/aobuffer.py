@@ -0,0 +1,75 @@
+'''
+ Multichannel analog output buffers
+
+ pynidaqmxegs.utils.aobuffer
+
+ Purpose
+ An AO task with several channels is written a (channels, samples) array, and its
+ buffer is sized in samples per channel. Two mistakes are easy to make. len() of a
+ (channels, samples) array is the number of channels, not the number of samples, so a
+ buffer sized with it is far too small. And passing the array to task.write turns it
+ into nested Python lists, one float object per sample, before the driver sees it.
+
+ channel_array checks a waveform against the number of channels in the task and
+ returns it in the layout the driver wants: a C-contiguous (channels, samples) float64
+ array. A waveform already in that layout, such as one from utils.waveforms, is
+ returned as it is, without a copy. samples_per_channel gives the buffer length and
+ write_channels writes the array with nidaqmx.stream_writers.AnalogMultiChannelWriter,
+ which hands the array's memory straight to DAQmxWriteAnalogF64. The cost is then the
+ same per sample however many channels there are.
+
+
+ Example session:
+ from pynidaqmxegs.utils import aobuffer, waveforms
+ task.ao_channels.add_ao_voltage_chan('Dev1/ao0:7')
+ wave = waveforms.sine(500, amplitude=5, phase=np.arange(8) * np.pi / 4)   # (8, 500)
+ wave = aobuffer.channel_array(wave, task.number_of_channels)
+ task.timing.cfg_samp_clk_timing(1E4, samps_per_chan=aobuffer.samples_per_channel(wave),
+                                 sample_mode=AcquisitionType.CONTINUOUS)
+ aobuffer.write_channels(task, wave)
+'''
+
+import numpy as np
+
+
+def channel_array(waveform, num_channels):
+    '''
+    Return waveform as a C-contiguous (num_channels, samples) float64 array, checking
+    that it has one row per channel. A 1D waveform is accepted for a single channel and
+    returned as a (1, samples) view. No copy is made if the waveform is already a
+    C-contiguous float64 array.
+    '''
+    waveform = np.asarray(waveform)
+    if waveform.ndim == 1:
+        if num_channels != 1:
+            raise ValueError('A 1D waveform can only be played by a single channel but the task has %d. '
+                             'Supply a (%d, samples) array.' % (num_channels, num_channels))
+        waveform = waveform.reshape(1, -1)
+    elif waveform.ndim != 2:
+        raise ValueError('The waveform must be 1D or (channels, samples), not %dD' % waveform.ndim)
+    elif waveform.shape[0] != num_channels:
+        hint = ' Is it transposed?' if waveform.shape[1] == num_channels else ''
+        raise ValueError('The waveform has shape %s: %d row(s) for %d channel(s).%s'
+                         % (waveform.shape, waveform.shape[0], num_channels, hint))
+    if waveform.shape[1] < 2:
+        raise ValueError('A hardware-timed waveform needs at least 2 samples per channel')
+    return np.require(waveform, dtype=np.float64, requirements='C')
+
+
+def samples_per_channel(waveform):
+    '''
+    Number of samples per channel in a waveform: the last dimension, never the channel count
+    '''
+    return np.shape(waveform)[-1]
+
+
+def write_channels(task, waveform, timeout=10.0, writer=None):
+    '''
+    Write a waveform to the AO task "task" with an AnalogMultiChannelWriter and return
+    the number of samples per channel written. The waveform is checked against the
+    number of channels in the task. Supply "writer" to re-use one for repeated writes.
+    '''
+    if writer is None:
+        from nidaqmx.stream_writers import AnalogMultiChannelWriter
+        writer = AnalogMultiChannelWriter(task.out_stream)
+    return writer.write_many_sample(channel_array(waveform, task.number_of_channels), timeout=timeout)
@@ -0,0 +1,118 @@
+'''
+ Choice of chunk and buffer sizes for continuous tasks
+
+ pynidaqmxegs.utils.sizing
+
+ Purpose
+ A continuous task is serviced (read from or written to) every chunk of samples. If the
+ chunks are too small the program spends its time in driver calls and callbacks, and a
+ USB device, which is optimised for throughput rather than latency, falls behind and
+ overruns. If they are too large the data arrive late and the plot looks jerky. The
+ host buffer must hold several chunks so that a late read or write does not cause an
+ error.
+
+ plan_buffers picks the chunk size (samples per channel per read, write or every-N
+ samples callback) from the time between services, which in turn is chosen from the
+ bus the device is on and either a target latency or a preference for throughput:
+
+   bus           shortest interval   interval for throughput
+   USB, cDAQ     0.2 s               0.5 s     (service at most ~5 times a second)
+   PCI, PXI      20 ms               0.1 s
+   PCIe, PXIe    10 ms               0.1 s
+
+ The host buffer is a whole number of chunks (DAQmx requires a multiple of the every-N
+ samples interval for some devices), at least 4 and at least buffer_seconds of data.
+
+ The bus type is looked up in the cached device capabilities (DeviceRegistry) when a
+ device name is given, so this makes no driver calls after the first run.
+
+
+ Example session:
+ from pynidaqmxegs.utils import sizing
+ plan = sizing.plan_buffers(1E5, num_channels=4, device='Dev1')
+ plan.chunk_size, plan.buffer_size, plan.callbacks_per_second    # (1000, 100000, 100.0)
+ plan = sizing.plan_buffers(1E5, 4, bus_type='USB', target_latency=0.05)  # Raised to 0.2 s for USB
+ task.timing.cfg_samp_clk_timing(1E5, samps_per_chan=plan.buffer_size, sample_mode=AcquisitionType.CONTINUOUS)
+ task.register_every_n_samples_acquired_into_buffer_event(plan.chunk_size, callback)
+'''
+
+import math
+from collections import namedtuple
+
+
+# Bus type: (shortest time between services, time between services for throughput, seconds of buffer)
+BUS_TIMING = {'USB': (0.2, 0.5, 2.0),
+              'COMPACT_DAQ': (0.2, 0.5, 2.0),
+              'PCI': (0.02, 0.1, 1.0),
+              'PXI': (0.02, 0.1, 1.0),
+              'PCIE': (0.01, 0.1, 1.0),
+              'PXIE': (0.01, 0.1, 1.0),
+              'UNKNOWN': (0.2, 0.5, 2.0)}    # Unknown buses are treated like USB, which is the safe choice
+
+MIN_CHUNKS_IN_BUFFER = 4
+
+BufferPlan = namedtuple('BufferPlan', ['chunk_size',            # Samples per channel per read/write/callback
+                                       'buffer_size',           # Host buffer size in samples per channel
+                                       'interval',              # Seconds between services
+                                       'callbacks_per_second',
+                                       'buffer_seconds',        # Seconds of data the buffer holds
+                                       'bus_type'])
+
+
+def bus_type_of(device):
+    '''
+    Return the bus type name (e.g. 'USB', 'PCIE') of the named device from the cached device
+    capabilities. A physical channel such as 'Dev1/ai0:3' may be given instead of the name.
+    '''
+    from pynidaqmxegs.utils import DeviceRegistry
+    dev_name = device.strip('/').split('/')[0]
+    return DeviceRegistry.local()[dev_name].bus_type or 'UNKNOWN'
+
+
+def plan_buffers(sample_rate, num_channels=1, bus_type=None, device=None, target_latency=None,
+                 priority='latency', buffer_seconds=None):
+    '''
+    Return a BufferPlan for a continuous task.
+
+    sample_rate - samples per second per channel
+    num_channels - channels in the task. Only used to keep the chunk large enough at high
+                   aggregate rates (at least 1000 samples across all channels per service).
+    bus_type - 'USB', 'PCIE', 'PCI', 'PXI', 'PXIE' or 'COMPACT_DAQ'. Found from device if None.
+    device - name of the device (or a physical channel on it), used if bus_type is None.
+             If both are None the bus is taken to be PCIe.
+    target_latency - longest acceptable time, in seconds, between a sample being acquired
+                     and the program seeing it (or between writing and generating). Raised to
+                     the shortest interval the bus supports. None to decide from priority.
+    priority - with no target_latency: 'latency' services as often as the bus allows and
+               'throughput' services less often to minimise CPU use
+    buffer_seconds - minimum seconds of data the host buffer holds. Default: from the bus.
+    '''
+    if bus_type is None:
+        bus_type = bus_type_of(device) if device is not None else 'PCIE'
+    bus_type = str(bus_type).upper().replace('BUSTYPE.', '')
+    if priority not in ('latency', 'throughput'):
+        raise ValueError("priority must be 'latency' or 'throughput', not %r" % priority)
+    shortest, for_throughput, default_buffer_seconds = BUS_TIMING.get(bus_type, BUS_TIMING['UNKNOWN'])
+
+    if target_latency is not None:
+        interval = max(float(target_latency), shortest)
+    elif priority == 'throughput':
+        interval = for_throughput
+    else:
+        interval = shortest
+
+    # Python's cost per read is roughly fixed, so avoid reads of only a few samples in total
+    chunk_size = max(1, math.ceil(sample_rate * interval), math.ceil(1000 / max(1, num_channels)))
+    chunk_size = min(chunk_size, max(1, math.ceil(sample_rate * max(interval, for_throughput))))
+
+    if buffer_seconds is None:
+        buffer_seconds = default_buffer_seconds
+    num_chunks = max(MIN_CHUNKS_IN_BUFFER, math.ceil(sample_rate * buffer_seconds / chunk_size))
+    buffer_size = chunk_size * num_chunks
+
+    return BufferPlan(chunk_size=chunk_size,
+                      buffer_size=buffer_size,
+                      interval=chunk_size / sample_rate,
+                      callbacks_per_second=sample_rate / chunk_size,
+                      buffer_seconds=buffer_size / sample_rate,
+                      bus_type=bus_type)
@@ -0,0 +1,56 @@
+'''
+ Summary statistics of timings
+
+ pynidaqmxegs.utils.timing
+
+ Purpose
+ Turns raw timings, such as how long each read call took or when each callback ran,
+ into small dicts of numbers that can be printed or saved as JSON. All times are
+ reported in microseconds. Used by the examples, utils.CallbackProfiler and the
+ benchmarks.
+
+
+ Example session:
+ from pynidaqmxegs.utils import timing
+ timing.latency_summary(durations)          # dict(count, p50_us, p90_us, p99_us, max_us)
+ timing.jitter_summary(times, 1 / 100)      # Calls expected every 10 ms
+'''
+
+import numpy as np
+
+
+def latency_summary(durations):
+    '''
+    Summarise a sequence of durations in seconds (e.g. how long each read call took).
+    Returns a dict of the count and the 50th, 90th, 99th percentile and maximum in us,
+    or None if there are no durations.
+    '''
+    durations = np.asarray(durations, dtype=np.float64) * 1E6
+    if durations.size == 0:
+        return None
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return dict(count=int(durations.size),
+                p50_us=float(p50),
+                p90_us=float(p90),
+                p99_us=float(p99),
+                max_us=float(durations.max()))
+
+
+def jitter_summary(times, expected_interval):
+    '''
+    Summarise how regularly an event fired. "times" are the perf_counter times of each call
+    and expected_interval the nominal time between calls in seconds. Returns the mean interval
+    and the standard deviation, 99th percentile and maximum of the absolute deviation from the
+    expected interval, all in us. None if there were fewer than two calls.
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    if times.size < 2:
+        return None
+    intervals = np.diff(times)
+    deviation = np.abs(intervals - expected_interval) * 1E6
+    return dict(count=int(intervals.size),
+                expected_interval_us=float(expected_interval * 1E6),
+                mean_interval_us=float(intervals.mean() * 1E6),
+                std_us=float(intervals.std() * 1E6),
+                p99_abs_us=float(np.percentile(deviation, 99)),
+                max_abs_us=float(deviation.max()))
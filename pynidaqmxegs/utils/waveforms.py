@@ -0,0 +1,245 @@
+'''
+ Waveforms for analog output
+
+ pynidaqmxegs.utils.waveforms
+
+ Purpose
+ Builds the arrays played out of AO lines: sine, square, sawtooth, triangle, chirp,
+ galvo raster and arbitrary waveforms resampled from an array. Every sample is computed
+ at once with NumPy rather than in a loop.
+
+ Periodic shapes span num_samples samples with "cycles" whole cycles and no repeated
+ end point, so they loop seamlessly when regenerated. If any of amplitude, offset,
+ phase or cycles is a sequence, one channel is made per element (the others are
+ broadcast) and the result is a single C-contiguous (channels, samples) float64 array,
+ the layout the DAQmx stream writers expect. Otherwise the result is 1D.
+
+ Results are cached, keyed by the arguments, in a least-recently-used cache, so
+ building a task again with the same waveform costs nothing. For this reason the
+ arrays returned are read-only: copy one before modifying it. The cache is shared by all
+ threads (waveforms may be built in DAQmx callbacks) and guarded by a lock, which is not
+ held while a waveform is computed.
+
+
+ Example session:
+ from pynidaqmxegs.utils import waveforms
+ w = waveforms.sine(500, amplitude=5)                         # 1 cycle of a sine wave, +/- 5 V
+ w = waveforms.sine(500, amplitude=5, phase=(0, np.pi/2))     # (2, 500): sine and cosine
+ w = waveforms.galvo_raster(512, 256, amplitude=(2, 2))       # (2, 512*256): fast and slow axes
+ waveforms.cache_info()
+'''
+
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+import numpy as np
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()   # Guards _cache and the statistics
+_cache_maxsize = 64
+_hits = 0
+_misses = 0
+
+
+def _key_part(value):
+    # Arrays are not hashable: key them by their contents
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.shape, value.dtype.str, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(v) for v in value)
+    return value
+
+
+def _cached(func):
+    '''
+    Memoise a waveform function in the shared LRU cache and make its results read-only
+    '''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _hits, _misses
+        key = (func.__name__, _key_part(args), tuple(sorted((k, _key_part(v)) for k, v in kwargs.items())))
+        with _cache_lock:
+            result = _cache.get(key)
+            if result is not None:
+                _hits += 1
+                _cache.move_to_end(key)
+                return result
+            _misses += 1
+
+        # Computed without the lock. Two threads may both make the same waveform: the last is kept.
+        result = np.ascontiguousarray(func(*args, **kwargs), dtype=np.float64)
+        result.flags.writeable = False
+        with _cache_lock:
+            if _cache_maxsize > 0:
+                _cache[key] = result
+                while len(_cache) > _cache_maxsize:
+                    _cache.popitem(last=False)
+        return result
+    return wrapper
+
+
+def cache_info():
+    '''
+    Return the cache statistics as (hits, misses, maxsize, currsize)
+    '''
+    with _cache_lock:
+        return CacheInfo(_hits, _misses, _cache_maxsize, len(_cache))
+
+
+def cache_clear():
+    global _hits, _misses
+    with _cache_lock:
+        _cache.clear()
+        _hits = 0
+        _misses = 0
+
+
+def set_cache_size(maxsize):
+    '''
+    Set the maximum number of waveforms cached. 0 disables the cache.
+    '''
+    global _cache_maxsize
+    with _cache_lock:
+        _cache_maxsize = int(maxsize)
+        while len(_cache) > _cache_maxsize:
+            _cache.popitem(last=False)
+
+
+def _channel_params(*params):
+    '''
+    Broadcast scalar or per-channel parameters to column vectors. Returns the columns and
+    whether the result is multichannel.
+    '''
+    multichannel = any(np.ndim(p) > 0 for p in params)
+    columns = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=np.float64)) for p in params])
+    return [c[:, np.newaxis] for c in columns], multichannel
+
+
+def _periodic(shape, num_samples, cycles, amplitude, offset, phase):
+    '''
+    Evaluate "shape", a function of the phase in cycles (0 to 1 per cycle), for every channel
+    '''
+    (cycles, amplitude, offset, phase), multichannel = _channel_params(cycles, amplitude, offset, phase)
+    t = np.arange(num_samples) / num_samples
+    cycle_phase = cycles * t + phase / (2 * np.pi)
+    out = offset + amplitude * shape(cycle_phase)
+    return out if multichannel else out[0]
+
+
+@_cached
+def sine(num_samples, cycles=1, amplitude=1.0, offset=0.0, phase=0.0):
+    '''
+    Sine wave. phase is in radians.
+    '''
+    return _periodic(lambda p: np.sin(2 * np.pi * p), num_samples, cycles, amplitude, offset, phase)
+
+
+@_cached
+def square(num_samples, cycles=1, amplitude=1.0, offset=0.0, phase=0.0, duty=0.5):
+    '''
+    Square wave between offset-amplitude and offset+amplitude, high for the fraction "duty"
+    of each cycle
+    '''
+    return _periodic(lambda p: np.where(np.mod(p, 1) < duty, 1.0, -1.0), num_samples, cycles, amplitude, offset, phase)
+
+
+@_cached
+def sawtooth(num_samples, cycles=1, amplitude=1.0, offset=0.0, phase=0.0):
+    '''
+    Rising ramp from offset-amplitude to offset+amplitude each cycle
+    '''
+    return _periodic(lambda p: 2 * np.mod(p, 1) - 1, num_samples, cycles, amplitude, offset, phase)
+
+
+@_cached
+def triangle(num_samples, cycles=1, amplitude=1.0, offset=0.0, phase=0.0):
+    '''
+    Triangle wave starting at its minimum
+    '''
+    return _periodic(lambda p: 1 - 4 * np.abs(np.mod(p, 1) - 0.5), num_samples, cycles, amplitude, offset, phase)
+
+
+@_cached
+def chirp(num_samples, sample_rate, f0, f1, amplitude=1.0, offset=0.0, phase=0.0, method='linear'):
+    '''
+    Sine wave whose frequency sweeps from f0 to f1 Hz over num_samples samples played at
+    sample_rate. method is 'linear' or 'exponential'. The phase is continuous throughout.
+    The exponential sweep needs f0 and f1 above zero. Where f0 equals f1 the result is a
+    sine of that frequency.
+    '''
+    (f0, f1, amplitude, offset, phase), multichannel = _channel_params(f0, f1, amplitude, offset, phase)
+    t = np.arange(num_samples) / sample_rate
+    duration = num_samples / sample_rate
+    if method == 'linear':
+        cycle_phase = f0 * t + (f1 - f0) / (2 * duration) * t**2
+    elif method == 'exponential':
+        if np.any(f0 <= 0) or np.any(f1 <= 0):
+            raise ValueError('An exponential chirp needs f0 and f1 greater than zero')
+        log_k = np.log(f1 / f0) / duration
+        sweep = log_k != 0
+        # (k**t - 1) / log(k), which tends to t as k tends to 1 (f0 == f1: constant frequency)
+        cycle_phase = f0 * np.where(sweep, np.expm1(log_k * t) / np.where(sweep, log_k, 1), t)
+    else:
+        raise ValueError("method must be 'linear' or 'exponential'")
+    out = offset + amplitude * np.sin(2 * np.pi * cycle_phase + phase)
+    return out if multichannel else out[0]
+
+
+@_cached
+def galvo_raster(samples_per_line, num_lines, amplitude=1.0, offset=0.0, fill_fraction=0.8, bidirectional=False):
+    '''
+    Scan waveforms for an x/y pair of galvo mirrors: returns a (2, samples_per_line*num_lines) array.
+    amplitude and offset may be scalars or (x, y) pairs.
+
+    Unidirectional: each line is a linear x ramp over fill_fraction of the line followed by a
+    smooth (half-cosine) flyback. Bidirectional: x ramps up and down on alternate lines.
+    y ramps linearly over the frame and flies back at the end of it.
+    '''
+    amplitude = np.broadcast_to(np.asarray(amplitude, dtype=np.float64), (2,))
+    offset = np.broadcast_to(np.asarray(offset, dtype=np.float64), (2,))
+
+    if bidirectional:
+        line = np.linspace(-1, 1, samples_per_line)
+        x = np.concatenate((line, line[::-1]))
+        x = np.tile(x, -(-num_lines // 2))[:samples_per_line * num_lines]
+    else:
+        scan_samples = max(2, int(round(samples_per_line * fill_fraction)))
+        flyback_samples = samples_per_line - scan_samples
+        scan = np.linspace(-1, 1, scan_samples)
+        flyback = np.cos(np.pi * np.arange(1, flyback_samples + 1) / (flyback_samples + 1))
+        x = np.tile(np.concatenate((scan, flyback)), num_lines)
+
+    y = np.linspace(-1, 1, samples_per_line * num_lines)
+    return offset[:, np.newaxis] + amplitude[:, np.newaxis] * np.stack((x, y))
+
+
+@_cached
+def arbitrary(data, num_samples=None, amplitude=1.0, offset=0.0):
+    '''
+    Waveform from an array: 1D, or (channels, samples). It is linearly resampled to num_samples
+    samples (if given) and scaled by amplitude and offset.
+    '''
+    data = np.asarray(data, dtype=np.float64)
+    if num_samples is not None and num_samples != data.shape[-1]:
+        old_x = np.linspace(0, 1, data.shape[-1])
+        new_x = np.linspace(0, 1, num_samples)
+        resampled = np.stack([np.interp(new_x, old_x, row) for row in np.atleast_2d(data)])
+        data = resampled if data.ndim == 2 else resampled[0]
+    amplitude = np.asarray(amplitude, dtype=np.float64)
+    offset = np.asarray(offset, dtype=np.float64)
+    if data.ndim == 2:
+        amplitude = amplitude.reshape(-1, 1) if amplitude.ndim else amplitude
+        offset = offset.reshape(-1, 1) if offset.ndim else offset
+    return offset + amplitude * data
+
+
+def multichannel(*waveforms):
+    '''
+    Stack 1D waveforms of equal length into one C-contiguous (channels, samples) array
+    '''
+    return np.ascontiguousarray(np.stack([np.asarray(w, dtype=np.float64) for w in waveforms]))